@@ -2,10 +2,7 @@
 # -*- coding: utf-8 -*-
 # setup.py
 
-try:
-    from setuptools import setup
-except ImportError:
-    from distutils.core import setup
+from setuptools import find_packages, setup
 
 about = {}
 with open('./sleepscore/__about__.py') as f:
@@ -36,7 +33,7 @@ setup(
     license=about['__license__'],
     install_requires=install_requires,
     extras_require=extras_require,
-    packages=['sleepscore'],
+    packages=find_packages(include=['sleepscore', 'sleepscore.*']),
     zip_safe=False,
     classifiers=[
         'Development Status :: 3 - Alpha',
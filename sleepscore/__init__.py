@@ -1,22 +1,47 @@
 """Load and sleepscore using visbrain.Sleep datasets in multiple formats."""
 
+import shutil
+import tempfile
+import threading
 import warnings
 
 import numpy as np
+import pandas as pd
 
 import emg_from_lfp
 import yaml
 from visbrain.gui import Sleep
 
-from . import load, validation
+from . import export, features, load, plan, prescore, serve, validation
 
+# Mandatory and optional keys of each of the dictionaries in `datasets`
+DATASET_DICT_MANDATORY = ["binPath"]
+DATASET_DICT_OPTIONAL = {
+    "datatype": "SGLX",
+    "chanList": None,
+    "chanLabelsMap": None,
+    "name": None,
+    "derivations": None,
+    "filters": None,
+    "zeroPhase": False,
+    "sync": None,
+    "useLF": True,
+}
 
-def run(config_path):
+
+def run(config_path, dryRun=False, progress=None, cancelToken=None):
     """Call `load_and_score` from config file.
 
     Mandatory and optional keys in the config file are the (resp.) args and
     kwargs of `sleepscore.load_and_score`. Refer to `sleepscore.load_and_score`
     for a description of expected parameters.
+
+    Kwargs:
+        dryRun (bool): Only print the loading plan (see `load_and_score`).
+            Overrides the `dryRun` entry of the config file. (default False)
+        progress (callable | None): Passed to `load_and_score`
+        cancelToken (load.monitor.CancelToken | None): Passed to
+            `load_and_score`
     """
 
     with open(config_path, "r") as f:
@@ -48,7 +73,28 @@ def run(config_path):
     # Call `load_and_score`
     mandatory = [config[k] for k in mandatory_keys]
     optional = {k: v for k, v in config.items() if k in optional_keys}
-    load_and_score(*mandatory, **optional)
+    if dryRun:
+        optional["dryRun"] = True
+    optional["progress"] = progress
+    optional["cancelToken"] = cancelToken
+    return load_and_score(*mandatory, **optional)
+
+
+def validate_datasets(datasets):
+    """Validate the dictionaries of `datasets` and set default values."""
+    datasets = [
+        validation.validate(
+            dataset_dict,
+            mandatory=DATASET_DICT_MANDATORY,
+            optional=DATASET_DICT_OPTIONAL,
+            prefix="Validating `datasets` list item: ",
+        )
+        for dataset_dict in datasets
+    ]
+    # Raise early for unsupported formats
+    for dataset_dict in datasets:
+        load.registry.get_format(dataset_dict["datatype"])
+    return datasets
 
 
 def load_and_score(
@@ -57,8 +103,24 @@ def load_and_score(
     tEnd=None,
     downSample=100.0,
     ds_method="interpolation",
+    kwargs_ds_auto={},
     EMGdatapath=None,
     kwargs_sleep={},
+    progressive=False,
+    featuresPath=None,
+    kwargs_features={},
+    prescorePath=None,
+    kwargs_prescore={},
+    artifactsPath=None,
+    kwargs_artifacts={},
+    exportPath=None,
+    kwargs_export={},
+    memoryBudget=None,
+    memmapDir=None,
+    server=None,
+    dryRun=False,
+    progress=None,
+    cancelToken=None,
 ):
     """Load data and run visbrain's Sleep.
 
@@ -67,9 +129,12 @@ def load_and_score(
             Each of the dictionaries specifies the data loaded from a specific
             dataset. For each of the dictionaries, the following keys are
             recognized:
-                binPath (str | pathlib.Path): Path to bin of recording
-                    (mandatory)
-                datatype (str): 'SGLX' , 'TDT' or 'OpenEphys' (default 'SGLX')
+                binPath (str | pathlib.Path | list): Path to bin of recording
+                    (mandatory). For SGLX data, can also be a list of bins or
+                    a glob pattern (eg: "run_g0_t*.imec0.lf.bin"), loaded as
+                    a single recording. See `load.segments.SGLXRun`
+                datatype (str): 'SGLX', 'TDT' or any format registered in
+                    `load.registry` (default 'SGLX')
                 chanList (list(str) | None): List of loaded channels. All
                     channels are loaded by default. (default None)
                         - for SGLX data: `chanList` is interpreted
@@ -81,6 +146,8 @@ def load_and_score(
                             Where channels are 1-indexed, (IMPORTANT) not
                             0-indexed (for consistency with tdt methods), eg::
                                 [LFPs-1, LFPs-2, EEGs-1, EEGs-94, EMGs-1]
+                            Should be specified: use "all" to load all the
+                            channels of the stream stores.
                 chanLabelsMap (dict | None): {<channel>: <new_label>} Mapping
                     used to redefine arbitrary labels for each of the loaded
                     channels in chanList. If there is no entry in chanLabelsMap
@@ -90,13 +157,49 @@ def load_and_score(
                     (default None)
                 name (str | None): Name of the dataset. If specified, prepended
                     to the channel labels displayed in Sleep.
+                derivations (dict | None): {<label>: <spec>} Virtual channels
+                    computed as linear combinations of recorded channels
+                    (bipolar, referenced or common-average-referenced),
+                    block by block before downsampling. Only the channels in
+                    `chanList` (none if None) and the derived channels are
+                    kept. <spec> is either a dictionary of weights, eg::
+                        {"LF0;384": 1, "LF1;385": -1}
+                    or a referenced channel, eg::
+                        {"channel": "LF0;384", "reference": "all"}
+                    See `load.derive` (default None)
+                filters (list(dict) | None): Notch and band-pass filters
+                    applied to the loaded and derived channels, block by block
+                    at the original sampling rate, eg::
+                        [{"type": "notch", "freq": 60},
+                         {"type": "bandpass", "low": 0.5, "high": 100}]
+                    See `load.filtering` (default None)
+                zeroPhase (bool): Apply `filters` forward and backward rather
+                    than causally (default False)
+                sync (dict | None): Sync channel recording the square wave
+                    shared by all streams, with keys 'channel', 'line' and
+                    'threshold' (see `load.sync.EdgeDetector`). `{}` uses the
+                    SY (imec) or digital (NIDQ) channel of SGLX data. The data
+                    of each dataset with a sync channel is resampled on the
+                    timebase of the first of them, using a linear map between
+                    their clocks fitted on the sync edges. (default None)
+                useLF (bool): For imec AP data (SGLX), read the channels from
+                    the LF file of the recording (same run, '.lf.bin') when
+                    `downSample` and `filters` only need frequencies below
+                    the LF band cutoff (`load.recording.LF_MAX_FREQ`), which
+                    reads 12 times less data. Displayed labels are the AP
+                    labels. See `load.recording.SGLXRecording.lf_substitute`
+                    (default True)
 
     Kwargs:
         downSample (int | float | None): Frequency in Hz at which all the data
             is subsampled. No subsampling if None (default 100.0)
         ds_method (str): Method for resampling. Passed to
             ``resample.signal_resample``. 'poly' is more accurate,
-            'interpolation' is faster (default 'interpolation')
+            'interpolation' is faster. 'auto' uses the fastest method meeting
+            an accuracy target for each ratio and length of the resampled
+            data. See `load.resample_bench` (default 'interpolation')
+        kwargs_ds_auto (dict): Accuracy target of the 'auto' method, passed
+            to `load.resample_bench.set_auto_target` (default {})
         tStart (float | None): Time in seconds from start of recording of first
             loaded sample. Default 0.0
         tEnd (float | None): Time in seconds from start of recording of last
@@ -108,18 +211,80 @@ def load_and_score(
             appended to the data passed to `Sleep`
         kwargs_sleep (dict): Dictionary to pass to the `Sleep` instance during
             init. (default {})
+        progressive (bool): If True, the output array is allocated from the
+            recordings' metadata and filled in time order by background
+            workers. Sleep is launched as soon as the first minute of data is
+            loaded, and the rest of the data streams in while scoring. Data
+            that is not loaded yet is displayed as zeros. (default False)
+        featuresPath (str | None): If specified, per-epoch band powers, band
+            ratios and EMG RMS of the loaded data are saved at this path
+            ('.parquet', '.feather', '.csv' or '.tsv'). See
+            `features.compute_features` (default None)
+        kwargs_features (dict): Dictionary passed to
+            `features.compute_features` (default {})
+        prescorePath (str | None): If specified, a draft hypnogram is computed
+            from the per-epoch features with `prescore.prescore`, saved at
+            this path and opened in Sleep. Requires an EMG channel. Ignored if
+            a hypnogram is already specified in `kwargs_sleep`.
+            (default None)
+        kwargs_prescore (dict): Dictionary passed to `prescore.prescore`
+            (default {})
+        artifactsPath (str | None): If specified, per-epoch clipping, flatline
+            and RMS outlier indicators of the raw data of each read channel
+            are computed while loading and saved at this path ('.parquet',
+            '.feather', '.csv' or '.tsv'). Flagged epochs, if any, are saved
+            as an annotation file next to it and opened in Sleep, unless
+            annotations are already specified in `kwargs_sleep`. Not supported
+            with progressive loading. See `load.artifacts` (default None)
+        kwargs_artifacts (dict): Dictionary passed to
+            `load.artifacts.ArtifactIndex` (default {})
+        exportPath (str | None): If specified, the data passed to Sleep
+            (with the displayed channel labels and the derived EMG) is
+            written by chunks at this path, as EDF+ ('.edf') or as a flat
+            binary with a JSON header ('.bin' or '.dat'), for other tools to
+            read. See `export` (default None)
+        kwargs_export (dict): Dictionary passed to `export.save_export`
+            (eg: {'unit': 'uV'}) (default {})
+        memoryBudget (float | None): Memory budget in GB. If specified, the
+            memory used by loading is estimated from the metadata before
+            loading, and progressive loading is used if the estimate exceeds
+            the budget. If progressive loading still exceeds the budget, the
+            output is memory-mapped in the system's temporary directory (see
+            `memmapDir`) if there is enough space on disk. Neither is used if
+            `artifactsPath` is specified or datasets are aligned on their
+            sync channel. (default None)
+        memmapDir (str | None): If specified, the output array is a
+            memory-mapped file created in this scratch directory, filled
+            chunk by chunk from the recordings' metadata as with progressive
+            loading, so that the memory used doesn't grow with the duration
+            of the recording. Sleep is launched once all the data is written,
+            unless `progressive` is True. Not supported with `artifactsPath`
+            or datasets aligned on their sync channel. The file is removed
+            when Sleep is closed. (default None)
+        server (str | None): Address (eg: "host:8765") of a data server
+            started with `python -m sleepscore serve`. If specified, the
+            datasets are loaded (or fetched from the cache) by the server
+            rather than locally. The paths of the datasets should be valid on
+            the server. Progressive loading is not used. See `serve`
+            (default None)
+        dryRun (bool): Only validate the config, resolve channels and time
+            window and print the estimated memory use, without loading the
+            data. (default False)
+        progress (callable | None): Called with a dictionary describing the
+            progress of each dataset and stage (timepoints and bytes read).
+            See `load.monitor` (default None)
+        cancelToken (load.monitor.CancelToken | None): Checked between blocks
+            of data. Once cancelled, loading stops, files are closed and
+            `load.monitor.LoadCancelled` is raised. (default None)
+
+    Returns:
+        dict | None: The loading plan (see `plan.plan_load`) if `dryRun` is
+            True.
     """
 
     DERIVED_EMG_CHANLABEL = "derivedEMG"
 
-    # Mandatory and optional keys of each of the dictionaries in `datasets`
-    DATASET_DICT_MANDATORY = ["binPath"]
-    DATASET_DICT_OPTIONAL = {
-        "datatype": "SGLX",
-        "chanList": None,
-        "chanLabelsMap": None,
-        "name": None,
-    }
+    load.resample_bench.set_auto_target(**kwargs_ds_auto)
 
     ############
     # Load data from multiple datasets
@@ -129,41 +294,323 @@ def load_and_score(
 
     print(f"\nLoading data from N={len(datasets)} datasets:\n")
 
+    # Validate and set default values
+    datasets = validate_datasets(datasets)
+
+    # Outputs filled chunk by chunk from the metadata don't support the
+    # artifact index or the alignment of datasets on their sync channel
+    needsWholeLoad = bool(artifactsPath) or any(
+        d["sync"] is not None for d in datasets
+    )
+    if needsWholeLoad and server is None and (
+            progressive or memmapDir is not None):
+        raise ValueError(
+            "The artifact index (`artifactsPath`) and the alignment of "
+            "datasets on their sync channel (`sync`) are not supported with "
+            "progressive loading or a memory-mapped output (`memmapDir`)."
+        )
+
+    if dryRun or memoryBudget is not None:
+        load_plan = plan.plan_load(
+            datasets, tStart=tStart, tEnd=tEnd, downSample=downSample,
+            ds_method=ds_method, EMGdatapath=EMGdatapath,
+            progressive=progressive, memmap=memmapDir is not None,
+        )
+        overBudget = (memoryBudget is not None
+                      and load_plan["peak"] > memoryBudget * plan.GB)
+        if overBudget and needsWholeLoad:
+            print("\nWarning: Estimated peak memory exceeds the memory "
+                  "budget, but the artifact index or sync alignment require "
+                  "loading the whole window at once: progressive loading and "
+                  "memory-mapped outputs are not used.")
+        # Progressive loading reads successive windows of each recording
+        if (overBudget and not needsWholeLoad and not progressive
+                and memmapDir is None and load_plan["windowed"]):
+            progressive_plan = plan.plan_load(
+                datasets, tStart=tStart, tEnd=tEnd, downSample=downSample,
+                ds_method=ds_method, EMGdatapath=EMGdatapath,
+                progressive=True,
+            )
+            if progressive_plan["peak"] < load_plan["peak"]:
+                print(f"\nEstimated peak memory "
+                      f"({load_plan['peak'] / plan.GB:.2f}GB) exceeds the "
+                      f"memory budget: use progressive loading")
+                progressive = True
+                load_plan = progressive_plan
+        # Still over budget: write the output to a scratch file
+        if (memoryBudget is not None and not needsWholeLoad
+                and memmapDir is None and load_plan["windowed"]
+                and load_plan["peak"] > memoryBudget * plan.GB):
+            memmap_plan = plan.plan_load(
+                datasets, tStart=tStart, tEnd=tEnd, downSample=downSample,
+                ds_method=ds_method, EMGdatapath=EMGdatapath,
+                progressive=progressive, memmap=True,
+            )
+            scratchDir = tempfile.gettempdir()
+            if (memmap_plan["peak"] < load_plan["peak"]
+                    and shutil.disk_usage(scratchDir).free
+                    > memmap_plan["diskBytes"]):
+                print(f"\nEstimated peak memory "
+                      f"({load_plan['peak'] / plan.GB:.2f}GB) exceeds the "
+                      f"memory budget: use a memory-mapped output in "
+                      f"{scratchDir}")
+                memmapDir = scratchDir
+                load_plan = memmap_plan
+        plan.print_plan(load_plan, memoryBudget=memoryBudget)
+        if memoryBudget is not None and load_plan["peak"] > memoryBudget * plan.GB:
+            warnings.warn(
+                "Estimated peak memory exceeds the memory budget. Consider "
+                "loading fewer channels, a shorter window or a lower "
+                "`downSample`."
+            )
+        if dryRun:
+            return load_plan
+
+    if progressive and server is not None:
+        warnings.warn("Progressive loading is not used with a data server.")
+        progressive = False
+    if server is not None and ds_method == "auto" and kwargs_ds_auto:
+        warnings.warn(
+            "The data server uses the default accuracy target of the 'auto' "
+            "resampling method: `kwargs_ds_auto` is ignored."
+        )
+
+    if memmapDir is not None and server is not None:
+        warnings.warn("The output is not memory-mapped with a data server.")
+        memmapDir = None
+
+    if progressive:
+        data, sf, chanLabels, progressive_load = load_progressive(
+            datasets,
+            tStart=tStart,
+            tEnd=tEnd,
+            downSample=downSample,
+            ds_method=ds_method,
+            EMGdatapath=EMGdatapath,
+            memmapDir=memmapDir,
+            progress=progress,
+            cancelToken=cancelToken,
+        )
+        # Threads waiting for all the data to be loaded
+        threads = []
+        if prescorePath and "hypno" not in kwargs_sleep:
+            print("\nPre-scoring requires all the data: wait for loading")
+            progressive_load.wait()
+            kwargs_sleep = save_features_and_prescore(
+                data, sf, chanLabels, kwargs_sleep, featuresPath,
+                kwargs_features, prescorePath, kwargs_prescore,
+            )
+        elif featuresPath:
+            # Compute features once all the data is loaded
+            def save_features_when_loaded():
+                progressive_load.wait()
+                save_features_and_prescore(
+                    data, sf, chanLabels, kwargs_sleep, featuresPath,
+                    kwargs_features,
+                )
+            threads.append(threading.Thread(target=save_features_when_loaded))
+            threads[-1].start()
+        if exportPath:
+            # Export once all the data is loaded
+            def export_when_loaded():
+                progressive_load.wait()
+                save_export(
+                    exportPath, data, sf, chanLabels, datasets, tStart,
+                    kwargs_export,
+                )
+            threads.append(threading.Thread(target=export_when_loaded))
+            threads[-1].start()
+        print("\nCalling Sleep")
+        Sleep(data=data, channels=chanLabels, sf=sf, **kwargs_sleep).show()
+        if any(thread.is_alive() for thread in threads):
+            print("\nWait for loading to finish to save features or export")
+        for thread in threads:
+            thread.join()
+        # Workers still write to the memory-mapped output until they stop
+        progressive_load.cancel(wait=memmapDir is not None)
+        if memmapDir is not None:
+            load.utils.remove_memmap(data)
+        return
+
+    if memmapDir is not None:
+        data, sf, chanLabels, progressive_load = load_progressive(
+            datasets,
+            tStart=tStart,
+            tEnd=tEnd,
+            downSample=downSample,
+            ds_method=ds_method,
+            EMGdatapath=EMGdatapath,
+            memmapDir=memmapDir,
+            progress=progress,
+            cancelToken=cancelToken,
+        )
+        print("\nWait for all the data to be written to the memory-mapped "
+              "output")
+        try:
+            progressive_load.wait()
+        except BaseException:
+            progressive_load.cancel(wait=True)
+            load.utils.remove_memmap(data)
+            raise
+        artifacts = None
+    elif server is not None:
+        load.monitor.check(cancelToken)
+        data, sf, chanLabels, artifacts = serve.fetch_bundle(
+            server,
+            datasets,
+            tStart=tStart,
+            tEnd=tEnd,
+            downSample=downSample,
+            ds_method=ds_method,
+            kwargs_artifacts=kwargs_artifacts if artifactsPath else None,
+        )
+    else:
+        data, sf, chanLabels, artifacts = load_datasets(
+            datasets,
+            tStart=tStart,
+            tEnd=tEnd,
+            downSample=downSample,
+            ds_method=ds_method,
+            kwargs_artifacts=kwargs_artifacts if artifactsPath else None,
+            progress=progress,
+            cancelToken=cancelToken,
+        )
+
+    ############
+    # Save the artifact index and offer flagged epochs as annotations
+
+    if artifactsPath and artifacts is not None:
+        annotationsPath = load.artifacts.save_artifacts(
+            artifactsPath, artifacts
+        )
+        if annotationsPath is not None and "annotations" not in kwargs_sleep:
+            kwargs_sleep = dict(kwargs_sleep, annotations=str(annotationsPath))
+
+    ############
+    # Load and append the EMG
+
+    # The EMG is already in the memory-mapped output
+    if EMGdatapath and memmapDir is None:
+        load.monitor.check(cancelToken)
+        print("\nLoading the EMG")
+        tEnd = data.shape[1] / sf  # Will fail if EMG is shorter
+        EMG_data, _ = emg_from_lfp.load_emg(
+            EMGdatapath,
+            tStart=tStart,
+            tEnd=tEnd,
+            desired_length=data.shape[1],
+        )  # Load, select time points of interest and resample
+
+        print("Combining data and derivedEMG")
+        # At this point the EMG and data should have same number of samples and
+        # same sf
+        data = np.concatenate((data, EMG_data), axis=0)
+        chanLabels.append(DERIVED_EMG_CHANLABEL)
+        load.monitor.report(progress, 'emg', data.shape[1], data.shape[1])
+
+    ############
+    # Export the data passed to Sleep
+
+    if exportPath:
+        load.monitor.check(cancelToken)
+        save_export(
+            exportPath, data, sf, chanLabels, datasets, tStart, kwargs_export
+        )
+
+    ############
+    # Save per-epoch features and draft hypnogram
+
+    kwargs_sleep = save_features_and_prescore(
+        data, sf, chanLabels, kwargs_sleep, featuresPath, kwargs_features,
+        prescorePath, kwargs_prescore,
+    )
+
+    ############
+    # Call Sleep with loaded data
+
+    load.monitor.check(cancelToken)
+    print("\nCalling Sleep")
+    Sleep(data=data, channels=chanLabels, sf=sf, **kwargs_sleep).show()
+    if memmapDir is not None:
+        load.utils.remove_memmap(data)
+
+
+def load_datasets(datasets, tStart=None, tEnd=None, downSample=100.0,
+                  ds_method="interpolation", kwargs_artifacts=None,
+                  progress=None, cancelToken=None):
+    """Load, align and concatenate the data of multiple datasets.
+
+    See `load_and_score` for a description of the parameters. `datasets`
+    should be validated (with the default values of all keys set).
+
+    Kwargs:
+        kwargs_artifacts (dict | None): If not None, an artifact index of
+            each dataset is computed while loading, with
+            `load.artifacts.ArtifactIndex(**kwargs_artifacts)`
+            (default None)
+
+    Returns:
+        data (np.ndarray): (n_channels, n_samples) array
+        sf (float): Sampling frequency of the data
+        chanLabels (list(str)): Displayed channel labels
+        artifacts (pd.DataFrame | None): Artifact index of all datasets, if
+            `kwargs_artifacts` is not None
+    """
     all_data_list = []
     all_sf = []
     chanLabels = []
+    artifact_tables = []
+    refSync = None  # Edges and number of samples of the reference stream
     for i, dataset_dict in enumerate(datasets):
 
+        load.monitor.check(cancelToken)
         print(
             f"\nLoading dataset #{i+1}/{len(datasets)} from"
             f" {dataset_dict['binPath']}"
         )
 
-        # Validate and set default values
-        dataset_dict = validation.validate(
-            dataset_dict,
-            mandatory=DATASET_DICT_MANDATORY,
-            optional=DATASET_DICT_OPTIONAL,
-            prefix="Validating `datasets` list item: ",
-        )
+        artifactIndex = None
+        if kwargs_artifacts is not None:
+            artifactIndex = load.artifacts.ArtifactIndex(**kwargs_artifacts)
+        syncDetector = None
+        if dataset_dict["sync"] is not None:
+            syncDetector = load.sync.EdgeDetector(**dataset_dict["sync"])
 
         # Preload and downsample specific parts of the data
         data, sf, chanOrigLabels = load.loader_switch(
             dataset_dict["binPath"],
             datatype=dataset_dict["datatype"],
             chanList=dataset_dict["chanList"],
+            derivations=dataset_dict["derivations"],
+            filters=dataset_dict["filters"],
+            zeroPhase=dataset_dict["zeroPhase"],
+            useLF=dataset_dict["useLF"],
+            artifactIndex=artifactIndex,
+            syncDetector=syncDetector,
+            progress=load.monitor.with_info(progress, dataset=i),
+            cancelToken=cancelToken,
             downSample=downSample,
             ds_method=ds_method,
             tStart=tStart,
             tEnd=tEnd,
         )
 
+        # Align on the timebase of the first dataset with a sync channel
+        if syncDetector is not None and refSync is None:
+            refSync = (syncDetector, data.shape[1])
+        elif syncDetector is not None:
+            data, clockMap = load.sync.align_to_reference(
+                data, syncDetector, *refSync
+            )
+            print(f"Aligned on the sync edges of the first dataset: "
+                  f"{clockMap}")
+
         # Relabel channels and verbose which channels are used
-        labels = relabel_channels(chanOrigLabels, dataset_dict["chanLabelsMap"])
-        # Prepend name of dataset
-        if dataset_dict["name"] is not None and len(dataset_dict["name"]) >= 1:
-            labels = [dataset_dict["name"] + "," + l for l in labels]
-        print_used_channels(chanOrigLabels, labels)
+        labels = get_dataset_labels(chanOrigLabels, dataset_dict)
+        if artifactIndex is not None:
+            artifact_tables.append(
+                artifactIndex.to_table(name=dataset_dict["name"])
+            )
 
         all_data_list.append(data)
         all_sf.append(sf)
@@ -175,31 +622,160 @@ def load_and_score(
     assert len(set([data.shape[1] for data in all_data_list])) <= 1
 
     data = np.concatenate(all_data_list, axis=0)
+    del all_data_list
+
+    artifacts = None
+    if kwargs_artifacts is not None:
+        artifacts = pd.concat(artifact_tables, ignore_index=True)
+    return data, sf, chanLabels, artifacts
+
+
+def load_progressive(datasets, tStart=None, tEnd=None, downSample=100.0,
+                     ds_method="interpolation", EMGdatapath=None,
+                     memmapDir=None, progress=None, cancelToken=None):
+    """Allocate the data array and start filling it in the background.
+
+    The shape of the output is obtained from the recordings' metadata. Returns
+    once the first chunk of each dataset is loaded. See `load_and_score` for a
+    description of the parameters.
+
+    Returns:
+        data (np.ndarray): (n_channels, n_samples) float32 array, filled in
+            time order by background workers. A `np.memmap` backed by a new
+            file in `memmapDir` if it is specified.
+        sf (float): Sampling frequency of the data
+        chanLabels (list(str)): Displayed channel labels
+        progressive_load (load.progressive.ProgressiveLoad): Handle on the
+            background loading, used to query progress, wait for completion
+            or cancel the loading.
+    """
+    from .load.progressive import ProgressiveLoad
 
-    ############
-    # Load and append the EMG
+    DERIVED_EMG_CHANLABEL = "derivedEMG"
+
+    if tStart is None:
+        tStart = 0.0
+
+    # Probe metadata
+    probes = [
+        load.probe_switch(
+            dataset_dict["binPath"],
+            datatype=dataset_dict["datatype"],
+            chanList=dataset_dict["chanList"],
+            derivations=dataset_dict["derivations"],
+        )
+        for dataset_dict in datasets
+    ]
+    sRates = set(sRate for sRate, _, _ in probes)
+    if downSample is None:
+        if len(sRates) > 1:
+            raise ValueError(
+                f"Datasets have different sampling rates ({sRates}): please "
+                f"specify a `downSample` value."
+            )
+        sf = sRates.pop()
+    else:
+        sf = downSample
+    if tEnd is None:
+        # Duration of shortest dataset
+        tEnd = min(duration for _, duration, _ in probes)
+    nSamp = int((tEnd - tStart) * sf)
+
+    # Channel labels and rows of each dataset in output
+    chanLabels = []
+    rows = []
+    for dataset_dict, (_, _, chanOrigLabels) in zip(datasets, probes):
+        rows.append(slice(len(chanLabels), len(chanLabels) + len(chanOrigLabels)))
+        chanLabels += get_dataset_labels(chanOrigLabels, dataset_dict)
+    nChans = len(chanLabels) + (1 if EMGdatapath else 0)
+
+    print(f"\nAllocate data array: {nChans} channels x {nSamp} samples "
+          f"({nChans * nSamp * 4 / 1e9:.2f}GB)")
+    # float32 so that Sleep doesn't need to copy the array
+    if memmapDir is None:
+        data = np.zeros((nChans, nSamp), dtype="float32")
+    else:
+        data = load.utils.create_memmap(
+            memmapDir, (nChans, nSamp), dtype="float32"
+        )
+        print(f"Memory-mapped output: {data.filename}")
+
+    progressive_load = ProgressiveLoad(
+        datasets, rows, data, sf, tStart=tStart, downSample=downSample,
+        ds_method=ds_method, progress=progress, cancelToken=cancelToken,
+    ).start()
 
     if EMGdatapath:
         print("\nLoading the EMG")
-        tEnd = data.shape[1] / sf  # Will fail if EMG is shorter
         EMG_data, _ = emg_from_lfp.load_emg(
             EMGdatapath,
             tStart=tStart,
             tEnd=tEnd,
-            desired_length=data.shape[1],
+            desired_length=nSamp,
         )  # Load, select time points of interest and resample
-
-        print("Combining data and derivedEMG")
-        # At this point the EMG and data should have same number of samples and
-        # same sf
-        data = np.concatenate((data, EMG_data), axis=0)
+        data[-1:, :] = EMG_data
         chanLabels.append(DERIVED_EMG_CHANLABEL)
+        load.monitor.report(progress, 'emg', nSamp, nSamp)
 
-    ############
-    # Call Sleep with loaded data
+    progressive_load.wait_first_chunk()
+    return data, sf, chanLabels, progressive_load
 
-    print("\nCalling Sleep")
-    Sleep(data=data, channels=chanLabels, sf=sf, **kwargs_sleep).show()
+
+def save_features_and_prescore(data, sf, chanLabels, kwargs_sleep,
+                               featuresPath=None, kwargs_features={},
+                               prescorePath=None, kwargs_prescore={}):
+    """Save per-epoch features and draft hypnogram if requested.
+
+    See `load_and_score` for a description of the parameters.
+
+    Returns:
+        dict: `kwargs_sleep`, with the draft hypnogram if there is one.
+    """
+    if prescorePath and "hypno" in kwargs_sleep:
+        warnings.warn(
+            "A hypnogram is specified in `kwargs_sleep`: skip pre-scoring."
+        )
+        prescorePath = None
+    if not (featuresPath or prescorePath):
+        return kwargs_sleep
+
+    print("\nComputing features")
+    features_df = features.compute_features(
+        data, sf, chanLabels, **kwargs_features
+    )
+    if featuresPath:
+        load.utils.save_table(featuresPath, features_df)
+        print(f"Saved features table at {featuresPath}")
+    if prescorePath:
+        prescore.save_draft_hypnogram(
+            prescorePath, features_df, duration=data.shape[1] / sf,
+            **kwargs_prescore
+        )
+        kwargs_sleep = dict(kwargs_sleep, hypno=prescorePath)
+    return kwargs_sleep
+
+
+def save_export(exportPath, data, sf, chanLabels, datasets, tStart=None,
+                kwargs_export={}):
+    """Export the data passed to Sleep, with the paths of the datasets.
+
+    See `load_and_score` for a description of the parameters.
+    """
+    kwargs = dict(
+        tStart=tStart, sources=[d["binPath"] for d in datasets],
+    )
+    kwargs.update(kwargs_export)
+    export.save_export(exportPath, data, sf, chanLabels, **kwargs)
+
+
+def get_dataset_labels(chanOrigLabels, dataset_dict):
+    """Return displayed labels of a dataset's channels and print them."""
+    labels = relabel_channels(chanOrigLabels, dataset_dict["chanLabelsMap"])
+    # Prepend name of dataset
+    if dataset_dict["name"] is not None and len(dataset_dict["name"]) >= 1:
+        labels = [dataset_dict["name"] + "," + l for l in labels]
+    print_used_channels(chanOrigLabels, labels)
+    return labels
 
 
 def relabel_channels(chanLabels, chanLabelsMap):
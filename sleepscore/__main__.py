@@ -1,23 +1,139 @@
 """Sleepscore
 
 Usage:
-  sleepscore <config_path>
+  sleepscore hypno <table_path> <hypnogram_path>... [--epoch=<s>] [--jobs=<n>]
+  sleepscore extract <bin_path> [<channel_label>...]
+  sleepscore bench-resample <table_path> [--durations=<s>]
+  sleepscore serve [--host=<h>] [--port=<p>] [--root=<dir>] [--cache=<GB>]
+  sleepscore scan <bin_path> <table_path> [--datatype=<t>] [--fraction=<f>]
+                  [--window=<s>] [--regions=<path>]
+  sleepscore <config_path> [--dry-run] [--progress]
+
+Commands:
+  hypno          Summarize hypnograms exported from Sleep in a single table
+  extract        Copy channels of a SpikeGLX bin (all by default) to a
+                 channel-major sidecar file, used by all subsequent loads
+  bench-resample Measure throughput, peak memory and spectral error of the
+                 resampling methods for common sampling rates
+  serve          Serve loaded data to `load_and_score` clients (`server`
+                 config entry) and cache it for all scorers
+  scan           Read short windows spread across a recording and rank its
+                 channels by region from their artifacts and band powers
 
 Options:
   -h --help      show this
+  --epoch=<s>    Epoch duration in seconds [default: 1.0]
+  --jobs=<n>     Number of processes. Number of CPUs by default
+  --durations=<s>  Comma-separated durations in seconds of the resampled
+                 signals [default: 10,60]
+  --host=<h>     Address the server binds to. 0.0.0.0 to accept connections
+                 from other machines [default: 127.0.0.1]
+  --port=<p>     Port of the server [default: 8765]
+  --root=<dir>   Only serve recordings in this directory
+  --cache=<GB>   Maximum size of the data cached by the server [default: 4]
+  --datatype=<t>  'SGLX' or 'TDT' [default: SGLX]
+  --fraction=<f>  Fraction of the recording read [default: 0.01]
+  --window=<s>   Duration in seconds of each window [default: 2.0]
+  --regions=<path>  yaml file of {<region>: [<channel_label>, ...]}. Channels
+                 are grouped by type (SGLX) or store (TDT) by default
+  --dry-run      Print the channels, time window and estimated memory use
+                 without loading the data
+  --progress     Print the progress of loading every few seconds
+
+Loading stops cleanly on Ctrl-C or SIGTERM (press Ctrl-C twice to abort
+immediately).
 """
 
+import signal
+import sys
 
 import sleepscore
 from docopt import docopt
+from sleepscore.load import monitor
+
+
+def cancel_on_signals(cancelToken):
+    """Cancel loading on SIGINT / SIGTERM, restore default handlers."""
+    defaults = {
+        signal.SIGINT: signal.default_int_handler,
+        signal.SIGTERM: signal.SIG_DFL,
+    }
+
+    def handler(signum, frame):
+        print(f"\nReceived signal {signum}: cancel loading")
+        cancelToken.cancel()
+        signal.signal(signum, defaults[signum])
+
+    for signum in defaults:
+        signal.signal(signum, handler)
 
 
 if __name__ == '__main__':
 
     args = docopt(__doc__)
 
-    # Load config
-    config_path = args['<config_path>']
+    if args['hypno']:
+        from sleepscore import hypno
+        hypno.summarize_hypnograms(
+            args['<hypnogram_path>'],
+            outPath=args['<table_path>'],
+            epochDuration=float(args['--epoch']),
+            nJobs=int(args['--jobs']) if args['--jobs'] else None,
+        )
+
+    elif args['extract']:
+        from sleepscore.load import sidecar
+        sidecar.extract_SGLX(
+            args['<bin_path>'],
+            chanList=args['<channel_label>'] or None,
+        )
+
+    elif args['bench-resample']:
+        from sleepscore.load import resample_bench, utils
+        table = resample_bench.benchmark(
+            durations=[float(d) for d in args['--durations'].split(',')],
+        )
+        print(table.to_string(index=False))
+        utils.save_table(args['<table_path>'], table)
+
+    elif args['serve']:
+        from sleepscore import serve
+        serve.serve(
+            host=args['--host'],
+            port=int(args['--port']),
+            root=args['--root'],
+            cacheBytes=float(args['--cache']) * 1e9,
+        )
+
+    elif args['scan']:
+        from sleepscore import scan
+        regions = None
+        if args['--regions']:
+            import yaml
+            with open(args['--regions'], 'r') as f:
+                regions = yaml.load(f, Loader=yaml.FullLoader)
+        scan.save_scan(
+            args['<table_path>'],
+            args['<bin_path>'],
+            datatype=args['--datatype'],
+            fraction=float(args['--fraction']),
+            windowDuration=float(args['--window']),
+            regions=regions,
+        )
+
+    else:
+        # Load config
+        config_path = args['<config_path>']
 
-    # Run main function
-    sleepscore.run(config_path)
+        # Run main function
+        cancelToken = monitor.CancelToken()
+        cancel_on_signals(cancelToken)
+        try:
+            sleepscore.run(
+                config_path,
+                dryRun=args['--dry-run'],
+                progress=monitor.PrintProgress() if args['--progress'] else None,
+                cancelToken=cancelToken,
+            )
+        except monitor.LoadCancelled:
+            sys.exit("Loading cancelled.")
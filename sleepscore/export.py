@@ -0,0 +1,272 @@
+"""Export of the data passed to Sleep, for other tools of the pipeline.
+
+The downsampled, relabelled data (with the derived EMG) is written chunk by
+chunk, so that no converted copy of the whole array is held in memory:
+    - '.edf': EDF+ file (continuous recording). Each channel is scaled to
+      int16 from its own physical range. EDF labels are limited to 16
+      characters, so the full labels are also saved in the transducer field.
+    - '.bin' (or '.dat'): flat time-major binary (like SpikeGLX bins), with a
+      JSON header `<name>.json` describing the channels, sampling rate and
+      dtype. See `read_binary`.
+"""
+import datetime
+import json
+from pathlib import Path
+
+import numpy as np
+
+CHUNK_DURATION = 600.0  # (s) Duration of the data converted at once
+RECORD_DURATION = 1.0  # (s) Duration of the data records of EDF files
+BINARY_DTYPE = 'float32'
+UNIT = 'uV'
+
+# Number of 2-byte samples of the EDF+ annotations signal in each record
+EDF_ANNOTATION_SAMPLES = 32
+EDF_DIGITAL_RANGE = (-32768, 32767)
+
+
+def save_export(path, data, sf, chanLabels, **kwargs):
+    """Export data in a format inferred from the extension of `path`.
+
+    Args:
+        path (str | pathlib.Path): '.edf' (EDF+), '.bin' or '.dat' (flat
+            binary with a JSON header)
+        data (np.ndarray): (n_channels, n_samples) array
+        sf (float): Sampling frequency of the data
+        chanLabels (list(str)): Label of each channel
+
+    Kwargs:
+        **kwargs: Passed to `write_edf` or `write_binary`
+    """
+    suffix = Path(path).suffix.lower()
+    print(f"\nExport data to {path}")
+    if suffix == '.edf':
+        write_edf(path, data, sf, chanLabels, **kwargs)
+    elif suffix in ['.bin', '.dat']:
+        write_binary(path, data, sf, chanLabels, **kwargs)
+    else:
+        raise ValueError(
+            f"Unrecognized export extension: `{suffix}`. Supported "
+            f"extensions: '.edf', '.bin', '.dat'"
+        )
+
+
+def _iter_chunks(nSamp, sf, chunkDuration):
+    """Yield (start, stop) sample bounds of chunks."""
+    nChunk = max(int(chunkDuration * sf), 1)
+    for start in range(0, nSamp, nChunk):
+        yield start, min(start + nChunk, nSamp)
+
+
+def write_binary(path, data, sf, chanLabels, tStart=0.0, unit=UNIT,
+                 dtype=BINARY_DTYPE, chunkDuration=CHUNK_DURATION,
+                 sources=None):
+    """Write data as a flat time-major binary and a JSON header.
+
+    Args:
+        path (str | pathlib.Path): Path of the binary. The header is saved
+            next to it with a '.json' extension.
+        data (np.ndarray): (n_channels, n_samples) array
+        sf (float): Sampling frequency of the data
+        chanLabels (list(str)): Label of each channel
+
+    Kwargs:
+        tStart (float | None): Time in seconds of the first sample in the
+            recordings (default 0.0)
+        unit (str): Unit of the data (default UNIT)
+        dtype (str): dtype of the saved data (default BINARY_DTYPE)
+        chunkDuration (float): Duration in seconds of the data converted and
+            written at once (default CHUNK_DURATION)
+        sources (list | None): Paths of the recordings, saved in the header
+            (default None)
+    """
+    path = Path(path)
+    assert data.shape[0] == len(chanLabels)
+    header = {
+        'sf': float(sf),
+        'nChannels': data.shape[0],
+        'nSamples': data.shape[1],
+        'dtype': np.dtype(dtype).str,
+        'order': 'time-major',
+        'channels': list(chanLabels),
+        'unit': unit,
+        'tStart': float(tStart or 0.0),
+        'sources': [str(s) for s in sources] if sources else [],
+    }
+    with open(path, 'wb') as f:
+        for start, stop in _iter_chunks(data.shape[1], sf, chunkDuration):
+            f.write(np.ascontiguousarray(data[:, start:stop].T, dtype=dtype))
+    with open(path.with_suffix('.json'), 'w') as f:
+        json.dump(header, f, indent=2)
+    print(f"Saved {data.shape[0]} channels x {data.shape[1]} samples at "
+          f"{path} (header: {path.with_suffix('.json')})")
+
+
+def read_binary(path):
+    """Return (data, sf, chanLabels, header) of a file of `write_binary`.
+
+    `data` is a (n_channels, n_samples) read-only memmap.
+    """
+    path = Path(path)
+    with open(path.with_suffix('.json'), 'r') as f:
+        header = json.load(f)
+    data = np.memmap(
+        path, dtype=header['dtype'], mode='r',
+        shape=(header['nSamples'], header['nChannels']),
+    ).T
+    return data, header['sf'], header['channels'], header
+
+
+def _edf_field(value, width):
+    """Return ascii field of an EDF header, left-justified and truncated."""
+    text = str(value)
+    if isinstance(value, float):
+        # Shortest representation fitting in the field
+        for precision in range(width, 0, -1):
+            text = f"{value:.{precision}g}"
+            if len(text) <= width:
+                break
+    text = text.encode('ascii', 'replace').decode('ascii')
+    return text[:width].ljust(width)
+
+
+def _edf_bound(value, lower=True):
+    """Return a bound of `value` that is exactly written in an EDF field."""
+    bound = float(_edf_field(float(value), 8))
+    delta = abs(bound - value) or abs(value) * 1e-6 or 1e-6
+    while (bound > value) if lower else (bound < value):
+        bound = float(_edf_field(
+            float(value - delta if lower else value + delta), 8
+        ))
+        delta *= 2
+    return bound
+
+
+def write_edf(path, data, sf, chanLabels, tStart=0.0, unit=UNIT,
+              startDatetime=None, recordDuration=RECORD_DURATION,
+              chunkDuration=CHUNK_DURATION, sources=None):
+    """Write data as an EDF+ file, converting a chunk at a time.
+
+    The physical range of each channel is its range in the data (measured in
+    a first pass over the chunks). Samples per data record are rounded to an
+    integer, and the last record is padded with zeros.
+
+    Args:
+        path (str | pathlib.Path): Path of the EDF file
+        data (np.ndarray): (n_channels, n_samples) array
+        sf (float): Sampling frequency of the data
+        chanLabels (list(str)): Label of each channel
+
+    Kwargs:
+        tStart (float | None): Time in seconds of the first sample in the
+            recordings. Only used with `startDatetime` (default 0.0)
+        unit (str): Unit of the data (default UNIT)
+        startDatetime (datetime.datetime | None): Start of the recording.
+            The start of the exported data is `tStart` seconds later.
+            Unknown (01.01.85, per the EDF+ specification) by default.
+        recordDuration (float): Duration in seconds of each data record
+            (default RECORD_DURATION)
+        chunkDuration (float): Duration in seconds of the data converted and
+            written at once (default CHUNK_DURATION)
+        sources (list | None): Paths of the recordings, saved in the
+            recording identification field (default None)
+    """
+    assert data.shape[0] == len(chanLabels)
+    nChans, nSamp = data.shape
+    nPerRecord = max(int(round(sf * recordDuration)), 1)
+    recordDuration = nPerRecord / sf
+    nRecords = int(np.ceil(nSamp / nPerRecord))
+    if startDatetime is not None and tStart:
+        startDatetime += datetime.timedelta(seconds=float(tStart))
+
+    # Physical range of each channel
+    physMin = np.full(nChans, np.inf)
+    physMax = np.full(nChans, -np.inf)
+    for start, stop in _iter_chunks(nSamp, sf, chunkDuration):
+        physMin = np.minimum(physMin, data[:, start:stop].min(axis=1))
+        physMax = np.maximum(physMax, data[:, start:stop].max(axis=1))
+    if nSamp == 0:
+        physMin[:], physMax[:] = 0, 0
+    flat = physMax <= physMin
+    physMin[flat] -= 1
+    physMax[flat] += 1
+    # Bounds as written in the header, used for scaling
+    physMin = np.array([_edf_bound(v, lower=True) for v in physMin])
+    physMax = np.array([_edf_bound(v, lower=False) for v in physMax])
+    digMin, digMax = EDF_DIGITAL_RANGE
+    gain = (physMax - physMin) / (digMax - digMin)
+    offset = digMin - physMin / gain
+
+    longLabels = [label for label in chanLabels if len(label) > 16]
+    if longLabels:
+        print(f"Warning: EDF labels are truncated to 16 characters. Full "
+              f"labels are saved in the transducer field: {longLabels}")
+
+    # Header (EDF+C)
+    if startDatetime is None:
+        startdate = 'X'
+        startDatetime = datetime.datetime(1985, 1, 1)
+    else:
+        startdate = startDatetime.strftime('%d-%b-%Y').upper()
+    recordingId = f"Startdate {startdate} X X sleepscore"
+    if sources:
+        recordingId += ' ' + ' '.join(Path(str(s)).name for s in sources)
+    signals = [
+        {'label': label, 'transducer': label, 'unit': unit,
+         'physMin': float(physMin[i]), 'physMax': float(physMax[i]),
+         'digMin': digMin, 'digMax': digMax, 'nSamples': nPerRecord}
+        for i, label in enumerate(chanLabels)
+    ] + [
+        {'label': 'EDF Annotations', 'transducer': '', 'unit': '',
+         'physMin': -1, 'physMax': 1, 'digMin': digMin, 'digMax': digMax,
+         'nSamples': EDF_ANNOTATION_SAMPLES},
+    ]
+    header = (
+        _edf_field('0', 8)
+        + _edf_field('X X X X', 80)
+        + _edf_field(recordingId, 80)
+        + startDatetime.strftime('%d.%m.%y')
+        + startDatetime.strftime('%H.%M.%S')
+        + _edf_field(256 * (len(signals) + 1), 8)
+        + _edf_field('EDF+C', 44)
+        + _edf_field(nRecords, 8)
+        + _edf_field(recordDuration, 8)
+        + _edf_field(len(signals), 4)
+    )
+    for key, width in [('label', 16), ('transducer', 80), ('unit', 8),
+                       ('physMin', 8), ('physMax', 8), ('digMin', 8),
+                       ('digMax', 8)]:
+        header += ''.join(_edf_field(s[key], width) for s in signals)
+    header += _edf_field('', 80) * len(signals)  # Prefiltering
+    header += ''.join(_edf_field(s['nSamples'], 8) for s in signals)
+    header += _edf_field('', 32) * len(signals)  # Reserved
+
+    # Data records, written by chunks of whole records
+    nChunkRecords = max(int(chunkDuration / recordDuration), 1)
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        for r0 in range(0, nRecords, nChunkRecords):
+            r1 = min(r0 + nChunkRecords, nRecords)
+            chunk = np.zeros((nChans, (r1 - r0) * nPerRecord))
+            values = data[:, r0 * nPerRecord:r1 * nPerRecord]
+            chunk[:, :values.shape[1]] = values
+            digital = np.clip(
+                np.round(chunk / gain[:, np.newaxis] + offset[:, np.newaxis]),
+                digMin, digMax,
+            ).astype('<i2')
+            # (n_records, n_channels, n_samples_per_record)
+            records = digital.reshape(
+                nChans, r1 - r0, nPerRecord
+            ).transpose(1, 0, 2)
+            annotations = np.zeros(
+                (r1 - r0, 2 * EDF_ANNOTATION_SAMPLES), dtype='uint8'
+            )
+            for i, r in enumerate(range(r0, r1)):
+                # Time-keeping annotation: onset of the record
+                tal = f"+{r * recordDuration:g}\x14\x14\x00".encode('ascii')
+                annotations[i, :len(tal)] = np.frombuffer(tal, dtype='uint8')
+            f.write(np.concatenate([
+                records.reshape(r1 - r0, -1).view('uint8'), annotations,
+            ], axis=1).tobytes())
+    print(f"Saved {nChans} channels x {nRecords} records of "
+          f"{recordDuration:g}s at {path}")
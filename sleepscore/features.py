@@ -0,0 +1,162 @@
+"""Per-epoch spectral features of the data passed to Sleep."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.signal
+
+from .load import utils
+
+EPOCH_DURATION = 4.0  # (s)
+
+# Frequency bands (Hz)
+BANDS = {
+    'delta': (0.5, 4.0),
+    'theta': (5.0, 10.0),
+    'sigma': (11.0, 16.0),
+    'gamma': (30.0, 45.0),
+}
+
+# (<numerator band>, <denominator band>)
+RATIOS = [
+    ('theta', 'delta'),
+    ('sigma', 'delta'),
+    ('delta', 'gamma'),
+]
+
+EMG_CHANLABELS = ['derivedEMG']
+
+BLOCK_SIZE = 2**22  # Number of samples processed at once by each thread
+
+
+def compute_features(data, sf, chanLabels, epochDuration=EPOCH_DURATION,
+                     bands=None, ratios=None, emgLabels=None,
+                     welchDuration=None, nJobs=None):
+    """Compute per-epoch, per-channel band powers, band ratios and RMS.
+
+    The data is cut in non-overlapping epochs, and the power spectral density of
+    whole blocks of epochs is estimated at once with Welch's method. Blocks of
+    epochs of each channel are processed in parallel threads.
+
+    Args:
+        data (np.ndarray): (n_channels, n_samples) array
+        sf (float): Sampling frequency of the data
+        chanLabels (list(str)): Label of each channel
+
+    Kwargs:
+        epochDuration (float): Duration of epochs in seconds
+            (default EPOCH_DURATION)
+        bands (dict | None): {<band_name>: (<fmin>, <fmax>)} Frequency bands
+            (Hz). Bands above Nyquist frequency are ignored. (default BANDS)
+        ratios (list(tuple) | None): List of (<numerator>, <denominator>)
+            band names. (default RATIOS)
+        emgLabels (list(str) | None): Labels of EMG channels, for which only
+            the RMS is computed. (default EMG_CHANLABELS)
+        welchDuration (float | None): Duration in seconds of Welch's segments.
+            Half of the epoch by default.
+        nJobs (int | None): Number of threads. Number of CPUs by default.
+
+    Returns:
+        pd.DataFrame: Long-format table with one row per epoch and channel, and
+            the following columns: 'epoch', 'start_time', 'channel', <bands>,
+            <numerator>_<denominator> for each ratio, 'rms'.
+    """
+    if bands is None:
+        bands = BANDS
+    if ratios is None:
+        ratios = RATIOS
+    if emgLabels is None:
+        emgLabels = EMG_CHANLABELS
+    if nJobs is None:
+        nJobs = os.cpu_count()
+    assert data.shape[0] == len(chanLabels)
+
+    bands = {
+        name: (fmin, fmax) for name, (fmin, fmax) in bands.items()
+        if fmin < sf / 2
+    }
+    ratios = [(num, den) for num, den in ratios if num in bands and den in bands]
+
+    nEpochSamp = int(epochDuration * sf)
+    nEpochs = data.shape[1] // nEpochSamp
+    if welchDuration is None:
+        nperseg = nEpochSamp // 2
+    else:
+        nperseg = min(int(welchDuration * sf), nEpochSamp)
+    print(f"Compute features for N={nEpochs} epochs of {epochDuration}s and "
+          f"N={len(chanLabels)} channels")
+
+    isEMG = np.array([label in emgLabels for label in chanLabels])
+
+    def block_features(row, e0, e1):
+        # (n_epochs, n_epoch_samples) view of the data
+        x = np.asarray(
+            data[row, e0 * nEpochSamp:e1 * nEpochSamp], dtype='float32'
+        ).reshape(e1 - e0, nEpochSamp)
+        rms[row, e0:e1] = np.sqrt(np.mean(np.square(x), axis=-1))
+        if isEMG[row]:
+            return
+        f, psd = scipy.signal.welch(x, fs=sf, nperseg=nperseg, axis=-1)
+        # (n_freqs, n_bands) matrix integrating the PSD over each band
+        bandMatrix = np.stack([
+            ((f >= fmin) & (f < fmax)) * (f[1] - f[0])
+            for fmin, fmax in bands.values()
+        ], axis=-1).astype(psd.dtype)
+        power[row, e0:e1, :] = psd @ bandMatrix
+
+    rms = np.full((len(chanLabels), nEpochs), np.nan, dtype='float32')
+    power = np.full((len(chanLabels), nEpochs, len(bands)), np.nan,
+                    dtype='float32')
+
+    # Blocks of epochs of each channel are processed in parallel. The size of
+    # blocks bounds the memory used by each thread.
+    nBlockEpochs = max(BLOCK_SIZE // nEpochSamp, 1)
+    with ThreadPoolExecutor(max_workers=nJobs) as executor:
+        futures = [
+            executor.submit(
+                block_features, row, e0, min(e0 + nBlockEpochs, nEpochs)
+            )
+            for row in range(len(chanLabels))
+            for e0 in range(0, nEpochs, nBlockEpochs)
+        ]
+        for future in futures:
+            future.result()
+
+    # Long format table: one row per (channel, epoch)
+    bandNames = list(bands.keys())
+    features = pd.DataFrame({
+        'epoch': np.tile(np.arange(nEpochs, dtype='int32'), len(chanLabels)),
+        'start_time': np.tile(
+            np.arange(nEpochs) * epochDuration, len(chanLabels)
+        ).astype('float32'),
+        'channel': pd.Categorical(
+            np.repeat(np.array(chanLabels, dtype=object), nEpochs),
+            categories=list(dict.fromkeys(chanLabels)),
+        ),
+    })
+    for i, name in enumerate(bandNames):
+        features[name] = power[:, :, i].ravel()
+    for num, den in ratios:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features[f'{num}_{den}'] = (
+                power[:, :, bandNames.index(num)]
+                / power[:, :, bandNames.index(den)]
+            ).ravel()
+    features['rms'] = rms.ravel()
+    return features
+
+
+def save_features(path, data, sf, chanLabels, **kwargs):
+    """Compute per-epoch features and save them as a table.
+
+    The table format is inferred from the extension of `path`. See
+    `load.utils.save_table`.
+
+    Kwargs:
+        **kwargs: Passed to `compute_features`
+    """
+    features = compute_features(data, sf, chanLabels, **kwargs)
+    utils.save_table(path, features)
+    print(f"Saved features table at {path}")
+    return features
@@ -0,0 +1,228 @@
+"""Gather the data of selected vigilance states across recordings.
+
+Scored epochs of the requested states are selected from the hypnogram of each
+recording, and contiguous epochs are merged into segments. Only the time
+window of each segment is read from the raw data (see `Recording.read`), with
+the same gain conversion, derivations, filters and resampling as
+`load_and_score`. Segments are read in parallel threads and written directly
+into a preallocated output array, so that the memory used doesn't depend on
+the duration of the recordings. For instance, all the NREM epochs of a channel
+across nights, at 500Hz::
+
+    datasets = [{'binPath': path, 'chanList': ["LF0;384"]} for path in bins]
+    data, sf, chanLabels, epochs = gather_states(
+        datasets, hypnograms, ['N2', 'N3'], downSample=500.0,
+    )
+    # Data of the 10th epoch
+    row = epochs.iloc[10]
+    epochData = data[:, row['sample']:row['sample'] + row['n_samples']]
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import hypno
+from .load import loader_switch, monitor, probe_switch
+from .load.progressive import CHUNK_DURATION
+
+
+def state_segments(hypnogram, states, epochDuration=hypno.EPOCH_DURATION,
+                   tStart=0.0, duration=None,
+                   maxSegmentDuration=CHUNK_DURATION):
+    """Return the epochs of the requested states, grouped in segments.
+
+    Args:
+        hypnogram (pd.DataFrame): Hypnogram as returned by
+            `hypno.read_hypnogram`
+        states (list(str)): Selected states
+
+    Kwargs:
+        epochDuration (float): Duration of epochs in seconds. Each epoch is
+            assigned the state at its center (default hypno.EPOCH_DURATION)
+        tStart (float): Time in the recording of the start of the hypnogram
+            (default 0.0)
+        duration (float | None): Duration of the recording. Epochs ending
+            after the recording are dropped (default None)
+        maxSegmentDuration (float): Longer runs of epochs are split in
+            several segments, read independently (default CHUNK_DURATION)
+
+    Returns:
+        pd.DataFrame: One row per selected epoch, with 'state', 'start_time'
+            (in the recording) and 'segment' (index of the segment of
+            contiguous epochs) columns
+    """
+    codes, timebase, states = hypno.to_epochs(
+        hypnogram, epochDuration=epochDuration, states=states
+    )
+    startTimes = timebase + tStart
+    selected = codes != hypno.UNSCORED_CODE
+    if duration is not None:
+        selected &= startTimes + epochDuration <= duration
+    idx = np.flatnonzero(selected)
+    # New segment after each gap, and every `maxEpochs` epochs
+    maxEpochs = max(int(maxSegmentDuration / epochDuration), 1)
+    newRun = np.r_[True, np.diff(idx) > 1] if len(idx) else np.zeros(0, bool)
+    runStart = np.maximum.accumulate(np.where(newRun, np.arange(len(idx)), 0))
+    newSegment = newRun | ((np.arange(len(idx)) - runStart) % maxEpochs == 0)
+    return pd.DataFrame({
+        'state': np.array(states, dtype=object)[codes[idx]],
+        'start_time': startTimes[idx],
+        'segment': np.cumsum(newSegment) - 1,
+    })
+
+
+def gather_states(datasets, hypnograms, states, tStart=None, downSample=None,
+                  ds_method='interpolation', epochDuration=hypno.EPOCH_DURATION,
+                  nWorkers=None, progress=None, cancelToken=None):
+    """Return the data of the epochs of selected states across recordings.
+
+    Args:
+        datasets (list(dict)): Dataset dictionaries, as in `load_and_score`.
+            All datasets should have the same number of output channels.
+            `sync` is ignored.
+        hypnograms (list(str | pathlib.Path | pd.DataFrame)): Hypnogram of
+            each dataset, as a path to a hypnogram exported from Sleep or as
+            returned by `hypno.read_hypnogram`
+        states (list(str)): Selected states (eg ['N2', 'N3'])
+
+    Kwargs:
+        tStart (float | list(float) | None): Time in the recording of the
+            start of the hypnogram (the `tStart` used when scoring), for all
+            datasets or for each dataset (default 0.0)
+        downSample (int | float | None): Frequency in Hz at which the data is
+            subsampled. All datasets should have the same sampling rate if
+            None (default None)
+        ds_method (str): Method for resampling. See `load_and_score`
+            (default 'interpolation')
+        epochDuration (float): Duration of epochs in seconds
+            (default hypno.EPOCH_DURATION)
+        nWorkers (int | None): Number of threads reading segments. Passed to
+            ThreadPoolExecutor (default None)
+        progress (callable | None): Called with a 'gather' stage event for a
+            dataset each time one of its segments is gathered (samples of the
+            output array). See `load.monitor` (default None)
+        cancelToken (load.monitor.CancelToken | None): Checked by the
+            loaders of all the segments (default None)
+
+    Returns:
+        data (np.ndarray): (n_channels, n_epochs * n_samples_per_epoch)
+            float32 array, concatenating the epochs of all datasets in
+            order
+        sf (float): Sampling frequency of the data
+        chanLabels (list(str)): Displayed labels of the channels of the
+            first dataset
+        epochs (pd.DataFrame): One row per epoch, with 'dataset' (index),
+            'name', 'state', 'start_time' (in the recording), 'segment',
+            'sample' (index of the first sample in `data`) and 'n_samples'
+            columns
+    """
+    from . import get_dataset_labels, validate_datasets
+
+    datasets = validate_datasets(datasets)
+    assert len(hypnograms) == len(datasets)
+    if tStart is None or np.isscalar(tStart):
+        tStart = [tStart or 0.0] * len(datasets)
+    if any(d['sync'] is not None for d in datasets):
+        print("Warning: datasets are not aligned on their sync channel")
+
+    # Metadata and epochs of each dataset
+    all_epochs = []
+    sRates = []
+    chanLabels = None
+    for i, dataset_dict in enumerate(datasets):
+        sRate, duration, chanOrigLabels = probe_switch(
+            dataset_dict['binPath'],
+            datatype=dataset_dict['datatype'],
+            chanList=dataset_dict['chanList'],
+            derivations=dataset_dict['derivations'],
+        )
+        labels = get_dataset_labels(chanOrigLabels, dataset_dict)
+        if chanLabels is None:
+            chanLabels = labels
+        elif len(labels) != len(chanLabels):
+            raise ValueError(
+                f"All datasets should have the same number of channels: "
+                f"{len(labels)} channels for dataset #{i+1}, "
+                f"{len(chanLabels)} for dataset #1"
+            )
+        sRates.append(sRate)
+        hypnogram = hypnograms[i]
+        if not isinstance(hypnogram, pd.DataFrame):
+            hypnogram = hypno.read_hypnogram(hypnogram)
+        epochs = state_segments(
+            hypnogram, states, epochDuration=epochDuration, tStart=tStart[i],
+            duration=duration,
+        )
+        epochs.insert(0, 'dataset', i)
+        epochs.insert(1, 'name', dataset_dict['name'])
+        all_epochs.append(epochs)
+
+    if downSample is None:
+        if len(set(sRates)) > 1:
+            raise ValueError(
+                f"Datasets have different sampling rates ({set(sRates)}): "
+                f"please specify a `downSample` value."
+            )
+        sf = sRates[0]
+    else:
+        sf = downSample
+    nPerEpoch = int(round(epochDuration * sf))
+    epochs = pd.concat(all_epochs, ignore_index=True)
+    # Segments are numbered across datasets
+    epochs['segment'] = (
+        epochs[['dataset', 'segment']].diff().abs().sum(axis=1) > 0
+    ).cumsum()
+    epochs['sample'] = np.arange(len(epochs)) * nPerEpoch
+    epochs['n_samples'] = nPerEpoch
+    segments = epochs.groupby('segment').agg(
+        dataset=('dataset', 'first'), start_time=('start_time', 'first'),
+        sample=('sample', 'first'), n_epochs=('sample', 'size'),
+    )
+
+    data = np.zeros((len(chanLabels), len(epochs) * nPerEpoch),
+                    dtype='float32')
+    print(f"\nGather N={len(epochs)} epochs of {epochDuration}s in states "
+          f"{states} from N={len(datasets)} datasets "
+          f"({len(epochs) * epochDuration:.1f}s in N={len(segments)} segments)"
+          f": {data.shape[0]} channels x {data.shape[1]} samples at {sf}Hz "
+          f"({data.nbytes / 1e9:.2f}GB)")
+
+    gathered = np.zeros(len(datasets), dtype=int)
+    totals = segments.groupby('dataset')['n_epochs'].sum() * nPerEpoch
+    lock = threading.Lock()
+
+    def gather_segment(segment):
+        d = segment.dataset
+        dataset_dict = datasets[d]
+        t0 = segment.start_time
+        chunk, _, _ = loader_switch(
+            dataset_dict['binPath'],
+            datatype=dataset_dict['datatype'],
+            chanList=dataset_dict['chanList'],
+            derivations=dataset_dict['derivations'],
+            filters=dataset_dict['filters'],
+            zeroPhase=dataset_dict['zeroPhase'],
+            useLF=dataset_dict['useLF'],
+            cancelToken=cancelToken,
+            downSample=downSample,
+            ds_method=ds_method,
+            tStart=t0,
+            # Last sample of the last epoch, so that the segment is resampled
+            # on the same grid as the whole recording
+            tEnd=t0 + segment.n_epochs * epochDuration - 0.5 / sRates[d],
+            verbose=False,
+        )
+        n = min(segment.n_epochs * nPerEpoch, chunk.shape[1])
+        data[:, segment.sample:segment.sample + n] = chunk[:, :n]
+        with lock:
+            gathered[d] += segment.n_epochs * nPerEpoch
+            monitor.report(progress, 'gather', int(gathered[d]),
+                           int(totals[d]), dataset=int(d))
+
+    with ThreadPoolExecutor(max_workers=nWorkers) as executor:
+        list(executor.map(gather_segment, segments.itertuples(index=False)))
+    print(f"Gathered N={len(epochs)} epochs")
+
+    return data, sf, chanLabels, epochs
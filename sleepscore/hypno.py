@@ -0,0 +1,228 @@
+"""Read, write and summarize hypnograms exported from Sleep."""
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .load import utils
+
+EPOCH_DURATION = 1.0  # (s)
+
+UNSCORED_CODE = -1  # Code of epochs not covered by the hypnogram
+
+
+def read_hypnogram(path):
+    """Read a hypnogram saved by Sleep in the 'time' format.
+
+    The file is formatted as follows::
+        *Duration_sec	<duration>
+        *Datafile	<datafile>
+        <state>	<end_time>
+        <state>	<end_time>
+        ...
+
+    Returns:
+        pd.DataFrame: One row per bout, with 'state', 'start_time', 'end_time'
+            and 'duration' columns
+    """
+    hypno = pd.read_csv(
+        path, sep='\t', names=['state', 'end_time'], comment='*',
+        dtype={'state': str, 'end_time': float},
+    )
+    hypno['start_time'] = hypno['end_time'].shift(fill_value=0.0)
+    hypno['duration'] = hypno['end_time'] - hypno['start_time']
+    return hypno[['state', 'start_time', 'end_time', 'duration']]
+
+
+def write_hypnogram(path, states, endTimes, datafile='Unspecified'):
+    """Write a hypnogram in Sleep's 'time' format. See `read_hypnogram`.
+
+    Args:
+        path (str | pathlib.Path): Path to the .txt hypnogram file
+        states (list(str)): State of each bout
+        endTimes (list(float)): End time of each bout in seconds
+    """
+    assert len(states) == len(endTimes)
+    with open(path, 'w') as f:
+        f.write(f"*Duration_sec\t{endTimes[-1] if len(endTimes) else 0.0}\n")
+        f.write(f"*Datafile\t{datafile}\n")
+        for state, endTime in zip(states, endTimes):
+            f.write(f"{state}\t{endTime}\n")
+
+
+def to_epochs(hypno, epochDuration=EPOCH_DURATION, states=None):
+    """Return epoch-coded array of states.
+
+    Each epoch is assigned the state at its center.
+
+    Args:
+        hypno (pd.DataFrame): Hypnogram as returned by `read_hypnogram`
+
+    Kwargs:
+        epochDuration (float): Duration of epochs in seconds
+            (default EPOCH_DURATION)
+        states (list(str) | None): Ordered list of states. The code of a state
+            is its index in this list. If None, the sorted list of states in
+            the hypnogram is used. (default None)
+
+    Returns:
+        codes (np.ndarray): (n_epochs, ) int8 array of state codes. Epochs
+            outside of the hypnogram or in a state absent from `states` are
+            coded as UNSCORED_CODE.
+        timebase (np.ndarray): (n_epochs, ) array of epoch start times
+        states (list(str)): List of states, indexed by code
+    """
+    if states is None:
+        states = sorted(hypno['state'].unique())
+    states = list(states)
+    assert len(states) <= np.iinfo('int8').max
+
+    stateCodes = np.array(
+        [states.index(s) if s in states else UNSCORED_CODE
+         for s in hypno['state']] + [UNSCORED_CODE],
+        dtype='int8',
+    )
+    duration = hypno['end_time'].iloc[-1] if len(hypno) else 0.0
+    timebase = np.arange(int(np.ceil(duration / epochDuration))) * epochDuration
+    centers = timebase + epochDuration / 2
+    bout = np.searchsorted(hypno['end_time'].values, centers, side='right')
+    return stateCodes[bout], timebase, states
+
+
+def run_lengths(codes):
+    """Return start indices, lengths and values of runs of identical codes."""
+    if not len(codes):
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), codes[:0]
+    starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+    lengths = np.diff(np.r_[starts, len(codes)])
+    return starts, lengths, codes[starts]
+
+
+def bout_statistics(codes, states, epochDuration=EPOCH_DURATION):
+    """Return per-state bout statistics, transitions and latencies.
+
+    Args:
+        codes (np.ndarray): Epoch-coded array of states (see `to_epochs`)
+        states (list(str)): List of states, indexed by code
+
+    Kwargs:
+        epochDuration (float): Duration of epochs in seconds
+            (default EPOCH_DURATION)
+
+    Returns:
+        pd.DataFrame: One row per state, with the following columns:
+            'state', 'total_duration', 'fraction', 'n_bouts',
+            'mean_bout_duration', 'median_bout_duration', 'max_bout_duration',
+            'latency' (start time of first bout) and 'n_to_<state>' (number
+            of transitions to each state). Unscored epochs split bouts, and
+            bouts separated by unscored epochs are not counted as
+            transitions.
+    """
+    nStates = len(states)
+    starts, lengths, values = run_lengths(codes)
+    # Transitions between adjacent scored bouts
+    adjacent = (values[:-1] != UNSCORED_CODE) & (values[1:] != UNSCORED_CODE)
+    transitions = np.bincount(
+        values[:-1][adjacent].astype(int) * nStates + values[1:][adjacent],
+        minlength=nStates * nStates,
+    ).reshape(nStates, nStates)
+    scored = values != UNSCORED_CODE
+    starts, lengths, values = starts[scored], lengths[scored], values[scored]
+    durations = lengths * epochDuration
+
+    nBouts = np.bincount(values, minlength=nStates)
+    totalDuration = np.bincount(values, weights=durations, minlength=nStates)
+    maxDuration = np.zeros(nStates)
+    np.maximum.at(maxDuration, values, durations)
+    latency = np.full(nStates, np.nan)
+    np.fmin.at(latency, values, starts * epochDuration)
+
+    # Median bout duration: sort bouts by state, then by duration
+    medianDuration = np.full(nStates, np.nan)
+    if len(durations):
+        sortedDurations = durations[np.lexsort((durations, values))]
+        firstBout = np.r_[0, np.cumsum(nBouts)[:-1]]
+        hasBouts = nBouts > 0
+        lo = (firstBout + (nBouts - 1) // 2)[hasBouts]
+        hi = (firstBout + nBouts // 2)[hasBouts]
+        medianDuration[hasBouts] = (sortedDurations[lo] + sortedDurations[hi]) / 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        meanDuration = totalDuration / nBouts
+
+    stats = pd.DataFrame({
+        'state': states,
+        'total_duration': totalDuration,
+        'fraction': totalDuration / max(totalDuration.sum(), epochDuration),
+        'n_bouts': nBouts,
+        'mean_bout_duration': meanDuration,
+        'median_bout_duration': medianDuration,
+        'max_bout_duration': maxDuration,
+        'latency': latency,
+    })
+    for j, state in enumerate(states):
+        stats[f'n_to_{state}'] = transitions[:, j]
+    return stats
+
+
+def read_states(path):
+    """Return the set of states in a hypnogram file."""
+    return set(read_hypnogram(path)['state'])
+
+
+def summarize_hypnogram(path, epochDuration=EPOCH_DURATION, states=None):
+    """Return bout statistics of a hypnogram file. See `bout_statistics`."""
+    codes, _, states = to_epochs(
+        read_hypnogram(path), epochDuration=epochDuration, states=states
+    )
+    stats = bout_statistics(codes, states, epochDuration=epochDuration)
+    stats.insert(0, 'hypnogram', str(path))
+    return stats
+
+
+def summarize_hypnograms(paths, outPath=None, epochDuration=EPOCH_DURATION,
+                         states=None, nJobs=None):
+    """Summarize many hypnogram files in parallel processes.
+
+    Args:
+        paths (list(str | pathlib.Path)): Paths to hypnograms exported by
+            Sleep
+
+    Kwargs:
+        outPath (str | pathlib.Path | None): If specified, the summary table
+            is saved at this path. See `load.utils.save_table`
+        epochDuration (float): Duration of epochs in seconds
+            (default EPOCH_DURATION)
+        states (list(str) | None): Ordered list of states. If None, the states
+            found across all hypnograms are used.
+        nJobs (int | None): Number of processes. Number of CPUs by default.
+
+    Returns:
+        pd.DataFrame: Concatenated output of `summarize_hypnogram`, with one
+            row per hypnogram and state.
+    """
+    paths = [Path(p) for p in paths]
+    if nJobs is None:
+        nJobs = os.cpu_count()
+    summarize = functools.partial(
+        summarize_hypnogram, epochDuration=epochDuration, states=states
+    )
+    chunksize = max(len(paths) // (4 * nJobs), 1)
+    with ProcessPoolExecutor(max_workers=nJobs) as executor:
+        if states is None:
+            # Same states and transition columns for all hypnograms
+            states = sorted(set().union(
+                *executor.map(read_states, paths, chunksize=chunksize)
+            ))
+            summarize = functools.partial(summarize, states=states)
+        print(f"Summarize N={len(paths)} hypnograms with N={nJobs} processes, "
+              f"states={states}")
+        all_stats = list(executor.map(summarize, paths, chunksize=chunksize))
+    summary = pd.concat(all_stats, ignore_index=True) if all_stats else None
+
+    if outPath is not None and summary is not None:
+        utils.save_table(outPath, summary)
+        print(f"Saved hypnogram summary at {outPath}")
+    return summary
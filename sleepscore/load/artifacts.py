@@ -0,0 +1,282 @@
+"""Per-epoch artifact indicators computed on the raw data during loading.
+
+Loaders pass each block of raw data they read to an `ArtifactIndex`, which
+accumulates, for each loaded channel and each epoch:
+    - the number of clipped samples (at the rails of the ADC, SpikeGLX only)
+    - the longest run of identical consecutive samples (flatline)
+    - the RMS of the signal
+Epochs are then flagged with a bitmask of FLAGS. RMS outliers are detected
+from the robust z-score (median and MAD across epochs) of the log RMS of each
+channel, so that epochs of disconnected channels are flagged as low RMS.
+
+The index doesn't require reading the data again, and is available as soon as
+loading finishes. Flagged epochs can be displayed in Sleep as annotations.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import utils
+
+EPOCH_DURATION = 4.0  # (s)
+FLAT_DURATION = 0.5  # (s) Minimum duration of flatlines
+RMS_THRESHOLD = 5.0  # Robust z-score of the log RMS of outlier epochs
+
+FLAGS = {
+    'clip': 1,
+    'flat': 2,
+    'rms_high': 4,
+    'rms_low': 8,
+}
+
+
+class ArtifactIndex:
+    """Accumulate per-epoch artifact indicators of loaded channels.
+
+    Channels of each loaded stream are registered with `add_channels`, which
+    returns an accumulator that is updated with consecutive blocks of raw data.
+
+    Kwargs:
+        epochDuration (float): Duration of epochs in seconds
+            (default EPOCH_DURATION)
+        flatDuration (float): Minimum duration in seconds of a run of
+            identical samples flagged as flatline (default FLAT_DURATION)
+        rmsThreshold (float): Robust z-score of the log RMS above (below)
+            which epochs are flagged as high (low) RMS (default RMS_THRESHOLD)
+    """
+
+    def __init__(self, epochDuration=EPOCH_DURATION, flatDuration=FLAT_DURATION,
+                 rmsThreshold=RMS_THRESHOLD):
+        self.epochDuration = epochDuration
+        self.flatDuration = flatDuration
+        self.rmsThreshold = rmsThreshold
+        self.accumulators = []
+
+    def add_channels(self, labels, sRate, nSamp, firstSamp=0, rails=None,
+                     conv=None):
+        """Register channels and return their `_Accumulator`.
+
+        Args:
+            labels (list(str)): Labels of the channels
+            sRate (float): Sampling rate of the raw data
+            nSamp (int): Number of loaded samples
+
+        Kwargs:
+            firstSamp (int): Index of the first loaded sample in the recording
+                (default 0)
+            rails (int | None): Largest absolute value of the ADC. Samples
+                with values <= -rails or >= rails - 1 are clipped. No clipping
+                detection if None (default None)
+            conv (np.ndarray | None): Per-channel factor converting raw values
+                to the unit of the RMS (default None)
+        """
+        accumulator = _Accumulator(
+            list(labels), sRate, nSamp, firstSamp,
+            max(int(round(self.epochDuration * sRate)), 1), rails, conv,
+        )
+        self.accumulators.append(accumulator)
+        return accumulator
+
+    def to_table(self, name=None):
+        """Return long-format table with one row per epoch and channel.
+
+        Columns are 'epoch', 'start_time' (from the first loaded sample),
+        'channel', 'clipped' (number of clipped samples), 'flatline'
+        (duration in seconds of the longest flatline), 'rms' and 'bitmask'
+        (sum of FLAGS).
+
+        Kwargs:
+            name (str | None): Prepended to the channel labels if specified
+        """
+        tables = []
+        for acc in self.accumulators:
+            labels = acc.labels
+            if name:
+                labels = [f"{name},{label}" for label in labels]
+            tables.append(pd.DataFrame({
+                'epoch': np.tile(
+                    np.arange(acc.nEpochs, dtype='int32'), len(labels)
+                ),
+                'start_time': np.tile(
+                    np.arange(acc.nEpochs) * self.epochDuration, len(labels)
+                ).astype('float32'),
+                'channel': np.repeat(
+                    np.array(labels, dtype=object), acc.nEpochs
+                ),
+                'clipped': acc.clip.ravel(),
+                'flatline': (acc.flat / acc.sRate).astype('float32').ravel(),
+                'rms': acc.rms().astype('float32').ravel(),
+                'bitmask': self.flags(acc).ravel(),
+            }))
+        if not tables:
+            return pd.DataFrame(columns=[
+                'epoch', 'start_time', 'channel', 'clipped', 'flatline', 'rms',
+                'bitmask',
+            ])
+        return pd.concat(tables, ignore_index=True)
+
+    def flags(self, acc):
+        """Return (n_channels, n_epochs) uint8 bitmask of an accumulator."""
+        flags = np.zeros(acc.clip.shape, dtype='uint8')
+        flags[acc.clip > 0] |= FLAGS['clip']
+        flags[acc.flat >= self.flatDuration * acc.sRate] |= FLAGS['flat']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logRms = np.log10(acc.rms())
+        for i, row in enumerate(logRms):
+            finite = row[np.isfinite(row)]
+            # Zero RMS is always an outlier
+            flags[i, row == -np.inf] |= FLAGS['rms_low']
+            if not len(finite):
+                continue
+            median = np.median(finite)
+            mad = 1.4826 * np.median(np.abs(finite - median))
+            if mad == 0:
+                continue
+            z = (row - median) / mad
+            flags[i, np.isfinite(z) & (z > self.rmsThreshold)] |= \
+                FLAGS['rms_high']
+            flags[i, np.isfinite(z) & (z < -self.rmsThreshold)] |= \
+                FLAGS['rms_low']
+        return flags
+
+
+class _Accumulator:
+    """Per-epoch indicators of a group of channels sampled together."""
+
+    def __init__(self, labels, sRate, nSamp, firstSamp, nEpochSamp, rails,
+                 conv):
+        self.labels = labels
+        self.sRate = sRate
+        self.firstSamp = firstSamp
+        self.nEpochSamp = nEpochSamp
+        self.rails = rails
+        self.conv = np.ones(len(labels)) if conv is None else np.asarray(conv)
+        self.nEpochs = max(int(np.ceil(nSamp / nEpochSamp)), 1)
+        shape = (len(labels), self.nEpochs)
+        self.clip = np.zeros(shape, dtype='int32')
+        self.flat = np.zeros(shape, dtype='int32')
+        self.sumsq = np.zeros(shape)
+        self.count = np.zeros(self.nEpochs, dtype='int64')
+        # Last sample and length of the current run of identical samples
+        self.pos = None
+        self.last = None
+        self.run = None
+
+    def update(self, raw, start):
+        """Accumulate (n_channels, n) raw block starting at sample `start`."""
+        n = raw.shape[1]
+        if not n:
+            return
+        # Epoch of each sample, and first sample of each epoch in the block
+        epochs = (start - self.firstSamp + np.arange(n)) // self.nEpochSamp
+        bounds = np.concatenate(
+            [[0], np.flatnonzero(np.diff(epochs)) + 1]
+        )
+        idx = epochs[bounds]
+
+        if self.rails is not None:
+            clipped = (raw <= -self.rails) | (raw >= self.rails - 1)
+            self.clip[:, idx] += np.add.reduceat(
+                clipped, bounds, axis=1, dtype='int32'
+            )
+        rawFloat = raw.astype(float)
+        self.sumsq[:, idx] += np.add.reduceat(rawFloat**2, bounds, axis=1)
+        self.count[idx] += np.diff(np.append(bounds, n))
+
+        # Length of the run of identical samples ending at each sample
+        changed = np.empty(raw.shape, dtype=bool)
+        changed[:, 1:] = raw[:, 1:] != raw[:, :-1]
+        if self.pos == start:
+            changed[:, 0] = raw[:, 0] != self.last
+        else:
+            changed[:, 0] = True
+        positions = np.arange(n, dtype='int32')
+        lastChange = np.maximum.accumulate(
+            np.where(changed, positions, -1), axis=1
+        )
+        run = positions - lastChange + 1
+        if self.pos == start:
+            # Runs continued from the previous block
+            continued = lastChange < 0
+            run[continued] = (positions[np.newaxis, :] + 1
+                              + self.run[:, np.newaxis])[continued]
+        self.flat[:, idx] = np.maximum(
+            self.flat[:, idx], np.maximum.reduceat(run, bounds, axis=1)
+        )
+        self.pos = start + n
+        self.last = raw[:, -1].copy()
+        self.run = run[:, -1].copy()
+
+    def rms(self):
+        """Return (n_channels, n_epochs) RMS in converted units."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            meanSq = self.sumsq / self.count[np.newaxis, :]
+        return np.sqrt(meanSq) * np.abs(self.conv)[:, np.newaxis]
+
+
+def annotations_from_table(artifacts):
+    """Return (start, end, text) of epochs with flagged channels.
+
+    Consecutive epochs with the same flagged channels are merged.
+
+    Args:
+        artifacts (pd.DataFrame): Table returned by `ArtifactIndex.to_table`
+    """
+    flagged = artifacts[artifacts['bitmask'] > 0]
+    epochDuration = None
+    if len(artifacts['start_time'].unique()) > 1:
+        times = np.sort(artifacts['start_time'].unique())
+        epochDuration = float(times[1] - times[0])
+    annotations = []
+    for startTime, rows in flagged.groupby('start_time', sort=True):
+        texts = []
+        for flagName, flag in FLAGS.items():
+            channels = rows.loc[(rows['bitmask'] & flag) > 0, 'channel']
+            if len(channels):
+                texts.append(f"{flagName} {' '.join(channels)}")
+        text = ' / '.join(texts)
+        start = float(startTime)
+        end = start + (epochDuration or EPOCH_DURATION)
+        if annotations and annotations[-1][2] == text \
+                and np.isclose(annotations[-1][1], start):
+            annotations[-1] = (annotations[-1][0], end, text)
+        else:
+            annotations.append((start, end, text))
+    return annotations
+
+
+def save_annotations(path, artifacts):
+    """Save flagged epochs as an annotation file readable by Sleep.
+
+    Each line is `<start>, <end>, <text>`, with times in seconds from the
+    first loaded sample. No file is written if no epoch is flagged (Sleep
+    can't open empty annotation files), and a previous file at `path` is
+    removed.
+    """
+    annotations = annotations_from_table(artifacts)
+    path = Path(path)
+    if not annotations:
+        if path.exists():
+            path.unlink()
+        print("No flagged epochs: no artifact annotations saved")
+        return annotations
+    with open(path, 'w') as f:
+        for start, end, text in annotations:
+            # Commas are the delimiter
+            f.write(f"{start:.3f}, {end:.3f}, {text.replace(',', ':')}\n")
+    print(f"Saved N={len(annotations)} artifact annotations at {path}")
+    return annotations
+
+
+def save_artifacts(path, artifacts):
+    """Save an artifact table, and its annotations next to it.
+
+    Returns the path to the annotation file, or None if no epoch is flagged.
+    """
+    utils.save_table(path, artifacts)
+    print(f"Saved artifact index at {path}")
+    annotationsPath = Path(path).with_suffix('.annotations.txt')
+    if not save_annotations(annotationsPath, artifacts):
+        return None
+    return annotationsPath
@@ -0,0 +1,103 @@
+"""Virtual channels defined as linear combinations of recorded channels.
+
+Derivations are specified per dataset as a dictionary of
+{<derived label>: <spec>}, where <spec> is either:
+    - a dictionary of weights: {<channel label>: <weight>, ...}, eg for a
+        bipolar derivation::
+            {"LF0;384": 1, "LF1;385": -1}
+    - a referenced channel: {"channel": <label>, "reference": <reference>},
+        where the mean of the reference channels is subtracted from the
+        channel. <reference> is a channel label, a list of labels, or 'all'
+        for all the channels of the same kind as the channel (same band for
+        SpikeGLX, same store for TDT). eg for a common average reference::
+            {"channel": "LF0;384", "reference": "all"}
+Derived channels are computed from the raw data, before downsampling.
+"""
+import numpy as np
+
+SUBBLOCK_SAMPLES = 2**14  # Timepoints mixed at once
+
+
+def parse_derivations(derivations, allLabels, groupOf):
+    """Return weights of the source channels of each derived channel.
+
+    Args:
+        derivations (dict): {<derived label>: <spec>}. See module docstring
+        allLabels (list(str)): Labels of all the channels of the recording
+        groupOf (callable): Return the kind of a channel from its label
+            (used for 'all' references)
+
+    Returns:
+        derivedLabels (list(str)): Labels of derived channels
+        weights (list(dict)): {<source label>: <weight>} for each derived
+            channel
+    """
+    if not isinstance(derivations, dict):
+        raise ValueError(
+            f"`derivations` should be a dictionary of "
+            f"{{<derived label>: <spec>}}. Currently: {derivations}"
+        )
+    derivedLabels = []
+    weights = []
+    for label, spec in derivations.items():
+        if not isinstance(spec, dict) or not spec:
+            raise ValueError(f"Invalid spec for derivation `{label}`: {spec}")
+        if set(spec.keys()) == {'channel', 'reference'}:
+            channel, reference = spec['channel'], spec['reference']
+            if reference == 'all':
+                reference = [l for l in allLabels
+                             if groupOf(l) == groupOf(channel)]
+            elif isinstance(reference, str):
+                reference = [reference]
+            if not reference:
+                raise ValueError(f"Empty reference for derivation `{label}`")
+            w = {channel: 1.0}
+            for ref in reference:
+                w[ref] = w.get(ref, 0.0) - 1.0 / len(reference)
+        else:
+            try:
+                w = {chan: float(weight) for chan, weight in spec.items()}
+            except (TypeError, ValueError):
+                raise ValueError(
+                    f"Invalid spec for derivation `{label}`: {spec}. Should be "
+                    "a dictionary of weights, or of 'channel' and 'reference'."
+                )
+        derivedLabels.append(label)
+        weights.append(w)
+    return derivedLabels, weights
+
+
+def mixing_matrix(chanLabels, derivedLabels, weights):
+    """Return the (n_out, n_sources) matrix producing output channels.
+
+    Output channels are the channels in `chanLabels`, followed by derived
+    channels. Sources are all the channels used.
+
+    Returns:
+        sourceLabels (list(str)): Labels of the source channels
+        mix (np.ndarray): (n_out, n_sources) array
+        outLabels (list(str)): Labels of the output channels
+    """
+    sourceLabels = list(chanLabels)
+    for w in weights:
+        sourceLabels += [l for l in w if l not in sourceLabels]
+    sourceIndex = {l: i for i, l in enumerate(sourceLabels)}
+    mix = np.zeros((len(chanLabels) + len(weights), len(sourceLabels)))
+    for i, label in enumerate(chanLabels):
+        mix[i, sourceIndex[label]] = 1.0
+    for i, w in enumerate(weights):
+        for label, weight in w.items():
+            mix[len(chanLabels) + i, sourceIndex[label]] += weight
+    return sourceLabels, mix, list(chanLabels) + list(derivedLabels)
+
+
+def apply_mix(mix, block):
+    """Return mix @ block, computed by sub-blocks of timepoints.
+
+    Avoids converting the whole (n_sources, n_samples) block to float.
+    """
+    out = np.empty((mix.shape[0], block.shape[1]))
+    for t0 in range(0, block.shape[1], SUBBLOCK_SAMPLES):
+        t1 = t0 + SUBBLOCK_SAMPLES
+        np.matmul(mix, block[:, t0:t1], out=out[:, t0:t1])
+    return out
@@ -0,0 +1,145 @@
+"""Notch and band-pass filtering of the raw data during loading.
+
+Filters are specified per dataset as a list of dictionaries, applied in order:
+    - {"type": "notch", "freq": <Hz>, "Q": <quality factor, default 30>}
+    - {"type": "bandpass", "low": <Hz>, "high": <Hz>, "order": <default 4>}
+    - {"type": "highpass", "freq": <Hz>, "order": <default 4>}
+    - {"type": "lowpass", "freq": <Hz>, "order": <default 4>}
+All filters are combined into a single cascade of second-order sections, and
+applied at the native sampling rate, before downsampling.
+
+By default the filters are causal, and the filter state is carried from one
+block of data to the next so that the result is the same as filtering the
+whole recording at once. In zero-phase mode, each block is filtered
+forward-backward together with enough surrounding data for the filter to
+settle, and the surrounding data is discarded.
+"""
+import numpy as np
+import scipy.signal
+
+FILTER_ORDER = 4  # Default order of Butterworth filters
+NOTCH_Q = 30.0  # Default quality factor of notch filters
+# Duration of the data filtered around each block in zero-phase mode, in
+# periods of the lowest frequency of the filters
+ZERO_PHASE_PAD_CYCLES = 6
+
+
+def design_sos(filters, sRate):
+    """Return (n_sections, 6) second-order sections of a list of filters.
+
+    Args:
+        filters (list(dict)): Filter specifications. See module docstring
+        sRate (float): Sampling rate of the filtered data
+    """
+    if not isinstance(filters, (list, tuple)) or not filters:
+        raise ValueError(
+            f"`filters` should be a non-empty list of dictionaries. "
+            f"Currently: {filters}"
+        )
+    nyquist = sRate / 2
+    sos = []
+    for spec in filters:
+        ftype = spec.get('type') if isinstance(spec, dict) else None
+        freqs = [spec[k] for k in ['freq', 'low', 'high'] if k in spec] \
+            if ftype is not None else []
+        if any(not 0 < f < nyquist for f in freqs):
+            raise ValueError(
+                f"Filter frequencies should be between 0 and the Nyquist "
+                f"frequency ({nyquist}Hz): {spec}"
+            )
+        order = spec.get('order', FILTER_ORDER) if ftype is not None else None
+        if ftype == 'notch':
+            b, a = scipy.signal.iirnotch(
+                spec['freq'], spec.get('Q', NOTCH_Q), fs=sRate
+            )
+            sos.append(scipy.signal.tf2sos(b, a))
+        elif ftype == 'bandpass':
+            sos.append(scipy.signal.butter(
+                order, [spec['low'], spec['high']], btype='bandpass',
+                fs=sRate, output='sos',
+            ))
+        elif ftype in ['highpass', 'lowpass']:
+            sos.append(scipy.signal.butter(
+                order, spec['freq'], btype=ftype, fs=sRate, output='sos',
+            ))
+        else:
+            raise ValueError(
+                f"Invalid filter: {spec}. Supported types: 'notch', "
+                f"'bandpass', 'highpass', 'lowpass'"
+            )
+    return np.concatenate(sos, axis=0)
+
+
+def settling_samples(filters, sRate):
+    """Return number of samples for the filters to settle."""
+    lowest = []
+    for spec in filters:
+        if spec['type'] == 'notch':
+            # Bandwidth of the notch
+            lowest.append(spec['freq'] / spec.get('Q', NOTCH_Q))
+        elif spec['type'] == 'bandpass':
+            lowest.append(spec['low'])
+        else:
+            lowest.append(spec['freq'])
+    return int(np.ceil(ZERO_PHASE_PAD_CYCLES * sRate / min(lowest)))
+
+
+class BlockFilter:
+    """Filter consecutive, possibly overlapping, blocks of a signal.
+
+    Blocks should be passed in time order, as yielded by
+    `prefetch.iter_blocks`.
+
+    Args:
+        filters (list(dict)): Filter specifications. See module docstring
+        sRate (float): Sampling rate of the filtered data
+
+    Kwargs:
+        zeroPhase (bool): Forward-backward filtering. Blocks should then
+            include `overlap` samples of context on each side. (default False)
+    """
+
+    def __init__(self, filters, sRate, zeroPhase=False):
+        self.sos = design_sos(filters, sRate)
+        self.zeroPhase = zeroPhase
+        self.overlap = settling_samples(filters, sRate) if zeroPhase else 0
+        self.zi = None  # Filter state at `self.pos`
+        self.pos = None
+        self.tail = None  # Filtered samples preceding `self.pos`
+
+    def __call__(self, block, ctxStart, start, stop):
+        """Return filtered (n_channels, n_ctx) block.
+
+        Args:
+            block (np.ndarray): (n_channels, n_ctx) array of timepoints
+                ctxStart to ctxStart + n_ctx
+            ctxStart, start, stop (int): Timepoints of the first sample of
+                `block`, and of the range [start, stop) of the current block
+                (without context).
+        """
+        if self.zeroPhase:
+            return scipy.signal.sosfiltfilt(self.sos, block, axis=-1)
+
+        if self.zi is None:
+            # Start at steady state for the first sample
+            zi = scipy.signal.sosfilt_zi(self.sos)
+            self.zi = zi[:, np.newaxis, :] * block[np.newaxis, :, :1]
+            self.pos = ctxStart
+            self.tail = block[:, :0]
+        assert ctxStart <= self.pos == start, "Blocks should be consecutive"
+        i0, i1 = self.pos - ctxStart, stop - ctxStart
+        new, self.zi = scipy.signal.sosfilt(
+            self.sos, block[:, i0:i1], axis=-1, zi=self.zi
+        )
+        # Context after the block, filtered with a copy of the state
+        ahead = block[:, i1:]
+        if ahead.shape[1]:
+            ahead, _ = scipy.signal.sosfilt(
+                self.sos, ahead, axis=-1, zi=self.zi
+            )
+        # Context before the block was filtered with the previous block
+        before = self.tail[:, self.tail.shape[1] - i0:]
+        out = np.concatenate([before, new, ahead], axis=-1)
+        self.tail = out[:, :i1]
+        self.pos = stop
+        return out
@@ -0,0 +1,207 @@
+"""Incrementally load SpikeGLX recordings that are still being acquired."""
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from . import (RESAMPLE_CONTEXT_SECS, get_loaded_chans_idx_labels, readSGLX,
+               resample)
+
+
+class SGLXFollower:
+    """Follow a growing SpikeGLX bin file and downsample the new samples.
+
+    The length of the recording is inferred from the size of the bin file on
+    disk until SpikeGLX closes the file and writes the final meta. Each call to
+    `poll` only reads, converts and downsamples the samples appended since the
+    previous call. New samples are kept in memory and optionally appended to an
+    on-disk cache so that other processes can read the data loaded so far.
+
+    Each increment is resampled with the context of the neighbouring samples
+    on the grid of the whole recording (see `resample.resample_block`), so that
+    the followed data matches the data loaded once the recording is closed.
+    The last RESAMPLE_CONTEXT_SECS of acquired data are therefore only
+    returned at the next poll, once the context after them is acquired.
+
+    Args:
+        binPath (str | pathlib.Path): Path to bin of recording
+
+    Kwargs:
+        downSample (int | float | None): Frequency in Hz at which the data is
+            subsampled. No subsampling if None. (default None)
+        tStart (float | None): Time in seconds from start of recording of first
+            loaded sample. Default 0.0
+        chanList (list | None): List of loaded channels. All channels are
+            loaded by default. See `read_SGLX`
+        chanListType (str): 'indices' or 'labels'. See `read_SGLX`
+            (default 'labels')
+        ds_method (str): Method for resampling. Passed to
+            ``resample.signal_resample`` (default 'interpolation')
+        cachePath (str | pathlib.Path | None): If specified, the downsampled
+            data is appended to this file as time-major float32 samples, and a
+            json header (with the '.json' suffix) describes its content. See
+            `read_follow_cache`. (default None)
+        minChunkSecs (float): Minimum duration of newly acquired data read at
+            each poll. Shorter increments are left for the next poll.
+            (default 1.0)
+    """
+
+    def __init__(self, binPath, downSample=None, tStart=None, chanList=None,
+                 chanListType='labels', ds_method='interpolation',
+                 cachePath=None, minChunkSecs=1.0):
+        self.binPath = Path(binPath)
+        self.meta = readSGLX.readMeta(self.binPath)
+        self.sRate = readSGLX.SampRate(self.meta)
+        self.downSample = self.sRate if downSample is None else downSample
+        self.ds_method = ds_method
+        self.firstSamp = int(self.sRate * (0.0 if tStart is None else tStart))
+        self.minChunkSamp = max(int(self.sRate * minChunkSecs), 1)
+        # Context of increments, and period of the resampling grid
+        self.period = resample.block_period(self.sRate, self.downSample)
+        self.overlap = int(RESAMPLE_CONTEXT_SECS * self.sRate)
+        if self.period is not None:
+            self.overlap = -(-self.overlap // self.period) * self.period
+
+        chanMap = readSGLX.getChannelMap(self.meta)
+        self.chanIdxList, self.chanLblList = get_loaded_chans_idx_labels(
+            chanList, chanListType, chanMap
+        )
+        # Conversion to uV
+        self.conv = 1.e6 * chanMap.conv[self.chanIdxList]
+
+        self.nRead = 0  # Number of raw samples read since firstSamp
+        self.nOut = 0  # Number of downsampled samples produced
+        self.chunks = []
+
+        self.cachePath = None if cachePath is None else Path(cachePath)
+        if self.cachePath is not None:
+            self.cachePath.write_bytes(b'')
+            header = {
+                'binPath': str(self.binPath),
+                'sf': self.downSample,
+                'channels': self.chanLblList,
+                'dtype': 'float32',
+                'order': 'time-major',
+            }
+            with open(self.cachePath.with_suffix('.json'), 'w') as f:
+                json.dump(header, f, indent=2)
+
+    @property
+    def finished(self):
+        """True once SpikeGLX closed the file and all samples were read."""
+        return (
+            not readSGLX.isRecordingInProgress(self.meta)
+            and self.firstSamp + self.nRead >= self._nFileSamp()
+        )
+
+    @property
+    def data(self):
+        """(n_channels, n_samples) array of all the data loaded so far."""
+        if not self.chunks:
+            return np.zeros((len(self.chanIdxList), 0))
+        if len(self.chunks) > 1:
+            self.chunks = [np.concatenate(self.chunks, axis=1)]
+        return self.chunks[0]
+
+    def _nFileSamp(self):
+        return readSGLX.nFileSamples(self.binPath, self.meta)
+
+    def poll(self):
+        """Load the samples appended since last poll.
+
+        Returns:
+            np.ndarray: (n_channels, n_new_samples) array of downsampled data.
+                Possibly empty.
+        """
+        if readSGLX.isRecordingInProgress(self.meta):
+            # Pick up the final meta once SpikeGLX closed the file
+            self.meta = readSGLX.readMeta(self.binPath)
+        inProgress = readSGLX.isRecordingInProgress(self.meta)
+        nAvail = self._nFileSamp() - self.firstSamp
+        # Samples [start, stop) since firstSamp are resampled. The last
+        # acquired samples are kept as context for the next poll
+        start = self.nRead
+        stop = nAvail
+        if inProgress and self.downSample != self.sRate:
+            stop = nAvail - self.overlap
+            if self.period is not None:
+                # Increments start on output samples of the whole recording
+                stop = stop // self.period * self.period
+        nNew = stop - start
+        if nNew <= 0 or (nNew < self.minChunkSamp and inProgress):
+            return np.zeros((len(self.chanIdxList), 0))
+
+        ctxStart = max(start - self.overlap, 0)
+        ctxStop = min(stop + self.overlap, nAvail)
+        DataRaw = readSGLX.makeMemMapRaw(self.binPath, self.meta)[
+            self.chanIdxList,
+            self.firstSamp + ctxStart:self.firstSamp + ctxStop
+        ]
+        convData = np.multiply(DataRaw, self.conv[:, np.newaxis], dtype=float)
+        del DataRaw
+
+        # Output sample of input sample t is round(t * downSample / sRate), so
+        # that increments line up without drift
+        _, _, newData = resample.resample_block(
+            convData, ctxStart, start, stop, self.sRate, self.downSample,
+            method=self.ds_method,
+        )
+
+        self.nRead = stop
+        self.nOut += newData.shape[1]
+        self.chunks.append(newData)
+        if self.cachePath is not None:
+            with open(self.cachePath, 'ab') as f:
+                f.write(np.ascontiguousarray(newData.T, dtype='float32'))
+        return newData
+
+    def follow(self, pollInterval=10.0, timeout=None):
+        """Yield newly loaded data until the recording is closed.
+
+        Kwargs:
+            pollInterval (float): Time in seconds between polls (default 10.0)
+            timeout (float | None): Stop following if no new data was
+                acquired for this long (in seconds). Never stop if None.
+                (default None)
+
+        Yields:
+            np.ndarray: (n_channels, n_new_samples) arrays of downsampled data
+        """
+        lastNew = time.time()
+        while True:
+            newData = self.poll()
+            if newData.shape[1]:
+                lastNew = time.time()
+                print(f"Followed {self.binPath.name}: "
+                      f"{self.nOut / self.downSample:.1f}s loaded")
+                yield newData
+            if self.finished:
+                print(f"Recording closed: {self.binPath}")
+                return
+            if timeout is not None and time.time() - lastNew > timeout:
+                print(f"No new data for {timeout}s: stop following "
+                      f"{self.binPath}")
+                return
+            time.sleep(pollInterval)
+
+
+def read_follow_cache(cachePath):
+    """Return the data appended so far to an `SGLXFollower` cache.
+
+    Returns:
+        data (np.memmap): The downsampled data of shape (n_channels, n_points)
+        sf (float): The sampling frequency of the cached data
+        channels (list(str)): List of channel labels
+    """
+    cachePath = Path(cachePath)
+    with open(cachePath.with_suffix('.json'), 'r') as f:
+        header = json.load(f)
+    nChan = len(header['channels'])
+    nSamp = cachePath.stat().st_size // (4 * nChan)
+    if not nSamp:
+        return (np.zeros((nChan, 0), dtype='float32'), header['sf'],
+                header['channels'])
+    data = np.memmap(cachePath, dtype=header['dtype'], mode='r',
+                     shape=(nChan, nSamp), order='F')
+    return data, header['sf'], header['channels']
@@ -0,0 +1,98 @@
+"""Progress reports and cooperative cancellation of long loads.
+
+Loaders accept a `progress` callback and a `cancelToken`:
+    - `progress(event)` is called with a dictionary after each block (SGLX) or
+        channel (TDT) is loaded, with keys:
+            'stage' (str): 'read' for loaders, 'load' for the chunks of a
+                dataset loaded by `progressive.ProgressiveLoad`, 'emg' once
+                `load_and_score` loaded the EMG, 'gather' for the segments
+                of a dataset gathered by `sleepscore.gather`
+            'samples', 'totalSamples' (int): Timepoints processed and to
+                process in this stage, at the original sampling rate for
+                loaders and the output sampling rate otherwise
+            'bytes' (int): Bytes read from disk so far in this stage
+            'binPath': Path of the loaded data (loaders only)
+        and 'dataset' (int), the index of the dataset, when called from
+        `load_and_score`.
+    - `cancelToken.check()` is called between blocks, and raises
+        `LoadCancelled` once `cancelToken.cancel()` was called (eg: from
+        another thread or a signal handler). Files and memmaps opened by the
+        loader are closed before the exception propagates.
+"""
+import threading
+import time
+
+
+class LoadCancelled(Exception):
+    """Raised by loaders when their `CancelToken` is cancelled."""
+
+
+class CancelToken:
+    """Flag set to request the cancellation of a load."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Request cancellation. Loaders stop at their next check."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """Raise `LoadCancelled` if cancellation was requested."""
+        if self._event.is_set():
+            raise LoadCancelled("Loading was cancelled")
+
+
+def check(cancelToken):
+    """Call `cancelToken.check()` if there is a token."""
+    if cancelToken is not None:
+        cancelToken.check()
+
+
+def report(progress, stage, samples, totalSamples, nBytes=0, **info):
+    """Call `progress` with an event dictionary if there is a callback."""
+    if progress is not None:
+        progress(dict(stage=stage, samples=samples, totalSamples=totalSamples,
+                      bytes=nBytes, **info))
+
+
+def with_info(progress, **info):
+    """Return callback adding `info` to the events passed to `progress`."""
+    if progress is None:
+        return None
+
+    def callback(event):
+        progress(dict(info, **event))
+    return callback
+
+
+class PrintProgress:
+    """Progress callback printing one line per stage at most every `interval`
+    seconds, and when a stage completes.
+
+    Kwargs:
+        interval (float): Minimum time between lines in seconds (default 5.0)
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._last = {}
+        self._tic = time.time()
+
+    def __call__(self, event):
+        key = (event.get('dataset'), event['stage'])
+        now = time.time()
+        done = event['samples'] >= event['totalSamples']
+        if not done and now - self._last.get(key, 0) < self.interval:
+            return
+        self._last[key] = now
+        dataset = '' if event.get('dataset') is None \
+            else f"dataset #{event['dataset'] + 1} "
+        fraction = event['samples'] / max(event['totalSamples'], 1)
+        print(f"Progress: {dataset}{event['stage']}: {100 * fraction:.0f}% "
+              f"({event['samples']}/{event['totalSamples']} samples, "
+              f"{event['bytes'] / 1e9:.2f}GB read) in {now - self._tic:.0f}s")
@@ -0,0 +1,153 @@
+"""Read consecutive blocks of a recording ahead of their processing."""
+import os
+import queue
+import threading
+
+import numpy as np
+
+BLOCK_SAMPLES = 2**18  # Maximum number of timepoints per block
+BLOCK_BYTES = 2**26  # Maximum size of a block of the interleaved bin
+QUEUE_DEPTH = 2  # Number of blocks read ahead of the consumer
+
+_DONE = object()
+
+
+def default_block_samples(nChan):
+    """Return number of timepoints per block for a bin of `nChan` channels."""
+    return int(max(min(BLOCK_SAMPLES, BLOCK_BYTES // (2 * nChan)), 1))
+
+
+class InterleavedReader:
+    """Read blocks of selected channels from a sample-interleaved int16 bin.
+
+    Blocks of timepoints are read with large sequential reads (rather than
+    memmap page faults), and the kernel is hinted to read ahead the next block
+    where supported.
+
+    Args:
+        binPath (str | pathlib.Path): Path to the bin
+        nChan (int): Number of channels saved in the bin
+        chanIdxList (list(int)): Saved indices of the selected channels
+
+    Attributes:
+        bytesRead (int): Number of bytes read from the bin so far
+    """
+
+    def __init__(self, binPath, nChan, chanIdxList):
+        self.binPath = binPath
+        self.nChan = nChan
+        self.chanIdxList = np.asarray(chanIdxList, dtype=int)
+        self.f = open(binPath, 'rb', buffering=0)
+        self.bytesRead = 0
+
+    def __call__(self, start, stop):
+        """Return (n_channels, stop - start) int16 array of selected channels.
+
+        Raises EOFError if the bin ends before `stop`: callers should trim
+        the range to the number of timepoints in the file
+        (`readSGLX.nFileSamples`).
+        """
+        nBytesSamp = 2 * self.nChan
+        if hasattr(os, 'posix_fadvise'):
+            # Hint the kernel to start reading the next block
+            os.posix_fadvise(
+                self.f.fileno(), stop * nBytesSamp,
+                (stop - start) * nBytesSamp, os.POSIX_FADV_WILLNEED,
+            )
+        buf = np.empty((stop - start, self.nChan), dtype='int16')
+        self.f.seek(start * nBytesSamp)
+        view = memoryview(buf).cast('B')
+        nRead = 0
+        while nRead < len(view):
+            n = self.f.readinto(view[nRead:])
+            if not n:
+                break
+            nRead += n
+        self.bytesRead += nRead
+        if nRead < len(view):
+            raise EOFError(
+                f"Only {nRead // nBytesSamp} of the {stop - start} timepoints "
+                f"from timepoint {start} could be read from {self.binPath}"
+            )
+        return np.ascontiguousarray(buf[:, self.chanIdxList].T)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def iter_blocks(read, start, stop, blockSamples=None, overlap=0,
+                queueDepth=None):
+    """Yield consecutive blocks of data, read ahead on a background thread.
+
+    The next `queueDepth` blocks are read while the consumer processes the
+    current one, so that I/O overlaps with computation.
+
+    Args:
+        read (callable): read(t0, t1) returns the (n_channels, t1 - t0) data
+            between timepoints t0 and t1
+        start, stop (int): First and last (excluded) timepoints
+
+    Kwargs:
+        blockSamples (int | None): Number of timepoints per block
+            (default BLOCK_SAMPLES)
+        overlap (int): Number of timepoints of context read before and after
+            each block (clipped to [start, stop]). (default 0)
+        queueDepth (int | None): Number of blocks read ahead
+            (default QUEUE_DEPTH)
+
+    Yields:
+        (blockStart, blockStop, ctxStart, data): Data spans from ctxStart to
+            blockStop + overlap (clipped to stop).
+    """
+    if blockSamples is None:
+        blockSamples = BLOCK_SAMPLES
+    if queueDepth is None:
+        queueDepth = QUEUE_DEPTH
+    blocks = [
+        (t0, min(t0 + blockSamples, stop))
+        for t0 in range(start, stop, blockSamples)
+    ]
+    q = queue.Queue(maxsize=max(queueDepth, 1))
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def producer():
+        try:
+            for t0, t1 in blocks:
+                ctxStart = max(t0 - overlap, start)
+                data = read(ctxStart, min(t1 + overlap, stop))
+                if not put((t0, t1, ctxStart, data)):
+                    return
+        except BaseException as e:
+            put(e)
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Stop reading if the consumer stops early
+        stopped.set()
+        thread.join()
@@ -0,0 +1,208 @@
+"""Fill a preallocated array with data loaded by background workers."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import RESAMPLE_CONTEXT_SECS, filtering, loader_switch, monitor
+
+FIRST_CHUNK_DURATION = 60.0  # (s) Enough for the first windows in Sleep
+CHUNK_DURATION = 600.0  # (s)
+
+
+class ProgressiveLoad:
+    """Load multiple datasets in time-ordered chunks into a preallocated array.
+
+    The output array is allocated up front and filled chunk by chunk by a pool
+    of background threads. Chunks are submitted in time order, so the beginning
+    of the recording is available first and can be displayed while the rest of
+    the data streams in. Each chunk is read with surrounding context for the
+    resampling and for the filters to settle (see `context_samples`), which is
+    then discarded, so that the output matches loading the whole window at
+    once.
+
+    Args:
+        datasets (list(dict)): Validated dataset dictionaries (see
+            `sleepscore.load_and_score`). Each is loaded in the rows of `data`
+            given by the matching item of `rows`.
+        rows (list(slice)): Rows of the output array for each dataset
+        data (np.ndarray): (n_channels, n_samples) output array
+        sf (float): Sampling frequency of the output array
+
+    Kwargs:
+        tStart (float | None): Time in seconds from start of recording of first
+            loaded sample. (default 0.0)
+        downSample (int | float | None): Passed to the loading functions
+        ds_method (str): Passed to the loading functions
+        nWorkers (int | None): Number of background threads. Passed to
+            ThreadPoolExecutor (default None)
+        firstChunkDuration (float): Duration of the first chunk, loaded first
+            for all datasets (default FIRST_CHUNK_DURATION)
+        chunkDuration (float): Duration of the following chunks (default
+            CHUNK_DURATION)
+        progress (callable | None): Called with a 'load' stage event for a
+            dataset each time one of its chunks is loaded (samples of the
+            output array), and with the 'read' events of the loaders. See
+            `monitor` module. (default None)
+        cancelToken (monitor.CancelToken | None): Checked by the loaders of
+            all the chunks. Cancelled by `cancel` (default None)
+    """
+
+    def __init__(self, datasets, rows, data, sf, tStart=None, downSample=None,
+                 ds_method='interpolation', nWorkers=None,
+                 firstChunkDuration=FIRST_CHUNK_DURATION,
+                 chunkDuration=CHUNK_DURATION, progress=None,
+                 cancelToken=None):
+        assert len(datasets) == len(rows)
+        self.datasets = datasets
+        self.rows = rows
+        self.data = data
+        self.sf = sf
+        self.tStart = 0.0 if tStart is None else tStart
+        self.downSample = downSample
+        self.ds_method = ds_method
+        self.nWorkers = nWorkers
+        self.progressCallback = progress
+        self.cancelToken = (
+            monitor.CancelToken() if cancelToken is None else cancelToken
+        )
+
+        # Chunk boundaries, in samples of the output array
+        nSamp = data.shape[1]
+        nFirst = int(firstChunkDuration * sf)
+        nChunk = max(int(chunkDuration * sf), 1)
+        self.bounds = [0] + list(range(min(nFirst, nSamp), nSamp, nChunk))
+        if self.bounds[-1] != nSamp:
+            self.bounds.append(nSamp)
+        self.nChunks = len(self.bounds) - 1
+
+        self._done = np.zeros((self.nChunks, len(datasets)), dtype=bool)
+        self._lock = threading.Lock()
+        self._first_loaded = threading.Event()
+        self._futures = []
+        self._executor = None
+        self._tic = None
+
+    @property
+    def progress(self):
+        """Fraction of the chunks loaded."""
+        return self._done.mean()
+
+    @property
+    def loaded_duration(self):
+        """Duration (s) of the data loaded without gaps from the start."""
+        complete = self._done.all(axis=1)
+        nComplete = self.nChunks if complete.all() else np.argmin(complete)
+        return self.bounds[nComplete] / self.sf
+
+    def start(self):
+        """Submit all chunks to the background workers, in time order."""
+        self._tic = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=self.nWorkers)
+        for c in range(self.nChunks):
+            for d in range(len(self.datasets)):
+                self._futures.append(
+                    self._executor.submit(self._load_chunk, c, d)
+                )
+        self._executor.shutdown(wait=False)
+        return self
+
+    def context_samples(self, d):
+        """Number of samples of context read around the chunks of a dataset.
+
+        Context covers the resampling context of the loaders, and the
+        settling time of the dataset's filters.
+        """
+        context = int(np.ceil(RESAMPLE_CONTEXT_SECS * self.sf))
+        filters = self.datasets[d]['filters']
+        if filters:
+            context = max(
+                context, filtering.settling_samples(filters, self.sf)
+            )
+        return context
+
+    def _load_chunk(self, c, d):
+        dataset = self.datasets[d]
+        j0, j1 = self.bounds[c], self.bounds[c+1]
+        # Read the chunk with context, within the output window
+        context = self.context_samples(d)
+        r0 = max(j0 - context, 0)
+        r1 = min(j1 + context, self.data.shape[1])
+        chunk, _, _ = loader_switch(
+            dataset['binPath'],
+            datatype=dataset['datatype'],
+            chanList=dataset['chanList'],
+            derivations=dataset['derivations'],
+            filters=dataset['filters'],
+            zeroPhase=dataset['zeroPhase'],
+            useLF=dataset['useLF'],
+            progress=monitor.with_info(
+                self.progressCallback, dataset=d, chunk=c
+            ),
+            cancelToken=self.cancelToken,
+            downSample=self.downSample,
+            ds_method=self.ds_method,
+            tStart=self.tStart + r0 / self.sf,
+            tEnd=self.tStart + r1 / self.sf,
+        )
+        # Discard the context. The read may also be shorter at the end of
+        # the recording
+        n = min(j1 - j0, chunk.shape[1] - (j0 - r0))
+        self.data[self.rows[d], j0:j0+n] = chunk[:, j0-r0:j0-r0+n]
+
+        with self._lock:
+            self._done[c, d] = True
+            if self._done[0].all():
+                self._first_loaded.set()
+            print(
+                f"\nProgressive loading: {self._done.sum()}/{self._done.size}"
+                f" chunks ({100 * self.progress:.0f}%) in "
+                f"{time.time() - self._tic:.0f}s, first "
+                f"{self.loaded_duration:.0f}s of data complete."
+            )
+            if self._done.all():
+                print("Progressive loading: Done.")
+            nLoaded = sum(
+                self.bounds[i+1] - self.bounds[i]
+                for i in np.flatnonzero(self._done[:, d])
+            )
+        monitor.report(
+            self.progressCallback, 'load', int(nLoaded), self.data.shape[1],
+            dataset=d,
+        )
+
+    def wait_first_chunk(self, timeout=None):
+        """Block until the first chunk of all datasets is loaded."""
+        while not self._first_loaded.wait(timeout=0.1):
+            self._raise_errors()
+            if timeout is not None and time.time() - self._tic > timeout:
+                raise TimeoutError("First chunk not loaded within timeout")
+        self._raise_errors()
+
+    def wait(self):
+        """Block until all chunks are loaded. Raise errors from the workers."""
+        for future in self._futures:
+            future.result()
+
+    def cancel(self, wait=False):
+        """Cancel the chunks that are not loaded yet.
+
+        Chunks being loaded stop at the next block.
+
+        Kwargs:
+            wait (bool): Block until the workers have stopped, eg before
+                removing a memory-mapped output (default False)
+        """
+        self.cancelToken.cancel()
+        for future in self._futures:
+            future.cancel()
+        if wait and self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _raise_errors(self):
+        for future in self._futures:
+            if (future.done() and not future.cancelled()
+                    and future.exception() is not None):
+                self.cancel()
+                raise future.exception()
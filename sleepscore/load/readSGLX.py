@@ -20,6 +20,8 @@ the 'meta' dictionary will make your data handling
 much easier!
 
 """
+import os
+
 import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
@@ -29,7 +31,7 @@ from tkinter import filedialog
 
 def savedChanLabels(meta):
     """Return array of labels of saved channels."""
-    return [item[0] for item in parse_snsChanMap(meta)]
+    return list(getChannelMap(meta).labels)
 
 
 def parse_snsChanMap(meta):
@@ -44,17 +46,111 @@ def parse_snsChanMap(meta):
             Labels are strings, indices are integers
     """
 
-    mapstring = meta['snsChanMap']
+    chanMap = getChannelMap(meta)
+    return list(zip(chanMap.labels, chanMap.mapIdx.tolist()))
+
+
+def _parse_snsChanMap(mapstring):
     maptuples = mapstring.strip(')(').split(')(')[1:]
     snsChanMap_parsed = [
         chaninfo.split(sep=':')
         for chaninfo in maptuples
     ]  # List of tuples: [(<chan_name>, <chan_orig_index>),...]
-    snsChanMap_parsed = [(label, int(idx)) for label, idx in snsChanMap_parsed]
     assert all(
         [len(tup) == 2 for tup in snsChanMap_parsed]
     )  # Fails if there's ':' in the channel labels
-    return snsChanMap_parsed
+    return [(label, int(idx)) for label, idx in snsChanMap_parsed]
+
+
+class ChannelMap:
+    """Per-channel metadata of a SpikeGLX file, parsed once per meta.
+
+    All arrays are indexed by saved channel index (ie: the index of the
+    channel in the binary file). Use `getChannelMap` rather than instantiating
+    this class directly, so that the parsed map is shared between calls.
+
+    Attributes:
+        savedIdx (np.ndarray): Saved channel indices (0 to nSavedChans - 1)
+        origIdx (np.ndarray): Original (acquired) channel indices
+        mapIdx (np.ndarray): Channel indices in `snsChanMap`
+        labels (np.ndarray): Channel labels (eg: "LF0;384")
+        bands (np.ndarray): Channel types: 'AP', 'LF' or 'SY' for imec data,
+            'MN', 'MA', 'XA' or 'DW' for nidq data
+        conv (np.ndarray): Factor converting int16 values to gain-corrected
+            volts
+        labelIndex (dict): {<label>: <saved index>} mapping
+    """
+
+    def __init__(self, meta):
+        mapped = _parse_snsChanMap(meta['snsChanMap'])
+        self.labels = np.array([label for label, _ in mapped], dtype=object)
+        self.mapIdx = np.array([idx for _, idx in mapped], dtype=int)
+        self.savedIdx = np.arange(len(mapped))
+        self.origIdx = OriginalChans(meta)
+        assert len(self.origIdx) == len(mapped) == int(meta['nSavedChans'])
+        self.labelIndex = {label: i for i, label in enumerate(self.labels)}
+
+        fI2V = Int2Volts(meta)
+        if meta['typeThis'] == 'imec':
+            AP, LF, SY = ChannelCountsIM(meta)
+            self.bands = np.repeat(
+                np.array(['AP', 'LF', 'SY'], dtype=object), [AP, LF, SY]
+            )
+            APgain, LFgain = ChanGainsIM(meta)
+            nAP = len(APgain)
+            gains = np.ones(len(mapped))
+            isAP = self.bands == 'AP'
+            isLF = self.bands == 'LF'
+            gains[isAP] = APgain[self.origIdx[isAP]]
+            gains[isLF] = LFgain[self.origIdx[isLF] - nAP]
+            self.conv = fI2V / gains
+            self.conv[self.bands == 'SY'] = 1
+        else:
+            MN, MA, XA, DW = ChannelCountsNI(meta)
+            self.bands = np.repeat(
+                np.array(['MN', 'MA', 'XA', 'DW'], dtype=object),
+                [MN, MA, XA, DW]
+            )
+            gains = np.ones(len(mapped))
+            gains[self.bands == 'MN'] = float(meta['niMNGain'])
+            gains[self.bands == 'MA'] = float(meta['niMAGain'])
+            self.conv = fI2V / gains
+
+    def __len__(self):
+        return len(self.labels)
+
+    def indices(self, labels):
+        """Return array of saved indices of channels from their labels."""
+        missing = [label for label in labels if label not in self.labelIndex]
+        if missing:
+            raise KeyError(
+                f"The following channels labels were not found in data:"
+                f"{missing}\n"
+                f"Below are the labels of saved channels in the recording:\n"
+                f"{list(self.labels)}"
+            )
+        return np.array([self.labelIndex[label] for label in labels],
+                        dtype=int)
+
+
+# Meta entries that define the channel map
+_CHANNEL_MAP_KEYS = [
+    'typeThis', 'snsChanMap', 'snsSaveChanSubset', 'nSavedChans', 'imroTbl',
+    'imDatPrb_dock', 'imAiRangeMax', 'snsApLfSy', 'niAiRangeMax',
+    'snsMnMaXaDw', 'niMNGain', 'niMAGain',
+]
+_channelMapCache = {}
+
+
+# Return the ChannelMap of a meta. Maps are cached by the content of the meta
+# entries they are built from, so that each channel map is parsed only once
+# even if the meta is read again.
+#
+def getChannelMap(meta):
+    key = tuple(meta.get(k) for k in _CHANNEL_MAP_KEYS)
+    if key not in _channelMapCache:
+        _channelMapCache[key] = ChannelMap(meta)
+    return _channelMapCache[key]
 
 
 # Parse ini file returning a dictionary whose keys are the metadata
@@ -128,16 +224,20 @@ def OriginalChans(meta):
         # parse the snsSaveChanSubset string
         # split at commas
         chStrList = meta['snsSaveChanSubset'].split(sep=',')
-        chans = np.arange(0, 0)  # creates an empty array of int32
+        chanRanges = []
         for sL in chStrList:
             currList = sL.split(sep=':')
             if len(currList) > 1:
                 # each set of contiguous channels specified by
                 # chan1:chan2 inclusive
-                newChans = np.arange(int(currList[0]), int(currList[1])+1)
+                chanRanges.append(
+                    np.arange(int(currList[0]), int(currList[1])+1)
+                )
             else:
-                newChans = np.arange(int(currList[0]), int(currList[0])+1)
-            chans = np.append(chans, newChans)
+                chanRanges.append(
+                    np.arange(int(currList[0]), int(currList[0])+1)
+                )
+        chans = np.concatenate(chanRanges)
     return(chans)
 
 
@@ -181,10 +281,9 @@ def ChanGainNI(ichan, savedMN, savedMA, meta):
 # Index into these with the original (acquired) channel IDs.
 #
 def ChanGainsIM(meta):
-    imroList = meta['imroTbl'].split(sep=')')
-    # One entry for each channel plus header entry,
-    # plus a final empty entry following the last ')'
-    nChan = len(imroList) - 2
+    imroList = meta['imroTbl'].strip('()').split(sep=')(')
+    # One entry for each channel plus header entry
+    nChan = len(imroList) - 1
     APgain = np.zeros(nChan)        # default type = float
     LFgain = np.zeros(nChan)
     if 'imDatPrb_dock' in meta:
@@ -193,10 +292,12 @@ def ChanGainsIM(meta):
         APgain = APgain + 80
     else:
         # 3A, 3B1, 3B2 (NP 1.0)
-        for i in range(0, nChan):
-            currList = imroList[i+1].split(sep=' ')
-            APgain[i] = currList[3]
-            LFgain[i] = currList[4]
+        # Parse all entries at once: (chan bank refid APgain LFgain APfilt)
+        imroArray = np.array(
+            ' '.join(imroList[1:]).split(sep=' '), dtype=float
+        ).reshape(nChan, -1)
+        APgain = imroArray[:, 3]
+        LFgain = imroArray[:, 4]
     return(APgain, LFgain)
 
 
@@ -209,20 +310,12 @@ def ChanGainsIM(meta):
 # [2,6,20]  just these three channels (zero based, as they appear in SGLX).
 #
 def GainCorrectNI(dataArray, chanList, meta):
-    MN, MA, XA, DW = ChannelCountsNI(meta)
-    fI2V = Int2Volts(meta)
-    # print statements used for testing...
-    # print("NI fI2V: %.3e" % (fI2V))
-    # print("NI ChanGainNI: %.3f" % (ChanGainNI(0, MN, MA, meta)))
+    # Per-channel conversion factors are computed once per meta
+    conv = getChannelMap(meta).conv[np.asarray(chanList, dtype=int)]
 
     # make array of floats to return. dataArray contains only the channels
     # in chanList, so output matches that shape
-    convArray = np.zeros(dataArray.shape, dtype=float)
-    for i in range(0, len(chanList)):
-        j = chanList[i]             # index into timepoint
-        conv = fI2V/ChanGainNI(j, MN, MA, meta)
-        # dataArray contains only the channels in chanList
-        convArray[i, :] = dataArray[i, :] * conv
+    convArray = np.multiply(dataArray, conv[:, np.newaxis], dtype=float)
     return(convArray)
 
 
@@ -237,35 +330,49 @@ def GainCorrectNI(dataArray, chanList, meta):
 # OriginalChans) will be in the range 384-767 for a standard 3A or 3B probe.
 #
 def GainCorrectIM(dataArray, chanList, meta):
-    # Look up gain with acquired channel ID
-    chans = OriginalChans(meta)
-    APgain, LFgain = ChanGainsIM(meta)
-    nAP = len(APgain)
-    nNu = nAP * 2
-
-    # Common converstion factor
-    fI2V = Int2Volts(meta)
+    # Gains are looked up once per meta with the acquired channel IDs
+    conv = getChannelMap(meta).conv[np.asarray(chanList, dtype=int)]
 
     # make array of floats to return. dataArray contains only the channels
     # in chanList, so output matches that shape
-    convArray = np.zeros(dataArray.shape, dtype='float')
-    for i in range(0, len(chanList)):
-        j = chanList[i]     # index into timepoint
-        k = chans[j]        # acquisition index
-        if k < nAP:
-            conv = fI2V / APgain[k]
-        elif k < nNu:
-            conv = fI2V / LFgain[k - nAP]
-        else:
-            conv = 1
-        # The dataArray contains only the channels in chList
-        convArray[i, :] = dataArray[i, :]*conv
+    convArray = np.multiply(dataArray, conv[:, np.newaxis], dtype=float)
     return(convArray)
 
 
+# Return the largest absolute int16 value of the ADC (its rails). Samples at
+# the rails are clipped. Older metas don't record the range: 512 for imec
+# (10 bit) and 32768 for nidq (16 bit).
+#
+def MaxInt(meta):
+    if meta['typeThis'] == 'imec':
+        return int(meta.get('imMaxInt', 512))
+    return int(meta.get('niMaxInt', 32768))
+
+
+# Return True if SpikeGLX has not closed the binary file yet. The
+# 'fileSizeBytes' and 'fileTimeSecs' entries are only written to the meta
+# file when the recording of that file ends.
+#
+def isRecordingInProgress(meta):
+    return 'fileSizeBytes' not in meta
+
+
+# Return the number of timepoints in the binary file. For files that are
+# still being written, the count is inferred from the current size of the file
+# on disk, truncated to a whole number of timepoints.
+#
+def nFileSamples(binFullPath, meta):
+    nChan = int(meta['nSavedChans'])
+    if isRecordingInProgress(meta):
+        nFileBytes = os.path.getsize(binFullPath)
+    else:
+        nFileBytes = int(meta['fileSizeBytes'])
+    return(int(nFileBytes/(2*nChan)))
+
+
 def makeMemMapRaw(binFullPath, meta):
     nChan = int(meta['nSavedChans'])
-    nFileSamp = int(int(meta['fileSizeBytes'])/(2*nChan))
+    nFileSamp = nFileSamples(binFullPath, meta)
     print("nChan: %d, nFileSamp: %d" % (nChan, nFileSamp))
     rawData = np.memmap(binFullPath, dtype='int16', mode='r',
                         shape=(nChan, nFileSamp), offset=0, order='F')
@@ -282,38 +389,26 @@ def makeMemMapRaw(binFullPath, meta):
 #
 def ExtractDigital(rawData, firstSamp, lastSamp, dwReq, dLineList, meta):
     # Get channel index of requested digial word dwReq
-    if meta['typeThis'] == 'imec':
-        AP, LF, SY = ChannelCountsIM(meta)
-        if SY == 0:
-            print("No imec sync channel saved.")
-            digArray = np.zeros((0), 'uint8')
-            return(digArray)
-        else:
-            digCh = AP + LF + dwReq
-    else:
-        MN, MA, XA, DW = ChannelCountsNI(meta)
-        if dwReq > DW-1:
-            print("Maximum digital word in file = %d" % (DW-1))
-            digArray = np.zeros((0), 'uint8')
-            return(digArray)
-        else:
-            digCh = MN + MA + XA + dwReq
+    chanMap = getChannelMap(meta)
+    digChans = np.flatnonzero(np.isin(chanMap.bands, ['SY', 'DW']))
+    if meta['typeThis'] == 'imec' and not len(digChans):
+        print("No imec sync channel saved.")
+        digArray = np.zeros((0), 'uint8')
+        return(digArray)
+    elif dwReq > len(digChans)-1:
+        print("Maximum digital word in file = %d" % (len(digChans)-1))
+        digArray = np.zeros((0), 'uint8')
+        return(digArray)
+    digCh = digChans[dwReq]
 
     selectData = np.ascontiguousarray(rawData[digCh, firstSamp:lastSamp+1], 'int16')
     nSamp = lastSamp-firstSamp + 1
 
-    # unpack bits of selectData; unpack bits works with uint8
-    # origintal data is int16
-    bitWiseData = np.unpackbits(selectData.view(dtype='uint8'))
-    # output is 1-D array, nSamp*16. Reshape and transpose
-    bitWiseData = np.transpose(np.reshape(bitWiseData, (nSamp, 16)))
-
+    # Shift and mask each requested line of the 16-bit words
     nLine = len(dLineList)
     digArray = np.zeros((nLine, nSamp), 'uint8')
     for i in range(0, nLine):
-        byteN, bitN = np.divmod(dLineList[i], 8)
-        targI = byteN*8 + (7 - bitN)
-        digArray[i, :] = bitWiseData[targI, :]
+        digArray[i, :] = (selectData >> dLineList[i]) & 1
     return(digArray)
 
 
@@ -0,0 +1,1110 @@
+"""Lazy access to recordings in multiple formats.
+
+Opening a `Recording` only reads its metadata: the labels of its channels, its
+sampling rate and its duration. Data is read by `Recording.read`, which reads
+the requested time window and channels only, and converts, filters and
+resamples them on the fly. For instance, 10 seconds of a channel at the
+original sampling rate::
+
+    with open_recording(binPath, datatype='SGLX') as rec:
+        data, sf, labels = rec.read(tStart=3600, tEnd=3610,
+                                    chanList=["LF0;384"])
+
+The loaders of the `load` module (`read_SGLX`, `read_TDT`) are thin wrappers
+around `Recording.read`. Formats are looked up by `datatype` in the registry of
+formats (see `registry`), where other packages can add their own `Recording`
+subclasses.
+"""
+import re
+
+import numpy as np
+
+import tdt
+
+from . import (derive, filtering, monitor, prefetch, readSGLX, resample,
+               resample_bench, segments, sidecar, sync, tdt_index)
+
+# Duration of the data read around each block to avoid edge effects when
+# resampling blocks independently
+RESAMPLE_CONTEXT_SECS = 1.0
+
+# (Hz) Upper cutoff of the LF band of imec probes. AP data is read from the LF
+# file of the recording if the output and filters only need lower frequencies
+LF_MAX_FREQ = 500.0
+
+# Capabilities declared by formats in `Recording.capabilities`, and default
+# values for undeclared capabilities
+CAPABILITIES = {
+    # `read` only reads the requested time window, so that reading a recording
+    # in successive windows (eg: progressive loading) is efficient
+    'windowed': False,
+    # `read` processes the data in blocks of bounded size, and accepts the
+    # `blockSamples` and `queueDepth` kwargs
+    'chunked': False,
+    # `probe` and `estimate_reads` only use the metadata of the recording
+    'probe': False,
+    # dtype of the raw data on disk (None if unknown)
+    'nativeDtype': None,
+    # `read` reads imec AP channels from the LF file of the recording when
+    # `downSample` allows it, and accepts the `useLF` kwarg
+    'lfBand': False,
+}
+
+
+class Recording:
+    """Base class of lazily loaded recordings.
+
+    Subclasses implement `read` with the kwargs of `Recording.read` (and
+    `probe` if possible), and declare the capabilities of their format in the
+    `capabilities` class attribute (see `CAPABILITIES`).
+
+    Args:
+        binPath (str | pathlib.Path): Path to the recording
+
+    Attributes:
+        binPath: Path to the recording
+        labels (list(str)): Labels of all the channels of the recording
+        sRate (float | None): Original sampling rate (None if channels have
+            different sampling rates)
+        duration (float): Duration of the recording in seconds
+    """
+
+    capabilities = {}
+
+    def __init__(self, binPath):
+        self.binPath = binPath
+        self.labels = []
+        self.sRate = None
+        self.duration = 0.0
+
+    def read(self, downSample=None, tStart=None, tEnd=None, chanList=None,
+             chanListType='labels', ds_method='interpolation',
+             derivations=None, filters=None, zeroPhase=False,
+             artifactIndex=None, syncDetector=None, progress=None,
+             cancelToken=None):
+        """Return (data, sf, labels) of a time window of selected channels.
+
+        The loading pipeline (`load_and_score`, progressive loading, the data
+        server) calls `read` with all of these kwargs, so formats should
+        accept them all. See `SGLXRecording.read` for their description.
+        Formats that can't honour a kwarg with a non-default value (eg a
+        `syncDetector` without a sync channel) should raise an explicit
+        error rather than ignore it. `progress` and `cancelToken` can be
+        ignored by formats that don't read data in blocks. The kwargs of
+        optional capabilities (`blockSamples` and `queueDepth` for 'chunked'
+        formats, `useLF` for 'lfBand' formats) are only passed to formats
+        declaring the capability.
+        """
+        raise NotImplementedError
+
+    def probe(self, **kwargs):
+        """Return (sRate, duration, labels) of `read`'s output."""
+        raise NotImplementedError
+
+    def estimate_reads(self, **kwargs):
+        """Return (nRead, nSources) numbers of channels read by `read`.
+
+        nRead is the number of channels read from disk at each timepoint, and
+        nSources the number of channels converted (before derivations). By
+        default, only the requested channels are read.
+
+        Kwargs:
+            **kwargs: `chanList`, `chanListType` and `derivations` of `read`
+        """
+        _, _, labels = self.probe(**kwargs)
+        return len(labels), len(labels)
+
+    def close(self):
+        """Close the files opened by `read`."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return (f"{type(self).__name__}({self.binPath}: "
+                f"{len(self.labels)} channels, {self.sRate}Hz, "
+                f"{self.duration:.1f}s)")
+
+
+class SGLXRecording(Recording):
+    """SpikeGLX recording, in one or several files.
+
+    Args:
+        binPath (str | pathlib.Path | list): Path to bin of recording. Can also
+            be a list of bins or a glob pattern (eg: "run_g0_t*.imec0.lf.bin"),
+            in which case the files are read as a single recording on a
+            common timeline. See `segments.SGLXRun`.
+
+    Attributes:
+        run (segments.SGLXRun): Files of the recording
+        chanMap (readSGLX.ChannelMap): Channel map of the recording
+    """
+
+    capabilities = {
+        'windowed': True,
+        'chunked': True,
+        'probe': True,
+        'nativeDtype': 'int16',
+        'lfBand': True,
+    }
+
+    def __init__(self, binPath):
+        super().__init__(binPath)
+        self.run = segments.SGLXRun(binPath)
+        self.chanMap = readSGLX.getChannelMap(self.run.meta)
+        self.labels = list(self.chanMap.labels)
+        self.sRate = self.run.sRate
+        self.duration = self.run.nSamp / self.run.sRate
+        self._readers = {}  # {<channel indices>: <segments.RunReader>}
+        self._lf = None  # LF recording of AP data (False if there is none)
+
+    def _get_reader(self, chanIdxList):
+        """Return a reader of the channels, kept open until `close`."""
+        key = tuple(chanIdxList)
+        if key not in self._readers:
+            self._readers[key] = self.run.open_reader(chanIdxList)
+        return self._readers[key]
+
+    def close(self):
+        for reader in self._readers.values():
+            reader.close()
+        self._readers = {}
+        if self._lf:
+            self._lf.close()
+
+    def lf_recording(self):
+        """Return the recording of the LF file of imec AP data, or None.
+
+        The LF file of each AP bin is the file of the same run with the
+        '.lf.bin' extension (eg: run_g0_t0.imec0.lf.bin for
+        run_g0_t0.imec0.ap.bin).
+        """
+        if self._lf is None:
+            self._lf = False
+            lfPaths = [
+                path.with_name(path.name[:-len('.ap.bin')] + '.lf.bin')
+                for path in self.run.binPaths
+                if path.name.lower().endswith('.ap.bin')
+            ]
+            if (self.run.meta['typeThis'] == 'imec'
+                    and len(lfPaths) == len(self.run)
+                    and all(path.exists()
+                            and path.with_suffix('.meta').exists()
+                            for path in lfPaths)):
+                self._lf = SGLXRecording(
+                    lfPaths[0] if len(lfPaths) == 1 else lfPaths
+                )
+        return self._lf or None
+
+    def lf_substitute(self, downSample=None, chanList=None,
+                      chanListType='labels', derivations=None, filters=None,
+                      syncDetector=None):
+        """Return the LF recording that `read` uses instead of AP data.
+
+        Imec AP files are sampled at 30kHz, 12 times more than their LF files,
+        which record the same sites below LF_MAX_FREQ. The LF file is read if
+        it exists, if `downSample` and `filters` only need frequencies below
+        LF_MAX_FREQ, and if all the loaded channels, derivation sources and
+        sync channel have a counterpart in the LF file. See `read` for a
+        description of the parameters.
+
+        Returns:
+            None if the AP file is read, or (lfRec, lfKwargs, apLabels):
+                lfRec (SGLXRecording): Recording of the LF file
+                lfKwargs (dict): `chanList`, `chanListType` and
+                    `derivations` kwargs of `lfRec.read`, with LF labels
+                apLabels (dict): {<LF label>: <AP label>} of the channels
+        """
+        if (downSample is None or downSample / 2 > LF_MAX_FREQ
+                or not np.any(self.chanMap.bands == 'AP')):
+            return None
+        freqs = [spec[k] for spec in filters or []
+                 for k in ['freq', 'low', 'high'] if k in spec]
+        if any(f > LF_MAX_FREQ for f in freqs):
+            return None
+        lfRec = self.lf_recording()
+        if lfRec is None:
+            return None
+
+        if derivations and chanList is None:
+            chanList = []
+        _, chanLblList = get_loaded_chans_idx_labels(
+            chanList, chanListType, self.chanMap
+        )
+        weights = []
+        if derivations:
+            derivedLabels, weights = derive.parse_derivations(
+                derivations, self.labels,
+                dict(zip(self.chanMap.labels, self.chanMap.bands)).get,
+            )
+        # The sync channel is only read from the LF file if it has the same
+        # label, so that the detector is unchanged
+        syncLabels = []
+        if syncDetector is not None and syncDetector.channel is not None:
+            syncLabels = [syncDetector.channel]
+        lfLabels = map_AP_to_LF(
+            chanLblList + [l for w in weights for l in w] + syncLabels,
+            self.chanMap, lfRec.chanMap,
+        )
+        if lfLabels is None or any(lfLabels[l] != l for l in syncLabels):
+            return None
+
+        lfKwargs = {
+            'chanList': [lfLabels[l] for l in chanLblList],
+            'chanListType': 'labels',
+            'derivations': None,
+        }
+        if derivations:
+            # Explicit weights, so that 'all' references keep the same sources
+            lfKwargs['derivations'] = {
+                label: {lfLabels[l]: weight for l, weight in w.items()}
+                for label, w in zip(derivedLabels, weights)
+            }
+        apLabels = {lf: ap for ap, lf in lfLabels.items()}
+        return lfRec, lfKwargs, apLabels
+
+    def read(self, downSample=None, tStart=None, tEnd=None, chanList=None,
+             chanListType='labels', ds_method='interpolation',
+             derivations=None, filters=None, zeroPhase=False,
+             artifactIndex=None, syncDetector=None, progress=None,
+             cancelToken=None, blockSamples=None, queueDepth=None,
+             useLF=True):
+        """Read, convert and downsample a time window of selected channels.
+
+        Only the timepoints of the window (and some context for filtering and
+        resampling) are read from disk. Channels of imec AP data are read from
+        the LF file of the recording when possible (see `lf_substitute`).
+
+        Kwargs:
+            downSample (int | float | None): Frequency in Hz at which the data
+                is subsampled. No subsampling if None. (default None)
+            tStart (float | None): Time in seconds from start of recording of
+                first loaded sample. Default 0.0
+            tEnd (float | None): Time in seconds from start of recording of
+                last loaded sample. Duration of recording by default. For
+                recordings that are still being acquired, the duration is
+                inferred from the current size of the bin file.
+            chanList (list(int) | None): List of loaded channels. All channels
+                are loaded by default.
+                    eg: ["LF0;384", "LF1;385"]
+            ChanListType (str): 'indices' or 'label'. If 'indices', chanList
+                is interpreted as indices of saved channels. If 'labels',
+                chanList is interpreted as labels of channels (eg: "LF0;384")
+                not all channels are saved on file during a recording.
+                (default 'labels')
+            ds_method (str): Method for resampling. Passed to
+                ``resample.signal_resample``. 'poly' is more accurate,
+                'interpolation' is faster, 'auto' picks the fastest method
+                meeting `resample_bench.AUTO_TARGET` (default
+                'interpolation')
+            derivations (dict | None): Virtual channels computed from the raw
+                data before downsampling, and appended to the channels of
+                `chanList`. Only the channels of `chanList` (none if None) and
+                the derived channels are returned. See `derive` module.
+                (default None)
+            filters (list(dict) | None): Notch and band-pass filters applied
+                to the loaded channels at the original sampling rate, before
+                downsampling. See `filtering` module. (default None)
+            zeroPhase (bool): Filter forward and backward rather than
+                causally. Each block is then read with enough context for the
+                filters to settle. (default False)
+            artifactIndex (artifacts.ArtifactIndex | None): If specified,
+                clipping, flatline and RMS indicators of the raw data of each
+                read channel are accumulated in the index while loading.
+                (default None)
+            syncDetector (sync.EdgeDetector | None): If specified, the sync
+                channel is read together with the loaded channels, and its
+                rising edges are recorded in the detector. See `sync` module.
+                (default None)
+            progress (callable | None): Called after each block with a
+                dictionary of progress (timepoints at the original sampling
+                rate and bytes read). See `monitor` module. (default None)
+            cancelToken (monitor.CancelToken | None): Checked before
+                processing each block. If cancelled, `monitor.LoadCancelled`
+                is raised. (default None)
+            blockSamples (int | None): Number of timepoints read at once.
+                Blocks are converted and downsampled while the next blocks are
+                read on a background thread. By default, blocks contain at
+                most prefetch.BLOCK_BYTES bytes of the bin.
+            queueDepth (int | None): Number of blocks read ahead of their
+                processing (default prefetch.QUEUE_DEPTH)
+            useLF (bool): Read the channels of imec AP data from the LF file
+                of the recording if `downSample` allows it. Labels of the
+                output are the AP labels. (default True)
+
+        Returns:
+            data (np.ndarray): The raw data of shape (n_channels, n_points)
+            downsample (float):The down-sampling frequency used.
+            channels (list(str)): List of channel names / original indices
+        """
+        substitute = None
+        if useLF:
+            substitute = self.lf_substitute(
+                downSample=downSample, chanList=chanList,
+                chanListType=chanListType, derivations=derivations,
+                filters=filters, syncDetector=syncDetector,
+            )
+        if substitute is not None:
+            lfRec, lfKwargs, apLabels = substitute
+            print(f"Read AP channels from LF file {lfRec.binPath} "
+                  f"(downSample={downSample}Hz). Set `useLF` to False to "
+                  f"read the AP file.")
+            nAcc = len(artifactIndex.accumulators) if artifactIndex else 0
+            data_ds, downSample, chanLblList = lfRec.read(
+                downSample=downSample, tStart=tStart, tEnd=tEnd,
+                ds_method=ds_method, filters=filters, zeroPhase=zeroPhase,
+                artifactIndex=artifactIndex, syncDetector=syncDetector,
+                progress=progress, cancelToken=cancelToken,
+                blockSamples=blockSamples, queueDepth=queueDepth, **lfKwargs,
+            )
+            if artifactIndex is not None:
+                for acc in artifactIndex.accumulators[nAcc:]:
+                    acc.labels = [apLabels.get(l, l) for l in acc.labels]
+            return (data_ds, downSample,
+                    [apLabels.get(l, l) for l in chanLblList])
+
+        run = self.run
+        meta = run.meta
+        sRate = run.sRate
+
+        # Indices in recording of first and last loaded samples
+        nFileSamp = run.nSamp
+        if run.isRecordingInProgress():
+            print(f"Recording in progress: loading the first "
+                  f"{nFileSamp/sRate}s")
+        if tStart is None:
+            tStart = 0.0
+        if tEnd is None:
+            tEnd = nFileSamp / sRate
+        assert tStart <= tEnd
+        firstSamp = int(sRate * tStart)
+        lastSamp = min(int(sRate * tEnd), nFileSamp - 1)
+
+        # Indices of loaded channels in recording, and original labels
+        assert (chanList is None or chanList == 'all' or len(chanList) > 0
+                or derivations), (
+            "The chanList parameter should be None, 'all' or a non-empty list."
+            f"Currently chanList = {chanList}"
+        )
+        chanMap = self.chanMap
+        if derivations and chanList is None:
+            chanList = []
+        chanIdxList, chanLblList = get_loaded_chans_idx_labels(
+            chanList, chanListType, chanMap
+        )
+        mix = None
+        if derivations:
+            # Read all the source channels, and mix them into output channels
+            sourceLabels, mix, chanLblList = derivations_mixing_matrix(
+                derivations, chanLblList, chanMap
+            )
+            chanIdxList = list(chanMap.indices(sourceLabels))
+
+        print(f"Loading N={len(chanIdxList)}/{len(chanMap)} channels, "
+              f"from tStart={tStart}s to tEnd={tEnd}s...")
+        readIdxList = chanIdxList
+        if syncDetector is not None:
+            # The sync channel is read as an extra last row
+            syncIdx = get_SGLX_sync_idx(syncDetector, chanMap)
+            readIdxList = chanIdxList + [syncIdx]
+            print(f"Detect sync edges on channel {syncDetector.channel}")
+        # Read RAW data by blocks. Channel-major sidecars are used if they
+        # contain all the requested channels (see `sidecar.extract_SGLX`)
+        reader = self._get_reader(readIdxList)
+
+        # Convert raw data to requested unit
+        unit = 'uv'
+        print(f"Convert data to {unit}")
+        if unit.lower() == 'uv':
+            factor = 1.e6
+        # apply gain correction and convert
+        conv = factor * chanMap.conv[chanIdxList]
+        if mix is not None:
+            # Conversion is folded into the mixing matrix
+            mix = mix * conv[np.newaxis, :]
+            print(f"Derive N={len(chanLblList)} output channels")
+
+        # Downsample
+        nIn = lastSamp + 1 - firstSamp
+        if downSample is None or downSample == sRate:
+            downSample = sRate
+            nOut = nIn
+            overlap = 0
+        else:
+            if downSample > sRate:
+                print(
+                    f"Warning: The resampling rate ({downSample}) is greater "
+                    f"than the original sampling rate ({sRate})"
+                )
+            if ds_method == 'auto':
+                # One method for all blocks, from the ratio of the rates
+                ds_method = resample_bench.select_method(sRate, downSample)
+            print(f"-> Resampling from {sRate}Hz to {downSample}Hz using "
+                  f"'{ds_method}' method")
+            nOut = int(np.round(nIn * downSample / sRate))
+            overlap = int(RESAMPLE_CONTEXT_SECS * sRate)
+
+        blockFilter = None
+        if filters:
+            print(f"Filter data ({'zero-phase' if zeroPhase else 'causal'}): "
+                  f"{filters}")
+            blockFilter = filtering.BlockFilter(
+                filters, sRate, zeroPhase=zeroPhase
+            )
+            overlap = max(overlap, blockFilter.overlap)
+
+        if syncDetector is not None:
+            syncDetector.begin(sRate, firstSamp, nIn)
+
+        artifactAcc = None
+        if artifactIndex is not None:
+            artifactAcc = artifactIndex.add_channels(
+                chanMap.labels[chanIdxList], sRate, nIn, firstSamp=firstSamp,
+                rails=readSGLX.MaxInt(meta), conv=conv,
+            )
+
+        # Convert, filter and downsample each block while the next ones are
+        # being read
+        data_ds = np.empty((len(chanLblList), nOut))
+        if blockSamples is None:
+            blockSamples = prefetch.default_block_samples(
+                int(meta['nSavedChans'])
+            )
+        if nOut != nIn:
+            # Blocks start on output samples of the whole window
+            blockSamples, overlap = resample.align_blocks(
+                blockSamples, overlap,
+                resample.block_period(sRate, downSample),
+            )
+        blocks = prefetch.iter_blocks(
+            reader, firstSamp, lastSamp + 1, blockSamples=blockSamples,
+            overlap=overlap, queueDepth=queueDepth,
+        )
+        try:
+            for t0, t1, ctxStart, rawBlock in blocks:
+                monitor.check(cancelToken)
+                if syncDetector is not None:
+                    syncBlock = rawBlock[-1, t0 - ctxStart:t1 - ctxStart]
+                    rawBlock = rawBlock[:-1]
+                    if syncDetector.threshold is not None:
+                        syncBlock = syncBlock * chanMap.conv[syncIdx]
+                    syncDetector.update(syncBlock, t0)
+                if artifactAcc is not None:
+                    artifactAcc.update(
+                        rawBlock[:, t0 - ctxStart:t1 - ctxStart], t0
+                    )
+                if mix is None:
+                    convBlock = np.multiply(
+                        rawBlock, conv[:, np.newaxis], dtype=float
+                    )
+                else:
+                    convBlock = derive.apply_mix(mix, rawBlock)
+                if blockFilter is not None:
+                    convBlock = blockFilter(convBlock, ctxStart, t0, t1)
+                # Output samples are on the grid of the rates, so that
+                # overlapping windows (eg progressive loading) line up
+                j0, j1, dsBlock = resample.resample_block(
+                    convBlock, ctxStart - firstSamp, t0 - firstSamp,
+                    t1 - firstSamp, sRate, downSample, method=ds_method,
+                )
+                data_ds[:, j0:j1] = dsBlock
+                monitor.report(
+                    progress, 'read', t1 - firstSamp, nIn,
+                    nBytes=reader.bytesRead, binPath=self.binPath,
+                )
+        finally:
+            # Stop the read-ahead thread. Files stay open for the next reads
+            blocks.close()
+
+        return data_ds, downSample, chanLblList
+
+    def probe(self, chanList=None, chanListType='labels', derivations=None):
+        """Return sampling rate, duration and labels of `read`'s output.
+
+        Only the metadata is used. See `read` for a description of the
+        parameters.
+        """
+        chanMap = self.chanMap
+        if derivations and chanList is None:
+            chanList = []
+        _, chanLblList = get_loaded_chans_idx_labels(
+            chanList, chanListType, chanMap
+        )
+        if derivations:
+            _, _, chanLblList = derivations_mixing_matrix(
+                derivations, chanLblList, chanMap
+            )
+        return self.sRate, self.duration, chanLblList
+
+    def estimate_reads(self, chanList=None, chanListType='labels',
+                       derivations=None):
+        """Return (nRead, nSources) numbers of channels read by `read`.
+
+        All the saved channels are read from the interleaved bins, unless all
+        files have a channel-major sidecar with the source channels (see
+        `sidecar.extract_SGLX`).
+        """
+        chanMap = self.chanMap
+        if derivations and chanList is None:
+            chanList = []
+        chanIdxList, chanLblList = get_loaded_chans_idx_labels(
+            chanList, chanListType, chanMap
+        )
+        if derivations:
+            sourceLabels, _, _ = derivations_mixing_matrix(
+                derivations, chanLblList, chanMap
+            )
+            chanIdxList = list(chanMap.indices(sourceLabels))
+        hasSidecars = all(
+            sidecar.open_sidecar(path, chanIdxList) is not None
+            for path in self.run.binPaths
+        )
+        nRead = len(chanIdxList) if hasSidecars else len(chanMap)
+        return nRead, len(chanIdxList)
+
+
+class TDTRecording(Recording):
+    """TDT block, read with the tdt python package.
+
+    Metadata is read from the cached header index of the block (see
+    `tdt_index`).
+
+    Args:
+        binPath (str | pathlib.Path): Path to block
+
+    Attributes:
+        stores (dict): {<store>: {'name', 'fs', 'nChan'}} stream stores
+    """
+
+    capabilities = {
+        'windowed': True,
+        'chunked': False,
+        'probe': True,
+        'nativeDtype': 'float32',
+    }
+
+    def __init__(self, binPath):
+        super().__init__(binPath)
+        index = tdt_index.get_block_index(binPath)
+        self.stores = index['stores']
+        self.labels = [
+            f"{store}-{chan}"
+            for store, info in self.stores.items()
+            for chan in range(1, info['nChan'] + 1)
+        ]
+        sRates = set(info['fs'] for info in self.stores.values())
+        self.sRate = sRates.pop() if len(sRates) == 1 else None
+        self.duration = index['duration']
+
+    def read(self, downSample=None, tStart=None, tEnd=None, chanList=None,
+             chanListType='labels', ds_method='interpolation',
+             derivations=None, filters=None, zeroPhase=False,
+             artifactIndex=None, syncDetector=None, progress=None,
+             cancelToken=None):
+        """Read and downsample a time window of selected channels.
+
+        Channels are read one at a time with the tdt python package, which
+        only reads the events of the time window.
+
+        Kwargs:
+            downSample (int | float | None): Frequency in Hz at which the data
+                is subsampled. No subsampling if None. (default None)
+            tStart (float | None): Time in seconds from start of recording of
+                first loaded sample. Default 0.0
+            tEnd (float | None): Time in seconds from start of recording of
+                last loaded sample. Duration of recording by default
+            chanList (list(string) | str): List of loaded channels, or 'all'
+                to load all the channels of the stream stores. Can only be
+                None (or empty) with `derivations`. The provided list should
+                be formatted as follows::
+                        [<score_name>-<channel_index>, ...]
+                Where channels are 1-indexed, (IMPORTANT) not 0-indexed (for
+                consistency with tdt methods)
+                    eg: [LFPs-1, LFPs-2, EEGs-1, EEGs-94, EMGs-1...]
+            chanListType (str): Only 'labels' is supported for TDT data
+                (default 'labels')
+            ds_method (str): Method for resampling. Passed to
+                ``resample.signal_resample``. 'poly' is more accurate,
+                'interpolation' is faster, 'auto' picks the fastest method
+                meeting `resample_bench.AUTO_TARGET` (default
+                'interpolation')
+            derivations (dict | None): Virtual channels computed from the raw
+                data before downsampling, and appended to the channels of
+                `chanList`. Source channels are loaded one at a time. See
+                `derive` module. (default None)
+            filters (list(dict) | None): Notch and band-pass filters applied
+                to each channel at the original sampling rate, before
+                downsampling. See `filtering` module. (default None)
+            zeroPhase (bool): Filter forward and backward rather than
+                causally. (default False)
+            artifactIndex (artifacts.ArtifactIndex | None): If specified,
+                flatline and RMS indicators of each loaded channel are
+                accumulated in the index at the original sampling rate.
+                (default None)
+            syncDetector (sync.EdgeDetector | None): If specified, the sync
+                channel `syncDetector.channel` is loaded and its rising edges
+                are recorded in the detector. See `sync` module.
+                (default None)
+            progress (callable | None): Called after each channel is loaded
+                with a dictionary of progress (timepoints of all channels at
+                the original sampling rate and bytes read). See `monitor`
+                module. (default None)
+            cancelToken (monitor.CancelToken | None): Checked before loading
+                each channel. If cancelled, `monitor.LoadCancelled` is raised.
+                (default None)
+
+        Returns:
+            data (np.ndarray): The raw data of shape (n_channels, n_points)
+            downsample (float):The down-sampling frequency used.
+            chanList (list(str)): List of channels
+        """
+        binPath = self.binPath
+
+        if tStart is None:
+            tStart = 0.0
+        if tEnd is None:
+            tEnd = 0.0
+        print(f"tStart = {tStart}, tEnd={tEnd}")
+
+        chanList = self._chanList(chanList, chanListType, derivations)
+        storeChanList = parse_TDT_chanList(chanList) if chanList else []
+        validate_TDT_chanList(binPath, storeChanList)
+        derivedLabels, weights = [], []
+        if derivations:
+            derivedLabels, weights = parse_TDT_derivations(
+                binPath, derivations
+            )
+
+        syncChan = None
+        if syncDetector is not None:
+            if syncDetector.channel is None or (
+                syncDetector.threshold is None and syncDetector.line is None
+            ):
+                raise ValueError(
+                    "Specify the `channel` and `threshold` (or `line`) of the"
+                    " `sync` entry for TDT data."
+                )
+            syncChan = parse_TDT_chanList([syncDetector.channel])[0]
+            validate_TDT_chanList(binPath, [syncChan])
+
+        nSources = len(set(l for w in weights for l in w))
+        nLoadedChannels = len(storeChanList) + nSources
+        loaded = {'channels': 0, 'samples': 0, 'bytes': 0}
+
+        def load_channel(store, chan):
+            monitor.check(cancelToken)
+            print(f"Load channel {chan} from store {store}", end=", ")
+            blk = read_tdt_block(binPath, t1=tStart, t2=tEnd, store=store,
+                                 channel=chan)
+            stream = blk.streams[store]
+            loaded['channels'] += 1
+            loaded['samples'] += len(stream.data)
+            loaded['bytes'] += stream.data.nbytes
+            monitor.report(
+                progress, 'read', loaded['samples'],
+                # Assume the remaining channels have the same number of samples
+                loaded['samples'] + (nLoadedChannels - loaded['channels'])
+                * len(stream.data),
+                nBytes=loaded['bytes'], binPath=binPath,
+            )
+            if artifactIndex is not None:
+                # Float streams: no ADC rails
+                artifactIndex.add_channels(
+                    [f"{store}-{chan}"], stream.fs, len(stream.data)
+                ).update(stream.data[np.newaxis, :], 0)
+            return stream.fs, stream.data, stream.start_time
+
+        def iter_channels():
+            """Yield (sRate, data, start_time) of all output channels."""
+            for store, chan in storeChanList:
+                yield load_channel(store, chan)
+            if not weights:
+                return
+            # Accumulate all derived channels in a single pass on the sources
+            derived = None
+            sources = list(dict.fromkeys(l for w in weights for l in w))
+            for label in sources:
+                sRate, chandat, start_time = load_channel(
+                    *parse_TDT_chanList([label])[0]
+                )
+                if derived is None:
+                    derived = np.zeros((len(weights), len(chandat)))
+                n = min(len(chandat), derived.shape[1])
+                derived = derived[:, :n]
+                for i, w in enumerate(weights):
+                    if label in w:
+                        derived[i] += w[label] * chandat[:n]
+            for derived_dat in derived:
+                yield sRate, derived_dat, start_time
+
+        if filters:
+            print(f"Filter data ({'zero-phase' if zeroPhase else 'causal'}): "
+                  f"{filters}")
+
+        # Load and downsample data for all requested channels
+        chan_dat_list = []  # List of channel data arrays to concatenate
+        chan_ts_list = []  # List of timestamps for each channel
+        # Iterate on channels:
+        for sRate, chandat, start_time in iter_channels():
+            window = (sRate, int(round(start_time * sRate)), len(chandat))
+
+            # Filter the whole channel at the original sampling rate
+            if filters:
+                blockFilter = filtering.BlockFilter(
+                    filters, sRate, zeroPhase=zeroPhase
+                )
+                chandat = blockFilter(
+                    np.asarray(chandat, dtype=float)[np.newaxis, :], 0, 0,
+                    len(chandat)
+                )[0]
+
+            # Downsample the data
+            if downSample is None or downSample == sRate:
+                downSample = sRate
+                chan_dat_ds = chandat
+            else:
+                if downSample > sRate:
+                    print(
+                        f"Warning: The resampling rate ({downSample}) is "
+                        f"greater than the original sampling rate ({sRate})"
+                    )
+                method = ds_method
+                if method == 'auto':
+                    method = resample_bench.select_method(sRate, downSample)
+                print(f"-> Resampling from {sRate}Hz to {downSample}Hz using "
+                      f"'{method}' method")
+                if not chan_dat_list:
+                    # First channel: downsample to target
+                    chan_dat_ds = resample.signal_resample(
+                        chandat, sampling_rate=sRate,
+                        desired_sampling_rate=downSample,
+                        method=method,
+                    )
+                else:
+                    # next channels: downsample to match first channel's length
+                    chan_dat_ds = resample.signal_resample(
+                        chandat, sampling_rate=sRate,
+                        desired_length=len(chan_dat_list[0]),
+                        method=method,
+                    )
+
+            # Add data and timestamps
+            chan_ts_ds = [start_time + i/downSample
+                          for i in range(len(chan_dat_ds))]
+            chan_dat_list.append(chan_dat_ds)
+            chan_ts_list.append(chan_ts_ds)
+
+        if syncChan is not None:
+            # Rising edges of the sync channel, relative to the window of the
+            # loaded channels
+            print(f"Detect sync edges on channel {syncDetector.channel}")
+            monitor.check(cancelToken)
+            syncDetector.begin(*window)
+            syncStream = read_tdt_block(
+                binPath, t1=tStart, t2=tEnd, store=syncChan[0],
+                channel=syncChan[1],
+            ).streams[syncChan[0]]
+            syncDetector.update(
+                syncStream.data,
+                int(round(syncStream.start_time * syncStream.fs)),
+                sRate=syncStream.fs,
+            )
+
+        # Check same number of samples for all channels
+        assert all(
+            [dat.shape == chan_dat_list[0].shape for dat in chan_dat_list]
+        )
+        # Check data is aligned for all channels (~same timestamps for each
+        # channel)
+        MAX_DIFF = 0.001  # (s)
+        ts_diff = [max(ts_list) - min(ts_list)
+                   for ts_list in zip(*chan_ts_list)]
+        assert all([v <= MAX_DIFF for v in ts_diff])
+
+        return (np.stack(chan_dat_list), downSample,
+                list(chanList) + derivedLabels)
+
+    def _chanList(self, chanList, chanListType, derivations):
+        """Return the list of labels of loaded channels."""
+        if chanListType != 'labels':
+            raise ValueError(
+                f"Only 'labels' chanListType is supported for TDT data, not "
+                f"`{chanListType}`"
+            )
+        if derivations and not chanList:
+            return []
+        if chanList == 'all':
+            return list(self.labels)
+        # Raise for None: stores can hold hundreds of channels, loaded one at
+        # a time, so loading all of them should be explicit
+        parse_TDT_chanList(chanList)
+        return chanList
+
+    def probe(self, chanList=None, chanListType='labels', derivations=None):
+        """Return sampling rate, duration and labels of `read`'s output.
+
+        Only the cached header index is used. See `read` for a description of
+        the parameters.
+        """
+        binPath = self.binPath
+        chanList = self._chanList(chanList, chanListType, derivations)
+        storeChanList = parse_TDT_chanList(chanList) if chanList else []
+        index = validate_TDT_chanList(binPath, storeChanList)
+        derivedLabels, weights = [], []
+        if derivations:
+            derivedLabels, weights = parse_TDT_derivations(
+                binPath, derivations
+            )
+            # Source channels of all the derivations
+            storeChanList += parse_TDT_chanList(
+                list(dict.fromkeys(l for w in weights for l in w))
+            )
+        sRates = set(
+            index['stores'][store]['fs'] for store, _ in storeChanList
+        )
+        if len(sRates) > 1:
+            raise ValueError(
+                f"Loaded stores have different sampling rates ({sRates})"
+            )
+        return sRates.pop(), index['duration'], list(chanList) + derivedLabels
+
+    def estimate_reads(self, chanList=None, chanListType='labels',
+                       derivations=None):
+        """Return (nRead, nSources) numbers of channels read by `read`.
+
+        Each loaded channel and each source channel of the derivations is
+        read separately.
+        """
+        chanList = self._chanList(chanList, chanListType, derivations)
+        nSources = 0
+        if derivations:
+            _, weights = parse_TDT_derivations(self.binPath, derivations)
+            nSources = len(set(l for w in weights for l in w))
+        return len(chanList) + nSources, len(chanList) + nSources
+
+
+def open_recording(binPath, datatype='SGLX'):
+    """Return a `Recording` of data in a supported format.
+
+    Args:
+        binPath (str | pathlib.Path | list): Path to the recording
+        datatype (str): Name of a registered format, eg 'SGLX' or 'TDT'.
+            See `registry`. (default 'SGLX')
+    """
+    from . import registry
+    return registry.get_format(datatype)(binPath)
+
+
+def map_AP_to_LF(labels, apMap, lfMap):
+    """Return {<AP label>: <LF label>} of channels of an imec recording.
+
+    AP channel "AP<n>;<i>" and LF channel "LF<n>;<j>" of the `snsChanMap` of
+    the AP and LF files record the same site <n>. Other channels (eg: SY) have
+    the same label in both files.
+
+    Args:
+        labels (list(str)): Labels of channels of the AP file
+        apMap, lfMap (readSGLX.ChannelMap): Channel maps of the AP and LF files
+
+    Returns:
+        dict | None: None if a channel has no counterpart in the LF file
+    """
+    lfSites = {}
+    for label, band in zip(lfMap.labels, lfMap.bands):
+        match = re.match(r'LF(\d+);', label)
+        if band == 'LF' and match:
+            lfSites[int(match.group(1))] = label
+    bands = dict(zip(apMap.labels, apMap.bands))
+    lfLabels = {}
+    for label in labels:
+        if bands.get(label) == 'AP':
+            match = re.match(r'AP(\d+);', label)
+            lfLabel = lfSites.get(int(match.group(1))) if match else None
+        else:
+            lfLabel = label if label in lfMap.labelIndex else None
+        if lfLabel is None:
+            return None
+        lfLabels[label] = lfLabel
+    return lfLabels
+
+
+def get_loaded_chans_idx_labels(chanList, chanListType, chanMap):
+    """Return lists of indices and labels of loaded channels.
+
+    Args:
+        chanList (list | None): Loaded channels. All if None or 'all'
+        chanListType (str): 'indices' or 'labels'
+        chanMap (readSGLX.ChannelMap): Channel map of the recording
+    """
+    if chanList is None or chanList == 'all':
+        # Load all channels
+        chanList = range(0, len(chanMap))
+        chanListType = 'indices'
+    assert chanListType in ['indices', 'labels']
+    if chanListType == 'indices':
+        # Interpret the list of channels as a list of indices in saved
+        # recording
+        chanIdxList = [int(c) for c in chanList]
+    elif chanListType == 'labels':
+        # Interpret the list of channels as a list of labels. Keeps
+        # user-requested order
+        try:
+            chanIdxList = chanMap.indices(chanList).tolist()
+        except KeyError as e:
+            raise Exception(e.args[0])
+    chanLblList = list(chanMap.labels[chanIdxList])
+    return list(chanIdxList), chanLblList
+
+
+def get_SGLX_sync_idx(syncDetector, chanMap):
+    """Return saved index of the sync channel and set the detector defaults.
+
+    By default, the sync channel is the first SY (imec) or DW (NIDQ) channel,
+    and the sync signal is on line `sync.SYNC_LINE_IMEC` (SY) or 0 (DW).
+    """
+    if syncDetector.channel is None:
+        digital = np.flatnonzero(np.isin(chanMap.bands, ['SY', 'DW']))
+        if not len(digital):
+            raise ValueError(
+                "No sync (SY) or digital (DW) channel saved in the recording. "
+                "Specify the `channel` and `threshold` of the `sync` entry to"
+                " use an analog channel."
+            )
+        syncDetector.channel = chanMap.labels[digital[0]]
+    syncIdx = int(chanMap.indices([syncDetector.channel])[0])
+    band = chanMap.bands[syncIdx]
+    if syncDetector.threshold is None and syncDetector.line is None:
+        if band == 'SY':
+            syncDetector.line = sync.SYNC_LINE_IMEC
+        elif band == 'DW':
+            syncDetector.line = 0
+        else:
+            raise ValueError(
+                f"Specify the `threshold` of analog sync channel "
+                f"`{syncDetector.channel}`."
+            )
+    return syncIdx
+
+
+def derivations_mixing_matrix(derivationsDict, chanLblList, chanMap):
+    """Return source labels, mixing matrix and output labels of SGLX data.
+
+    See `derive.mixing_matrix`. 'all' references are all the saved
+    channels of the same band (eg 'LF') as the referenced channel.
+    """
+    bands = dict(zip(chanMap.labels, chanMap.bands))
+    derivedLabels, weights = derive.parse_derivations(
+        derivationsDict, list(chanMap.labels), lambda label: bands.get(label)
+    )
+    missing = set(l for w in weights for l in w) - set(chanMap.labels)
+    if missing:
+        raise Exception(
+            f"Channels used in derivations not found in saved channels: "
+            f"{sorted(missing)}. Saved channels: {list(chanMap.labels)}"
+        )
+    return derive.mixing_matrix(chanLblList, derivedLabels, weights)
+
+
+def parse_TDT_chanList(chanList):
+    """Validate TDT `chanList` and return list of (<store>, <channel>) tuples.
+
+    Values in chanList should be string formatted as follows::
+            [<score_name>-<channel_index>, ...]
+    Where channels are 1-indexed.
+    """
+
+    def validate_chan(s):
+        return isinstance(s, str) and len(s.split('-')) == 2
+
+    def parse_chan(score_chan):
+        store, chan = [s.strip(' ') for s in score_chan.split('-')]
+        return store, int(chan)
+
+    # Check length and formatting of `chanList parameter`
+    chanList_error_msg = (
+        "`chanList` should be a non-empty list of strings and formatted as "
+        "follows:\n         [<score_name>-<channel_index>, ...], \n"
+        "where channel indices are 1-indexed (not 0-indexed). eg: \n"
+        "       [LFPs-1, LFPs-2, EEGs-1, EEGs-94, EMGs-1...] \n"
+        f"Currently chanList = {chanList}"
+    )
+    if chanList is None:
+        raise ValueError(chanList_error_msg)
+    if not (len(chanList) > 0
+            and all([validate_chan(s) for s in chanList])
+            and all([parse_chan(s)[1] > 0 for s in chanList])):
+        raise ValueError(chanList_error_msg)
+
+    return [parse_chan(s) for s in chanList]
+
+
+def validate_TDT_chanList(binPath, storeChanList):
+    """Check that requested stores and channels exist in a TDT block.
+
+    Uses the cached header index of the block (see `tdt_index`).
+
+    Returns:
+        dict: Header index of the block. See `tdt_index.get_block_index`
+    """
+    index = tdt_index.get_block_index(binPath)
+    stores = index['stores']
+    missing = set(store for store, _ in storeChanList) - set(stores.keys())
+    if missing:
+        raise Exception(f"Stores `{missing}` not found in data."
+                        f" Existing stores = {list(stores.keys())}")
+    for store, chan in storeChanList:
+        if chan > stores[store]['nChan']:
+            raise ValueError(
+                f"Channel {chan} not found in store `{store}`, which has "
+                f"{stores[store]['nChan']} channels (1-indexed)."
+            )
+    return index
+
+
+def parse_TDT_derivations(binPath, derivationsDict):
+    """Return labels and source weights of derived channels of a TDT block.
+
+    See `derive.parse_derivations`. 'all' references are all the channels of
+    the store of the referenced channel.
+    """
+    stores = tdt_index.get_block_index(binPath)['stores']
+    allLabels = [
+        f"{store}-{chan}"
+        for store, info in stores.items()
+        for chan in range(1, info['nChan'] + 1)
+    ]
+    derivedLabels, weights = derive.parse_derivations(
+        derivationsDict, allLabels, lambda label: label.split('-')[0].strip()
+    )
+    sources = list(dict.fromkeys(l for w in weights for l in w))
+    index = validate_TDT_chanList(binPath, parse_TDT_chanList(sources))
+    sRates = set(index['stores'][store]['fs']
+                 for store, _ in parse_TDT_chanList(sources))
+    if len(sRates) > 1:
+        raise ValueError(
+            f"Channels used in derivations have different sampling rates "
+            f"({sRates})"
+        )
+    return derivedLabels, weights
+
+
+def read_tdt_block(binPath, t1=None, t2=None, store=None, channel=None):
+    """Wrapper arount tdt.read_block that avoids bug in the function.
+
+    tdt.read_block returns "channel 1 not found in store" if first channel
+    of a single-channel store.
+
+    The headers of the block are read from the cached index (see `tdt_index`)
+    rather than parsed at each call.
+    """
+    stores = tdt_index.get_block_index(binPath)['stores']
+    if store in stores and stores[store]['nChan'] == 1 and channel == 1:
+        print(f"`{store}` have only 1 chan -> Contourn tdt.read_block bug")
+        channel = 0  # Return "all" channels of single channel store
+    return tdt.read_block(
+        binPath, headers=tdt_index.get_store_headers(binPath, store),
+        t1=t1, t2=t2, store=store, channel=channel, evtype=['streams'],
+    )
@@ -0,0 +1,99 @@
+"""Registry of the data formats that can be loaded.
+
+Each format is a `recording.Recording` subclass, registered under the name
+used for the `datatype` of datasets (case insensitive). The built-in formats
+are 'SGLX' and 'TDT'. Other packages can add formats without modifying
+sleepscore by declaring their `Recording` subclass as an entry point of the
+`sleepscore.formats` group, eg in their setup.py::
+
+    entry_points={
+        'sleepscore.formats': ['myformat = mypackage.loader:MyRecording'],
+    }
+
+or by calling `register_format` directly.
+
+Each format declares its capabilities in the `capabilities` attribute of its
+class (see `recording.CAPABILITIES`), which the loading pipeline uses to pick
+the best path the format supports (eg: block-wise reads, progressive loading,
+memory planning).
+"""
+from . import recording
+
+ENTRY_POINT_GROUP = 'sleepscore.formats'
+
+_FORMATS = {}  # {<lowercase datatype>: (<datatype>, <Recording subclass>)}
+_entryPointsLoaded = False
+
+
+def register_format(datatype, recordingClass):
+    """Register a `Recording` subclass as the loader of a data format.
+
+    Args:
+        datatype (str): Name of the format (eg 'SGLX')
+        recordingClass (type): `recording.Recording` subclass
+    """
+    if not (isinstance(recordingClass, type)
+            and issubclass(recordingClass, recording.Recording)):
+        raise TypeError(
+            f"The loader of format `{datatype}` should be a subclass of "
+            f"`recording.Recording`, not {recordingClass}"
+        )
+    unknown = set(recordingClass.capabilities) - set(recording.CAPABILITIES)
+    if unknown:
+        raise ValueError(
+            f"Unrecognized capabilities of format `{datatype}`: {unknown}. "
+            f"Supported capabilities: {list(recording.CAPABILITIES)}"
+        )
+    _FORMATS[datatype.lower()] = (datatype, recordingClass)
+
+
+def _load_entry_points():
+    """Register the formats declared by installed packages, once."""
+    global _entryPointsLoaded
+    if _entryPointsLoaded:
+        return
+    _entryPointsLoaded = True
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # python < 3.8
+        return
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group=ENTRY_POINT_GROUP)
+    else:
+        eps = eps.get(ENTRY_POINT_GROUP, [])
+    for ep in eps:
+        if ep.name.lower() in _FORMATS:
+            continue  # Built-in and registered formats take precedence
+        try:
+            register_format(ep.name, ep.load())
+        except Exception as e:
+            print(f"Warning: could not load data format `{ep.name}` "
+                  f"({ep.value}): {e}")
+
+
+def get_format(datatype):
+    """Return the `Recording` subclass of a data format."""
+    _load_entry_points()
+    if datatype.lower() not in _FORMATS:
+        raise ValueError(
+            f'Data format: `{datatype}` not supported.\n'
+            f'Supported values for `datatype` parameter: {formats()}'
+        )
+    return _FORMATS[datatype.lower()][1]
+
+
+def formats():
+    """Return the names of all the supported data formats."""
+    _load_entry_points()
+    return [datatype for datatype, _ in _FORMATS.values()]
+
+
+def get_capabilities(datatype):
+    """Return the capabilities of a data format (see
+    `recording.CAPABILITIES`)."""
+    return dict(recording.CAPABILITIES, **get_format(datatype).capabilities)
+
+
+register_format('SGLX', recording.SGLXRecording)
+register_format('TDT', recording.TDTRecording)
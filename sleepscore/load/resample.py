@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from fractions import Fraction
+
 import pandas as pd
 import numpy as np
 
@@ -27,7 +29,7 @@ def signal_resample(signal, desired_length=None, sampling_rate=None, desired_sam
     sampling_rate, desired_sampling_rate : int
         The original and desired (output) sampling frequency (in Hz, i.e., samples/second).
     method : str
-        Can be 'numpy' (default) for numpy's interpolation (see `numpy.interp()`), 'pandas' for Pandas' time series resampling, 'interpolation' (see `scipy.ndimage.zoom()`), 'poly' (see `scipy.signal.resample_poly()`) or 'FFT' (see `scipy.signal.resample()`) for the Fourier method. FFT is the most accurate (if the signal is periodic), but becomes exponentially slower as the signal length increases. In contrast, 'numpy' is the fastest, followed by 'poly', 'pandas' and 'interpolation'.
+        Can be 'numpy' (default) for numpy's interpolation (see `numpy.interp()`), 'pandas' for Pandas' time series resampling, 'interpolation' for cubic spline interpolation (see `scipy.ndimage.map_coordinates()`), 'poly' (see `scipy.signal.resample_poly()`), 'FFT' (see `scipy.signal.resample()`) for the Fourier method, or 'auto' for the fastest method meeting the accuracy target of `resample_bench.AUTO_TARGET`. FFT is the most accurate (if the signal is periodic), but becomes exponentially slower as the signal length increases. In contrast, 'numpy' is the fastest, followed by 'poly', 'pandas' and 'interpolation'.
     Returns
     -------
     array
@@ -71,7 +73,7 @@ def signal_resample(signal, desired_length=None, sampling_rate=None, desired_sam
     >>> %timeit nk.signal_resample(signal, method="pandas", sampling_rate=1000, desired_sampling_rate=500)
     See Also
     --------
-    scipy.signal.resample_poly, scipy.signal.resample, scipy.ndimage.zoom
+    scipy.signal.resample_poly, scipy.signal.resample, scipy.ndimage.map_coordinates
     """
     if desired_length is None:
         desired_length = int(np.round(len(signal) * desired_sampling_rate / sampling_rate))
@@ -80,6 +82,11 @@ def signal_resample(signal, desired_length=None, sampling_rate=None, desired_sam
     if len(signal) == desired_length:
         return(signal)
 
+    # Fastest method meeting the accuracy target for these lengths
+    if method.lower() == "auto":
+        from .resample_bench import select_method
+        method = select_method(len(signal), desired_length)
+
     # Resample
     if method.lower() == "fft":
         resampled = _resample_fft(signal, desired_length)
@@ -96,6 +103,96 @@ def signal_resample(signal, desired_length=None, sampling_rate=None, desired_sam
 
 
 
+def resample_channels(data, desired_length, method="interpolation"):
+    """Resample each row of a (n_channels, n_samples) array to `desired_length`.
+
+    `signal_resample` only handles 1D signals (some methods would also
+    resample the channel axis), so channels are resampled one at a time.
+    """
+    resampled = np.empty((data.shape[0], desired_length), dtype=float)
+    for i in range(data.shape[0]):
+        resampled[i, :] = signal_resample(
+            data[i, :], desired_length=desired_length, method=method
+        )
+    return resampled
+
+
+# Longest period (input timepoints) of the resampling grid used to align blocks
+MAX_BLOCK_PERIOD = 10000
+
+
+def block_period(sRate, downSample):
+    """Return the number of input timepoints of a whole number of outputs.
+
+    Eg 25 from 2500Hz to 100Hz (sRate / gcd(sRate, downSample)). None if the
+    ratio of the rates isn't a fraction with a denominator below
+    MAX_BLOCK_PERIOD (eg calibrated, non-integer rates).
+    """
+    ratio = downSample / sRate
+    fraction = Fraction(ratio).limit_denominator(MAX_BLOCK_PERIOD)
+    if abs(float(fraction) - ratio) > 1e-12 * ratio:
+        return None
+    return fraction.denominator
+
+
+def align_blocks(blockSamples, overlap, period):
+    """Return block size and context rounded to multiples of `period`.
+
+    Blocks resampled by `resample_block` then start and end on output samples
+    of the whole signal, so that the grid of each block isn't rounded (which
+    shifts the output by up to half a sample at block boundaries) and `poly`
+    resamples with the reduced up/down ratio. The block size is rounded down
+    and the context up. Unchanged if `period` is None or longer than a block.
+    """
+    if period is None or period > blockSamples:
+        return blockSamples, overlap
+    return blockSamples // period * period, -(-overlap // period) * period
+
+
+def resample_block(block, ctxStart, start, stop, nIn, nOut,
+                   method="interpolation"):
+    """Resample a block of a longer signal onto the grid of the whole signal.
+
+    Input timepoint t maps to output sample round(t * nOut / nIn), so that
+    consecutive blocks resampled independently line up without drift. The
+    block can include context around [start, stop), which reduces edge effects
+    and is trimmed from the output. Blocks and context should be aligned with
+    `align_blocks` so that the output matches the resampling of the whole
+    signal.
+
+    Args:
+        block (np.ndarray): (n_channels, n_ctx) array of input timepoints
+            ctxStart to ctxStart + n_ctx
+        ctxStart, start, stop (int): Input timepoints of the first sample of
+            `block`, and of the range [start, stop) to resample
+        nIn, nOut (int | float): Length of the whole input and output
+            signals. Only their ratio is used, so the input and output
+            sampling rates can be passed for signals of unknown length.
+
+    Returns:
+        (j0, j1, resampled): Output samples j0 to j1 (excluded) and their
+            (n_channels, j1 - j0) values
+    """
+    def J(t):
+        return int(np.round(t * nOut / nIn))
+
+    j0, j1 = J(start), J(stop)
+    ctxStop = ctxStart + block.shape[1]
+    if nOut == nIn:
+        return j0, j1, block[:, start - ctxStart:stop - ctxStart]
+    nCtxOut = J(ctxStop) - J(ctxStart)
+    # Trim or pad the end of the block to the input span of its output
+    # samples, so that the ratio of the lengths is nOut / nIn
+    span = int(np.round(nCtxOut * nIn / nOut))
+    if span < block.shape[1]:
+        block = block[:, :span]
+    elif span > block.shape[1]:
+        block = np.pad(
+            block, ((0, 0), (0, span - block.shape[1])), mode='edge'
+        )
+    resampled = resample_channels(block, nCtxOut, method=method)
+    return j0, j1, resampled[:, j0 - J(ctxStart):j1 - J(ctxStart)]
+
 
 # =============================================================================
 # Methods
@@ -111,7 +208,14 @@ def _resample_numpy(signal, desired_length):
 
 
 def _resample_interpolation(signal, desired_length):
-    resampled_signal = scipy.ndimage.zoom(signal, desired_length/len(signal))
+    # Output sample j is at input timepoint j * len(signal) / desired_length,
+    # as for the other methods. ndimage.zoom maps the last samples onto each
+    # other, which stretches the signal depending on its length
+    coords = np.arange(desired_length) * len(signal) / desired_length
+    resampled_signal = scipy.ndimage.map_coordinates(
+        np.asarray(signal, dtype=float), coords[np.newaxis, :], order=3,
+        mode='nearest',
+    )
     return(resampled_signal)
 
 
@@ -127,11 +231,11 @@ def _resample_poly(signal, desired_length):
 
 def _resample_pandas(signal, desired_length):
     # Convert to Time Series
-    index = pd.date_range('20131212', freq='L', periods=len(signal))
+    index = pd.date_range('20131212', freq='ms', periods=len(signal))
     resampled_signal = pd.Series(signal, index=index)
 
     # Create resampling factor
-    resampling_factor = str(1/(desired_length / len(signal))) + "L"
+    resampling_factor = str(1/(desired_length / len(signal))) + "ms"
 
     # Resample
     resampled_signal = resampled_signal.resample(resampling_factor).bfill().values
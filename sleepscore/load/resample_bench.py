@@ -0,0 +1,290 @@
+"""Accuracy and speed of the resampling methods, and automatic selection.
+
+The accuracy of a method depends on the ratio of the sampling rates, and is
+measured against analytic test signals (sums of sinusoids of known amplitude):
+    - passband ripple: largest gain error (in dB) of sinusoids between 10% and
+      80% of the output Nyquist frequency
+    - passband error: power of the difference between the resampled passband
+      signal and its analytic value at the output timepoints, relative to the
+      power of the signal (in dB). Includes timing errors.
+    - aliasing: power of the output when resampling sinusoids between 120% of
+      the output Nyquist frequency and the input Nyquist frequency, relative
+      to the power of the input (in dB). 0dB means no anti-aliasing.
+The speed of a method also depends on the length of the resampled signal (eg
+'poly' is slow when the lengths have no large common divisor).
+
+With `ds_method='auto'`, `select_method` picks the fastest method meeting the
+accuracy target `AUTO_TARGET` for the ratio of the sampling rates. Accuracy is
+measured once per ratio, and methods are ranked by the fixed order
+`AUTO_SPEED_ORDER` rather than timed, so that the selection only depends on
+the rates and the target: the same method is used for all the blocks of a
+load, across runs and machines.
+"""
+import functools
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from . import resample
+
+METHODS = ['interpolation', 'numpy', 'poly', 'FFT', 'pandas']
+
+# Default accuracy target of the 'auto' method
+AUTO_MAX_ALIASING = -40.0  # (dB)
+AUTO_MAX_RIPPLE = 0.1  # (dB)
+# Current accuracy target of the 'auto' method. See `set_auto_target`
+AUTO_TARGET = {
+    'maxAliasing': AUTO_MAX_ALIASING,
+    'maxRipple': AUTO_MAX_RIPPLE,
+}
+# Methods from fastest to slowest (see `benchmark`). 'poly' is only fast when
+# the ratio of the rates is a fraction with a small denominator (see
+# `resample.block_period`), and is ranked last otherwise
+AUTO_SPEED_ORDER = ['numpy', 'poly', 'pandas', 'interpolation', 'FFT']
+
+# Number of output samples of the accuracy test signals
+ACCURACY_SAMPLES = 2000
+
+# Realistic (sRate, downSample) pairs
+BENCHMARK_RATES = [
+    (2500.0, 100.0),  # SpikeGLX LF
+    (30000.0, 100.0),  # SpikeGLX AP
+    (30000.0, 1000.0),
+    (25000.0, 100.0),  # SpikeGLX NIDQ
+    (1017.2526245117188, 100.0),  # TDT
+    (24414.0625, 100.0),  # TDT
+]
+BENCHMARK_DURATIONS = [10.0, 60.0]  # (s)
+
+
+def set_auto_target(maxAliasing=AUTO_MAX_ALIASING, maxRipple=AUTO_MAX_RIPPLE):
+    """Set the accuracy target of the 'auto' method.
+
+    Kwargs:
+        maxAliasing (float): Maximum aliasing in dB (default AUTO_MAX_ALIASING)
+        maxRipple (float): Maximum passband ripple in dB
+            (default AUTO_MAX_RIPPLE)
+    """
+    AUTO_TARGET['maxAliasing'] = float(maxAliasing)
+    AUTO_TARGET['maxRipple'] = float(maxRipple)
+
+
+def _tones(n, freqs, rng):
+    """Sum of unit cosines of frequencies `freqs` (cycles/sample)."""
+    t = np.arange(n)
+    phases = rng.uniform(0, 2 * np.pi, len(freqs))
+    signal = np.zeros(n)
+    for f, phase in zip(freqs, phases):
+        signal += np.cos(2 * np.pi * f * t + phase)
+    return signal, phases
+
+
+def measure_accuracy(ratio, method, nOut=ACCURACY_SAMPLES):
+    """Return passband ripple, passband error and aliasing (dB) of a method.
+
+    Args:
+        ratio (float): Ratio of the output and input sampling rates
+        method (str): Passed to `resample.signal_resample`
+
+    Kwargs:
+        nOut (int): Number of output samples of the test signals. The first
+            and last 10% are discarded to ignore edge effects.
+            (default ACCURACY_SAMPLES)
+
+    Returns:
+        dict: {'ripple_db': float, 'error_db': float, 'aliasing_db': float}
+    """
+    nIn = int(round(nOut / ratio))
+    nOut = int(round(nIn * ratio))
+    rng = np.random.default_rng(0)
+    # Frequencies in cycles per input sample
+    nyquist = min(ratio, 1.0) / 2
+    # Output timepoints, in input samples
+    times = np.arange(nOut) * nIn / nOut
+    keep = slice(nOut // 10, nOut - nOut // 10)
+
+    passFreqs = nyquist * np.array([0.1, 0.3, 0.5, 0.7, 0.8])
+    signal, phases = _tones(nIn, passFreqs, rng)
+    out = resample.signal_resample(signal, desired_length=nOut, method=method)
+    ref = np.zeros(nOut)
+    gains = []
+    for f, phase in zip(passFreqs, phases):
+        ref += np.cos(2 * np.pi * f * times + phase)
+        basis = np.stack([
+            np.cos(2 * np.pi * f * times[keep]),
+            np.sin(2 * np.pi * f * times[keep]),
+        ], axis=1)
+        coefs, *_ = np.linalg.lstsq(basis, out[keep], rcond=None)
+        gains.append(np.hypot(*coefs))
+    with np.errstate(divide='ignore'):
+        ripple = np.max(np.abs(20 * np.log10(gains)))
+        error = 10 * np.log10(
+            np.mean((out[keep] - ref[keep])**2) / np.mean(ref[keep]**2)
+        )
+
+    aliasing = -np.inf
+    if ratio < 1 and 1.2 * nyquist < 0.475:
+        stopFreqs = np.linspace(1.2 * nyquist, 0.475, 8)
+        signal, _ = _tones(nIn, stopFreqs, rng)
+        out = resample.signal_resample(
+            signal, desired_length=nOut, method=method
+        )
+        with np.errstate(divide='ignore'):
+            aliasing = 10 * np.log10(
+                np.mean(out[keep]**2) / np.mean(signal**2)
+            )
+
+    return {
+        'ripple_db': float(ripple),
+        'error_db': float(error),
+        'aliasing_db': float(aliasing),
+    }
+
+
+def measure_speed(nIn, nOut, method, nRepeats=1, memory=False):
+    """Return duration (s) and peak memory (bytes) of resampling a signal.
+
+    The duration is the shortest of `nRepeats` runs. Peak memory is measured
+    with `tracemalloc` in a separate run if `memory` is True (None otherwise).
+    """
+    signal = np.random.default_rng(0).standard_normal(nIn)
+    duration = np.inf
+    for _ in range(nRepeats):
+        start = time.perf_counter()
+        resample.signal_resample(signal, desired_length=nOut, method=method)
+        duration = min(duration, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            resample.signal_resample(
+                signal, desired_length=nOut, method=method
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return duration, peak
+
+
+def benchmark(rates=None, durations=None, methods=None, nRepeats=3):
+    """Measure accuracy, throughput and peak memory of resampling methods.
+
+    Kwargs:
+        rates (list(tuple)): (sRate, downSample) pairs
+            (default BENCHMARK_RATES)
+        durations (list(float)): Durations of the resampled signals in
+            seconds (default BENCHMARK_DURATIONS)
+        methods (list(str)): Methods passed to `resample.signal_resample`
+            (default METHODS)
+        nRepeats (int): Number of runs of each method. Throughput is
+            measured on the fastest run. (default 3)
+
+    Returns:
+        pd.DataFrame: One row per method, rate and duration, with columns
+            'method', 'sRate', 'downSample', 'duration', 'n_samples',
+            'throughput' (input samples per second), 'peak_memory' (MB),
+            'ripple_db', 'error_db', 'aliasing_db' and 'failed' (error
+            message if the method failed).
+    """
+    rates = BENCHMARK_RATES if rates is None else rates
+    durations = BENCHMARK_DURATIONS if durations is None else durations
+    methods = METHODS if methods is None else methods
+
+    rows = []
+    for sRate, downSample in rates:
+        for method in methods:
+            print(f"Benchmark '{method}' method from {sRate}Hz to "
+                  f"{downSample}Hz")
+            try:
+                accuracy = measure_accuracy(downSample / sRate, method)
+            except Exception as e:
+                accuracy = {}
+                failed = repr(e)
+            else:
+                failed = None
+            for duration in durations:
+                nIn = int(round(duration * sRate))
+                nOut = int(round(duration * downSample))
+                row = {
+                    'method': method,
+                    'sRate': sRate,
+                    'downSample': downSample,
+                    'duration': duration,
+                    'n_samples': nIn,
+                    'throughput': np.nan,
+                    'peak_memory': np.nan,
+                    'ripple_db': accuracy.get('ripple_db', np.nan),
+                    'error_db': accuracy.get('error_db', np.nan),
+                    'aliasing_db': accuracy.get('aliasing_db', np.nan),
+                    'failed': failed,
+                }
+                if failed is None:
+                    try:
+                        dur, peak = measure_speed(
+                            nIn, nOut, method, nRepeats=nRepeats, memory=True
+                        )
+                    except Exception as e:
+                        row['failed'] = repr(e)
+                    else:
+                        row['throughput'] = nIn / dur
+                        row['peak_memory'] = peak / 1e6
+                rows.append(row)
+    return pd.DataFrame(rows)
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_accuracy(ratio, method):
+    try:
+        return measure_accuracy(ratio, method)
+    except Exception:
+        return None
+
+
+def select_method(nIn, nOut, maxAliasing=None, maxRipple=None):
+    """Return the fastest method meeting an accuracy target.
+
+    If no method meets the target, return the method with the least
+    aliasing. The selection only depends on the ratio nOut / nIn and the
+    target, so it should be made once per load, from the sampling rates.
+
+    Args:
+        nIn, nOut (int | float): Length of the input and output signals, or
+            input and output sampling rates
+
+    Kwargs:
+        maxAliasing, maxRipple (float | None): Accuracy target in dB
+            (default AUTO_TARGET)
+    """
+    return _select_method(
+        float(nIn), float(nOut),
+        AUTO_TARGET['maxAliasing'] if maxAliasing is None else maxAliasing,
+        AUTO_TARGET['maxRipple'] if maxRipple is None else maxRipple,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _select_method(nIn, nOut, maxAliasing, maxRipple):
+    ratio = round(nOut / nIn, 9)
+    accuracies = {m: _cached_accuracy(ratio, m) for m in METHODS}
+    accuracies = {m: a for m, a in accuracies.items() if a is not None}
+    candidates = [
+        m for m, a in accuracies.items()
+        if a['aliasing_db'] <= maxAliasing and a['ripple_db'] <= maxRipple
+    ]
+    if not candidates:
+        method = min(accuracies, key=lambda m: accuracies[m]['aliasing_db'])
+        print(f"Warning: No resampling method meets the accuracy target "
+              f"(aliasing <= {maxAliasing}dB, ripple <= {maxRipple}dB) for "
+              f"a ratio of {ratio}. Using '{method}'")
+        return method
+
+    order = list(AUTO_SPEED_ORDER)
+    if resample.block_period(nIn, nOut) is None:
+        order.remove('poly')
+        order.append('poly')
+    method = min(candidates, key=order.index)
+    print(f"-> 'auto' resampling method: using '{method}' for a ratio of "
+          f"{ratio}")
+    return method
@@ -0,0 +1,211 @@
+"""Present several SpikeGLX files as a single recording.
+
+SpikeGLX splits long sessions into several files (one per gate `_gN` and
+trigger `_tN`). An `SGLXRun` places these files on a common timeline, using
+the `firstSample` meta entry (index of the first sample of the file since the
+start of the run) when available, or end to end otherwise. Samples of the
+timeline between two files are read as zeros. Each file is read directly, so
+the raw data is never copied to a concatenated file.
+"""
+import glob
+import re
+from pathlib import Path
+
+import numpy as np
+
+from . import prefetch, readSGLX, sidecar
+
+
+def expand_binPaths(binPath):
+    """Return the list of paths of a bin, a list of bins or a glob pattern.
+
+    Bins matching a pattern are sorted by gate and trigger index (so that
+    `_t10` comes after `_t9`).
+
+    Args:
+        binPath (str | pathlib.Path | list): Path to a bin, list of paths, or
+            glob pattern (eg: "run_g0_t*.imec0.lf.bin")
+    """
+    if isinstance(binPath, (list, tuple)):
+        return [Path(p) for p in binPath]
+    if not glob.has_magic(str(binPath)):
+        return [Path(binPath)]
+    paths = sorted(glob.glob(str(binPath)), key=_natural_key)
+    if not paths:
+        raise FileNotFoundError(f"No file matching binPath: `{binPath}`")
+    return [Path(p) for p in paths]
+
+
+def _natural_key(path):
+    return [int(s) if s.isdigit() else s for s in re.split(r'(\d+)', path)]
+
+
+class SGLXRun:
+    """Several SpikeGLX bins of the same stream on a common timeline.
+
+    Args:
+        binPath (str | pathlib.Path | list): Path to a bin, list of paths, or
+            glob pattern. See `expand_binPaths`
+
+    Attributes:
+        binPaths (list(pathlib.Path)): Path to each file
+        metas (list(dict)): Meta of each file
+        meta (dict): Meta of the first file, describing the channels
+        sRate (float): Sampling rate
+        offsets (np.ndarray): Index on the timeline of the first sample of
+            each file
+        nSamples (np.ndarray): Number of samples in each file
+        nSamp (int): Number of samples of the timeline (until the end of the
+            last file)
+    """
+
+    def __init__(self, binPath):
+        self.binPaths = expand_binPaths(binPath)
+        self.metas = [readSGLX.readMeta(p) for p in self.binPaths]
+        self.meta = self.metas[0]
+        self.sRate = readSGLX.SampRate(self.meta)
+
+        chanMap = readSGLX.getChannelMap(self.meta)
+        for path, meta in zip(self.binPaths, self.metas):
+            if (readSGLX.SampRate(meta) != self.sRate
+                    or readSGLX.getChannelMap(meta) is not chanMap):
+                raise ValueError(
+                    f"Can't concatenate {path} with {self.binPaths[0]}: "
+                    "sampling rates or saved channels differ."
+                )
+        for path, meta in zip(self.binPaths[:-1], self.metas[:-1]):
+            if readSGLX.isRecordingInProgress(meta):
+                raise ValueError(
+                    f"Only the last file of a run can be in progress: {path}"
+                )
+
+        self.nSamples = np.array([
+            self._nSamplesOnDisk(p, meta)
+            for p, meta in zip(self.binPaths, self.metas)
+        ], dtype=int)
+        ends = np.cumsum(self.nSamples)
+        if all('firstSample' in meta for meta in self.metas):
+            firstSamples = np.array(
+                [int(meta['firstSample']) for meta in self.metas], dtype=int
+            )
+            self.offsets = firstSamples - firstSamples[0]
+            ends = self.offsets + self.nSamples
+            if np.any(self.offsets[1:] < ends[:-1]):
+                raise ValueError(
+                    f"Overlapping files in run: {self.binPaths}. Check the "
+                    "order of the files."
+                )
+        else:
+            self.offsets = ends - self.nSamples
+        self.nSamp = int(ends[-1])
+
+        if len(self.binPaths) > 1:
+            gaps = (self.offsets[1:] - ends[:-1]) / self.sRate
+            print(f"Run of N={len(self.binPaths)} files "
+                  f"({self.nSamp / self.sRate:.1f}s), gaps between files: "
+                  f"{[round(float(g), 3) for g in gaps]}s")
+
+    @staticmethod
+    def _nSamplesOnDisk(path, meta):
+        """Number of samples of a file, trimmed to the data on disk."""
+        nSamp = readSGLX.nFileSamples(path, meta)
+        nOnDisk = path.stat().st_size // (2 * int(meta['nSavedChans']))
+        if nOnDisk < nSamp:
+            print(f"Warning: {path} is truncated ({nOnDisk} of the {nSamp} "
+                  f"timepoints of its meta file). Only the timepoints on disk "
+                  f"are read.")
+        return min(nSamp, nOnDisk)
+
+    def __len__(self):
+        return len(self.binPaths)
+
+    def isRecordingInProgress(self):
+        return readSGLX.isRecordingInProgress(self.metas[-1])
+
+    def open_reader(self, chanIdxList):
+        """Return a `RunReader` of the selected channels."""
+        return RunReader(self, chanIdxList)
+
+
+class RunReader:
+    """Read blocks of selected channels on the timeline of an `SGLXRun`.
+
+    Each file is read from its channel-major sidecar if it contains all the
+    selected channels (see `sidecar.extract_SGLX`), or from the bin otherwise.
+    Calling the reader with (t0, t1) returns the (n_channels, t1 - t0) int16
+    data between timepoints t0 and t1 of the timeline.
+
+    Attributes:
+        bytesRead (int): Number of bytes read from all the files so far
+    """
+
+    def __init__(self, run, chanIdxList):
+        self.run = run
+        self.chanIdxList = chanIdxList
+        self.readers = [None] * len(run)
+
+    def _get_reader(self, i):
+        if self.readers[i] is None:
+            path = self.run.binPaths[i]
+            channelMajor = sidecar.open_sidecar(path, self.chanIdxList)
+            if channelMajor is not None:
+                print(f"Read channels from sidecar of {path}")
+                self.readers[i] = _SidecarReader(*channelMajor)
+            else:
+                self.readers[i] = prefetch.InterleavedReader(
+                    path, int(self.run.meta['nSavedChans']), self.chanIdxList
+                )
+        return self.readers[i]
+
+    @property
+    def bytesRead(self):
+        return sum(r.bytesRead for r in self.readers if r is not None)
+
+    def __call__(self, start, stop):
+        data = None
+        for i, (offset, n) in enumerate(
+            zip(self.run.offsets, self.run.nSamples)
+        ):
+            t0, t1 = max(start, offset), min(stop, offset + n)
+            if t0 >= t1:
+                continue
+            fileData = self._get_reader(i)(t0 - offset, t1 - offset)
+            if t0 == start and t1 == stop:
+                return fileData
+            if data is None:
+                data = np.zeros((len(self.chanIdxList), stop - start),
+                                dtype='int16')
+            data[:, t0 - start:t1 - start] = fileData
+        if data is None:
+            data = np.zeros((len(self.chanIdxList), stop - start),
+                            dtype='int16')
+        return data
+
+    def close(self):
+        for reader in self.readers:
+            if reader is not None:
+                reader.close()
+        self.readers = [None] * len(self.run)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _SidecarReader:
+
+    def __init__(self, sidecarData, sidecarRows):
+        self.sidecarData = sidecarData
+        self.sidecarRows = sidecarRows
+        self.bytesRead = 0
+
+    def __call__(self, start, stop):
+        data = np.asarray(self.sidecarData[self.sidecarRows, start:stop])
+        self.bytesRead += data.nbytes
+        return data
+
+    def close(self):
+        # Release the memmap
+        self.sidecarData = None
@@ -0,0 +1,148 @@
+"""Channel-major copies of selected channels of SpikeGLX recordings.
+
+SpikeGLX bins are sample-interleaved, so reading a few channels still reads
+every page of the file. A sidecar stores the selected channels contiguously
+(int16, one row per channel, native sampling rate) next to the bin, so that
+repeated loads of the same channels only read the bytes of these channels.
+
+The sidecar of `<run>.imec0.lf.bin` is `<run>.imec0.lf.chanmajor.bin`, with a
+json header (`<run>.imec0.lf.chanmajor.json`) containing the labels and
+saved indices of the extracted channels, and the meta of the source bin. The
+header is written last, and the sidecar is only used if the source bin
+didn't change since extraction.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from . import prefetch, readSGLX
+
+SIDECAR_SUFFIX = '.chanmajor'
+
+
+def get_sidecar_paths(binPath):
+    """Return paths to the sidecar bin and json header of a bin."""
+    binPath = Path(binPath)
+    stem = binPath.with_suffix('').name + SIDECAR_SUFFIX
+    return (binPath.parent / (stem + '.bin'),
+            binPath.parent / (stem + '.json'))
+
+
+def _source_signature(binPath):
+    stat = os.stat(binPath)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def read_sidecar_header(binPath):
+    """Return header of a valid sidecar of a bin, or None."""
+    sidecarPath, headerPath = get_sidecar_paths(binPath)
+    if not (sidecarPath.exists() and headerPath.exists()):
+        return None
+    with open(headerPath, 'r') as f:
+        header = json.load(f)
+    if header['source'] != _source_signature(binPath):
+        print(f"Ignoring outdated sidecar at {sidecarPath}")
+        return None
+    return header
+
+
+def open_sidecar(binPath, chanIdxList):
+    """Return memmap of a sidecar and rows of the requested channels, or None.
+
+    Args:
+        binPath (str | pathlib.Path): Path to the source bin
+        chanIdxList (list(int)): Saved indices (in the source bin) of the
+            requested channels
+
+    Returns:
+        (np.memmap, list(int)) | None: (n_sidecar_channels, n_samples) int16
+            memmap and rows of requested channels, or None if there is no valid
+            sidecar containing all the requested channels.
+    """
+    header = read_sidecar_header(binPath)
+    if header is None:
+        return None
+    rowIndex = {idx: row for row, idx in enumerate(header['savedIdx'])}
+    if any(idx not in rowIndex for idx in chanIdxList):
+        return None
+    sidecarPath, _ = get_sidecar_paths(binPath)
+    sidecar = np.memmap(
+        sidecarPath, dtype='int16', mode='r',
+        shape=(len(header['savedIdx']), header['nSamp']), order='C',
+    )
+    return sidecar, [rowIndex[idx] for idx in chanIdxList]
+
+
+def extract_SGLX(binPath, chanList=None, chanListType='labels'):
+    """Write the selected channels of a SpikeGLX bin to a channel-major sidecar.
+
+    Channels of an existing valid sidecar are kept, so that extractions can be
+    done incrementally.
+
+    Args:
+        binPath (str | pathlib.Path): Path to bin of recording
+
+    Kwargs:
+        chanList (list | None): List of extracted channels. All channels by
+            default. See `read_SGLX`
+        chanListType (str): 'indices' or 'labels'. See `read_SGLX`
+            (default 'labels')
+
+    Returns:
+        pathlib.Path: Path to the sidecar bin
+    """
+    from . import get_loaded_chans_idx_labels
+
+    binPath = Path(binPath)
+    meta = readSGLX.readMeta(binPath)
+    if readSGLX.isRecordingInProgress(meta):
+        raise ValueError(
+            f"Can't extract channels of a recording in progress: {binPath}"
+        )
+    chanMap = readSGLX.getChannelMap(meta)
+    chanIdxList, _ = get_loaded_chans_idx_labels(chanList, chanListType, chanMap)
+
+    header = read_sidecar_header(binPath)
+    if header is not None:
+        chanIdxList = list(header['savedIdx']) + [
+            idx for idx in chanIdxList if idx not in header['savedIdx']
+        ]
+        if len(chanIdxList) == len(header['savedIdx']):
+            print(f"All channels already extracted in sidecar of {binPath}")
+            return get_sidecar_paths(binPath)[0]
+    chanIdxList = sorted(set(chanIdxList))
+
+    sidecarPath, headerPath = get_sidecar_paths(binPath)
+    if headerPath.exists():
+        headerPath.unlink()
+    nSamp = readSGLX.nFileSamples(binPath, meta)
+    print(f"Extract N={len(chanIdxList)} channels of {binPath} to "
+          f"{sidecarPath} ({len(chanIdxList) * nSamp * 2 / 1e9:.2f}GB)")
+
+    tmpPath = sidecarPath.with_suffix('.tmp')
+    sidecar = np.memmap(tmpPath, dtype='int16', mode='w+',
+                        shape=(len(chanIdxList), nSamp), order='C')
+    with prefetch.InterleavedReader(
+        binPath, int(meta['nSavedChans']), chanIdxList
+    ) as reader:
+        for t0, t1, _, block in prefetch.iter_blocks(
+            reader, 0, nSamp,
+            blockSamples=prefetch.default_block_samples(int(meta['nSavedChans'])),
+        ):
+            sidecar[:, t0:t1] = block
+    sidecar.flush()
+    del sidecar
+    os.replace(tmpPath, sidecarPath)
+
+    header = {
+        'source': _source_signature(binPath),
+        'nSamp': nSamp,
+        'savedIdx': chanIdxList,
+        'labels': list(chanMap.labels[chanIdxList]),
+        'meta': meta,
+    }
+    with open(headerPath, 'w') as f:
+        json.dump(header, f, indent=1)
+    return sidecarPath
@@ -0,0 +1,257 @@
+"""Alignment of streams on a common timebase from a shared sync signal.
+
+The clocks of imec probes, the NIDQ and TDT drift relative to each other (by
+tens of ms per hour). When the same square wave (eg the SpikeGLX sync pulse)
+is recorded by each stream, it can be used to map the clock of each stream
+onto the clock of a reference stream:
+    - Loaders pass each block of the sync channel they read to an
+      `EdgeDetector`, which records the timepoints of rising edges. The sync
+      channel is read together with the loaded channels, without an extra
+      pass over the data.
+    - `fit_clock_map` matches the edges of a stream with the nearest edges of
+      the reference stream, and fits a linear map between the two clocks.
+      The fit is grown from the first edges to the whole recording, so that
+      the accumulated drift doesn't cause mismatches. The offset between
+      streams should be less than half the period of the sync signal.
+    - `align_to_reference` interpolates the downsampled data of a stream at
+      the timepoints of the reference stream's samples.
+"""
+import numpy as np
+import scipy.ndimage
+
+SYNC_LINE_IMEC = 6  # Line of the imec SY channel carrying the sync pulse
+# Matched edges with residuals larger than this many robust standard
+# deviations are ignored when fitting clock maps
+OUTLIER_THRESHOLD = 5.0
+# Number of edges of the first fit of clock maps. The span of the fit is then
+# doubled until all edges are included
+INITIAL_EDGES = 10
+# Maximum RMS of the residuals of clock maps, as a fraction of the period of
+# the sync signal
+MAX_RESIDUAL = 0.1
+
+
+class EdgeDetector:
+    """Record rising edges of a sync channel from consecutive blocks.
+
+    Kwargs:
+        channel (str | None): Label of the sync channel. For SGLX data, the
+            first SY (imec) or digital (NIDQ) channel by default. Mandatory
+            for TDT data (eg "Sync-1").
+        line (int | None): Bit of a digital channel carrying the sync signal.
+            `SYNC_LINE_IMEC` for the imec SY channel, 0 for the NIDQ digital
+            word by default. Ignored if `threshold` is specified.
+        threshold (float | None): Threshold of an analog sync channel, in V
+            for SGLX data or in the unit of the TDT store.
+    """
+
+    def __init__(self, channel=None, line=None, threshold=None):
+        self.channel = channel
+        self.line = line
+        self.threshold = threshold
+        self.sRate = None
+        self.firstSamp = None
+        self.nSamp = None
+        self._edges = []
+        self._pos = None
+        self._last = None
+
+    def begin(self, sRate, firstSamp, nSamp):
+        """Start recording the edges of a loaded window of a stream.
+
+        Args:
+            sRate (float): Sampling rate of the loaded data
+            firstSamp (int): Index of the first loaded sample of the stream
+            nSamp (int): Number of loaded samples
+        """
+        self.sRate = sRate
+        self.firstSamp = firstSamp
+        self.nSamp = nSamp
+        self._edges = []
+        self._pos = None
+        self._last = None
+
+    def update(self, values, start, sRate=None):
+        """Record rising edges of 1D block of the sync channel.
+
+        Args:
+            values (np.ndarray): Raw values of a digital channel, or analog
+                values
+            start (int): Index in the stream of the first sample of `values`
+
+        Kwargs:
+            sRate (float | None): Sampling rate of the sync channel, if
+                different from the loaded data (default None)
+        """
+        if sRate is None:
+            sRate = self.sRate
+        if not len(values):
+            return
+        if self.threshold is not None:
+            high = values > self.threshold
+        else:
+            high = ((values.astype('int64') >> self.line) & 1).astype(bool)
+        if self._pos == start:
+            # Edge between the previous block and this one
+            previous = np.concatenate([[self._last], high[:-1]])
+        else:
+            previous = np.concatenate([high[:1], high[:-1]])
+        self._edges.append(
+            (np.flatnonzero(high & ~previous) + start) / sRate
+        )
+        self._pos = start + len(values)
+        self._last = high[-1]
+
+    def edge_times(self):
+        """Times in seconds of rising edges, from the start of the stream."""
+        if not self._edges:
+            return np.zeros((0,))
+        return np.concatenate(self._edges)
+
+    def output_times(self, nOut):
+        """Times in seconds of the samples of the loaded window resampled to
+        `nOut` samples, from the start of the stream."""
+        return (
+            self.firstSamp + np.arange(nOut) * self.nSamp / nOut
+        ) / self.sRate
+
+
+class ClockMap:
+    """Linear map from the clock of a stream to the reference clock.
+
+    tRef = slope * t + offset
+
+    Attributes:
+        slope, offset (float)
+        nEdges (int): Number of matched edges used for the fit
+        residual (float): RMS of the residuals of the fit in seconds
+    """
+
+    def __init__(self, slope, offset, nEdges=0, residual=0.0):
+        self.slope = slope
+        self.offset = offset
+        self.nEdges = nEdges
+        self.residual = residual
+
+    def __call__(self, t):
+        return self.slope * np.asarray(t) + self.offset
+
+    def inverse(self, tRef):
+        return (np.asarray(tRef) - self.offset) / self.slope
+
+    def __repr__(self):
+        drift = (self.slope - 1) * 1e6  # (ppm)
+        return (
+            f"ClockMap(drift={drift:.2f}ppm ({drift * 3.6:.2f}ms/hour), "
+            f"offset={self.offset * 1e3:.3f}ms, N={self.nEdges} edges, "
+            f"residual={self.residual * 1e3:.3f}ms)"
+        )
+
+
+def _match_nearest(times, refTimes):
+    """Return index of the nearest reference time of each time."""
+    idx = np.clip(np.searchsorted(refTimes, times), 1, len(refTimes) - 1)
+    before = refTimes[idx - 1]
+    after = refTimes[idx]
+    return np.where(times - before <= after - times, idx - 1, idx)
+
+
+def _fit_matched(times, refTimes, clockMap, halfPeriod):
+    """Fit a clock map to the edges matched after mapping with `clockMap`."""
+    mapped = clockMap(times)
+    nearest = _match_nearest(mapped, refTimes)
+    matched = np.abs(refTimes[nearest] - mapped) < halfPeriod
+    if matched.sum() < 2:
+        raise ValueError(
+            "Sync edges of the stream and the reference couldn't be "
+            "matched. The offset between streams should be less than half"
+            " the period of the sync signal."
+        )
+    t, tRef = times[matched], refTimes[nearest[matched]]
+    slope, offset = np.polyfit(t, tRef, 1)
+    residuals = tRef - (slope * t + offset)
+    mad = 1.4826 * np.median(np.abs(residuals - np.median(residuals)))
+    if mad > 0:
+        keep = np.abs(residuals) <= OUTLIER_THRESHOLD * mad
+        if keep.sum() >= 2:
+            t, tRef = t[keep], tRef[keep]
+            slope, offset = np.polyfit(t, tRef, 1)
+    residuals = tRef - (slope * t + offset)
+    return ClockMap(
+        slope, offset, nEdges=len(t),
+        residual=float(np.sqrt(np.mean(residuals**2))),
+    )
+
+
+def fit_clock_map(times, refTimes):
+    """Fit the linear map from the times of edges to reference times.
+
+    Each edge is matched to the nearest reference edge (after mapping with
+    the current fit), and pairs further apart than half the period of the
+    reference sync signal are ignored. The map is first fit on the first
+    `INITIAL_EDGES` edges, then refit on a span of edges doubled at each
+    step: the drift accumulated over hours (eg 0.86s over 24h at 10ppm)
+    would otherwise match edges with the wrong pulse.
+
+    Args:
+        times (np.ndarray): Times of edges of a stream
+        refTimes (np.ndarray): Times of edges of the reference stream
+
+    Returns:
+        ClockMap
+
+    Raises:
+        ValueError: If edges can't be matched, or if the RMS of the residuals
+            exceeds `MAX_RESIDUAL` periods of the sync signal
+    """
+    if len(times) < 2 or len(refTimes) < 2:
+        raise ValueError(
+            f"At least 2 sync edges are required in each stream to align them."
+            f" Found N={len(times)} and N={len(refTimes)} (reference) edges."
+            f" Check the `sync` entries of the datasets."
+        )
+    period = np.median(np.diff(refTimes))
+    clockMap = ClockMap(1.0, 0.0)
+    span = max(times[min(INITIAL_EDGES, len(times)) - 1] - times[0], period)
+    while True:
+        inSpan = times <= times[0] + span
+        clockMap = _fit_matched(times[inSpan], refTimes, clockMap, period / 2)
+        if inSpan.all():
+            break
+        span *= 2
+    if clockMap.residual > MAX_RESIDUAL * period:
+        raise ValueError(
+            f"Sync edges of the stream don't match the reference: RMS of the"
+            f" residuals of {clockMap.residual * 1e3:.1f}ms for a sync period"
+            f" of {period * 1e3:.1f}ms. Check the `sync` entries of the"
+            f" datasets."
+        )
+    return clockMap
+
+
+def align_to_reference(data, detector, refDetector, nOut):
+    """Interpolate the data of a stream at the reference stream's timepoints.
+
+    Args:
+        data (np.ndarray): (n_channels, n_samples) data loaded from the
+            window of the stream passed to `detector.begin`
+        detector (EdgeDetector): Edges of the stream
+        refDetector (EdgeDetector): Edges of the reference stream
+        nOut (int): Number of samples of the data of the reference stream
+
+    Returns:
+        (aligned, clockMap): (n_channels, nOut) array, and the clock map of
+            the stream
+    """
+    clockMap = fit_clock_map(detector.edge_times(), refDetector.edge_times())
+    # Timepoints of the reference samples, in the clock of the stream, and
+    # corresponding (fractional) sample indices in `data`
+    times = clockMap.inverse(refDetector.output_times(nOut))
+    coords = (times * detector.sRate - detector.firstSamp) \
+        * data.shape[1] / detector.nSamp
+    aligned = np.empty((data.shape[0], nOut), dtype=data.dtype)
+    for i in range(data.shape[0]):
+        aligned[i, :] = scipy.ndimage.map_coordinates(
+            data[i, :], coords[np.newaxis, :], order=3, mode='nearest',
+        )
+    return aligned, clockMap
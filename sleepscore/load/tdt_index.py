@@ -0,0 +1,151 @@
+"""Persistent cache of the header index of TDT blocks.
+
+`tdt.read_block` parses the whole tsq file (one entry per event of every store)
+each time it is called. The parsed headers of a block are saved once to a cache
+directory, and passed back to `tdt.read_block` for all subsequent reads. A
+small json summary of the block (stores, sampling rates, number of channels,
+duration) is saved alongside, so that metadata queries don't need to load the
+headers at all.
+
+Cache entries are keyed by the absolute path of the block, and are rebuilt if
+the size or modification time of any of the block's files changed. The cache
+directory is `~/.cache/sleepscore/tdt_index` by default, and can be set with
+the SLEEPSCORE_CACHE_DIR environment variable.
+"""
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+import tdt
+
+_headersCache = {}  # {<block path>: (<signature>, <headers>)}
+
+
+def get_cache_dir():
+    cacheDir = os.environ.get('SLEEPSCORE_CACHE_DIR')
+    if cacheDir is None:
+        return Path.home() / '.cache' / 'sleepscore' / 'tdt_index'
+    return Path(cacheDir) / 'tdt_index'
+
+
+def _cache_paths(blockPath):
+    key = hashlib.sha1(str(blockPath).encode()).hexdigest()[:16]
+    stem = f"{Path(blockPath).name}_{key}"
+    cacheDir = get_cache_dir()
+    return cacheDir / (stem + '.json'), cacheDir / (stem + '.pkl')
+
+
+def _block_signature(blockPath):
+    """Return [name, size, mtime] of each file of a block."""
+    return sorted(
+        [entry.name, entry.stat().st_size, entry.stat().st_mtime]
+        for entry in os.scandir(blockPath) if entry.is_file()
+    )
+
+
+def _summarize(headers):
+    stores = {}
+    for varName, store in headers.stores.items():
+        if store.type_str != 'streams':
+            continue
+        chan = np.asarray(getattr(store, 'chan', [1]))
+        stores[varName] = {
+            'name': store.name,
+            'fs': float(store.fs),
+            'nChan': int(np.max(chan)) if chan.size else 0,
+        }
+    startTime = float(np.ravel(headers.start_time)[0])
+    stopTime = float(np.ravel(headers.stop_time)[0])
+    if np.isnan(stopTime):
+        # Block didn't end cleanly: use time of last stream event
+        stopTime = startTime + max(
+            [float(np.ravel(s.ts)[-1]) for _, s in headers.stores.items()
+             if s.type_str == 'streams' and len(np.ravel(s.ts))],
+            default=0.0,
+        )
+    return {'stores': stores, 'duration': stopTime - startTime}
+
+
+def _write_cache(blockPath, signature, headers, summary):
+    jsonPath, pklPath = _cache_paths(blockPath)
+    try:
+        jsonPath.parent.mkdir(parents=True, exist_ok=True)
+        tmpPath = pklPath.with_suffix('.tmp')
+        with open(tmpPath, 'wb') as f:
+            pickle.dump(headers, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, pklPath)
+        with open(jsonPath, 'w') as f:
+            json.dump({'block': str(blockPath), 'signature': signature,
+                       **summary}, f, indent=1)
+    except OSError as e:
+        print(f"Could not save TDT header index to {jsonPath}: {e}")
+
+
+def _read_cached_summary(blockPath, signature):
+    jsonPath, _ = _cache_paths(blockPath)
+    if not jsonPath.exists():
+        return None
+    with open(jsonPath, 'r') as f:
+        cached = json.load(f)
+    if cached['signature'] != signature:
+        return None
+    return cached
+
+
+def read_headers(blockPath):
+    """Return the headers of a block, as returned by `tdt.read_block`.
+
+    Headers are read from the cache if it is up to date, and parsed and saved
+    to the cache otherwise.
+    """
+    blockPath = os.path.abspath(blockPath)
+    signature = _block_signature(blockPath)
+    if blockPath in _headersCache and _headersCache[blockPath][0] == signature:
+        return _headersCache[blockPath][1]
+
+    headers = None
+    if _read_cached_summary(blockPath, signature) is not None:
+        _, pklPath = _cache_paths(blockPath)
+        try:
+            with open(pklPath, 'rb') as f:
+                headers = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            headers = None
+    if headers is None:
+        print(f"Index headers of TDT block at {blockPath}")
+        headers = tdt.read_block(blockPath, headers=1)
+        _write_cache(blockPath, signature, headers, _summarize(headers))
+    _headersCache[blockPath] = (signature, headers)
+    return headers
+
+
+def get_block_index(blockPath):
+    """Return a summary of the stream stores of a block.
+
+    Returns:
+        dict: {'stores': {<store>: {'name', 'fs', 'nChan'}}, 'duration': <s>}
+    """
+    blockPath = os.path.abspath(blockPath)
+    cached = _read_cached_summary(blockPath, _block_signature(blockPath))
+    if cached is not None:
+        return {'stores': cached['stores'], 'duration': cached['duration']}
+    return _summarize(read_headers(blockPath))
+
+
+def get_store_headers(blockPath, store):
+    """Return headers of a block restricted to a single store.
+
+    `tdt.read_block` doesn't filter stores when it is passed headers, so that
+    loading a store from the full headers would load all the stores.
+    """
+    headers = read_headers(blockPath)
+    storeHeaders = tdt.StructType(headers.items())
+    storeHeaders.stores = tdt.StructType(
+        [(store, headers.stores[store])] if store in headers.stores.keys()
+        else []
+    )
+    return storeHeaders
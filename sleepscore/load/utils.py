@@ -1,5 +1,9 @@
 """Utility functions for data loading and transformation."""
 
+import os
+import tempfile
+from pathlib import Path
+
 import yaml
 import numpy as np
 
@@ -34,3 +38,67 @@ def load_yaml(path):
 def save_yaml(path, data):
     with open(path, 'w') as f:
         yaml.dump(data, f, default_flow_style=False)
+
+
+def save_table(path, df):
+    """Save a pandas DataFrame in a format inferred from the path extension.
+
+    '.parquet' and '.feather' are compact columnar formats (require `pyarrow`),
+    '.csv' and '.tsv' are plain text.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == '.parquet':
+        df.to_parquet(path, index=False)
+    elif suffix == '.feather':
+        df.reset_index(drop=True).to_feather(path)
+    elif suffix == '.csv':
+        df.to_csv(path, index=False)
+    elif suffix == '.tsv':
+        df.to_csv(path, index=False, sep='\t')
+    else:
+        raise ValueError(
+            f"Unrecognized table extension: `{suffix}`. Supported extensions: "
+            f"'.parquet', '.feather', '.csv', '.tsv'"
+        )
+
+
+def load_table(path):
+    """Load a table saved with `save_table`."""
+    import pandas as pd
+
+    suffix = Path(path).suffix.lower()
+    if suffix == '.parquet':
+        return pd.read_parquet(path)
+    elif suffix == '.feather':
+        return pd.read_feather(path)
+    elif suffix == '.csv':
+        return pd.read_csv(path)
+    elif suffix == '.tsv':
+        return pd.read_csv(path, sep='\t')
+    raise ValueError(f"Unrecognized table extension: `{suffix}`")
+
+
+def create_memmap(directory, shape, dtype='float32'):
+    """Return a zero-filled memmap backed by a new file in `directory`.
+
+    The file is named `sleepscore_<random>.dat`. Remove it with
+    `remove_memmap` once the data is not needed anymore.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    fd, path = tempfile.mkstemp(
+        suffix='.dat', prefix='sleepscore_', dir=directory
+    )
+    os.close(fd)
+    return np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+
+
+def remove_memmap(data):
+    """Remove the file backing a memmap created by `create_memmap`.
+
+    The mapping stays valid until `data` is deleted (except on Windows, where
+    the file can't be removed while it is mapped).
+    """
+    try:
+        os.remove(data.filename)
+    except OSError as e:
+        print(f"Could not remove memory-mapped file {data.filename}: {e}")
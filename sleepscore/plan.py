@@ -0,0 +1,260 @@
+"""Estimate the data read and memory used by `load_and_score` from metadata."""
+import os
+
+import numpy as np
+
+from . import load
+from .load import filtering, prefetch
+from .load.progressive import CHUNK_DURATION
+
+GB = 1e9
+# Size of the intermediate arrays of each resampling method, relative to the
+# size of the float64 block being resampled (approximate)
+RESAMPLE_OVERHEAD = {
+    'interpolation': 1.0,  # Spline coefficients
+    'fft': 3.0,  # Complex spectrum and inverse transform
+    'poly': 2.0,  # Padded input and filtered output
+    'auto': 3.0,  # Any of the above
+}
+
+
+def plan_load(datasets, tStart=None, tEnd=None, downSample=100.0,
+              ds_method="interpolation", EMGdatapath=None, progressive=False,
+              memmap=False):
+    """Resolve channels and time windows, and estimate memory per stage.
+
+    Only metadata is read. See `sleepscore.load_and_score` for a description of
+    the parameters. `datasets` should be validated.
+
+    Kwargs:
+        memmap (bool): Whether the output is a memory-mapped file filled by
+            chunks (see `memmapDir` in `sleepscore.load_and_score`). The
+            output is then not counted in the memory in use, since the OS
+            can write it back to disk. (default False)
+
+    Returns:
+        dict: Plan with keys:
+            'datasets' (list(dict)): Per dataset: 'binPath', 'datatype',
+                'sRate', 'duration', 'channels' (displayed labels),
+                'bytesRead', 'blockBytes' (working memory of the loader) and
+                'readPath' (path read, eg the LF file of AP data)
+            'sf' (float): Sampling frequency of the output
+            'tStart', 'tEnd' (float): Loaded time window
+            'nChans', 'nSamples' (int): Shape of the output
+            'dtype' (str): dtype of the output
+            'stages' (list(tuple)): (stage, bytes) memory in use at the end of
+                each stage
+            'peak' (int): Maximum memory in use across stages
+            'progressive' (bool): Whether the progressive (chunked) path is
+                used
+            'memmap' (bool): Whether the output is a memory-mapped file
+            'diskBytes' (int): Size of the memory-mapped output file (0 if
+                the output is in memory)
+            'windowed' (bool): Whether the formats of all datasets support
+                efficient windowed reads, required for progressive loading
+    """
+    from . import get_dataset_labels
+
+    if tStart is None:
+        tStart = 0.0
+    ds_plans = []
+    for dataset_dict in datasets:
+        sRate, duration, chanOrigLabels = load.probe_switch(
+            dataset_dict["binPath"],
+            datatype=dataset_dict["datatype"],
+            chanList=dataset_dict["chanList"],
+            derivations=dataset_dict["derivations"],
+        )
+        ds_plans.append({
+            'binPath': dataset_dict["binPath"],
+            'datatype': dataset_dict["datatype"],
+            'sRate': sRate,
+            'duration': duration,
+            'channels': get_dataset_labels(chanOrigLabels, dataset_dict),
+        })
+
+    sRates = set(p['sRate'] for p in ds_plans)
+    if downSample is None and len(sRates) > 1:
+        raise ValueError(
+            f"Datasets have different sampling rates ({sRates}): please "
+            f"specify a `downSample` value."
+        )
+    sf = sRates.pop() if downSample is None else downSample
+    minDuration = min(p['duration'] for p in ds_plans)
+    if tEnd is None:
+        tEnd = minDuration
+    if not tStart < tEnd:
+        raise ValueError(f"Invalid time window: tStart={tStart}s, tEnd={tEnd}s")
+    if tEnd > minDuration:
+        print(f"Warning: tEnd={tEnd}s is after the end of the shortest "
+              f"dataset ({minDuration}s)")
+
+    nSamp = int((tEnd - tStart) * sf)
+    nChans = sum(len(p['channels']) for p in ds_plans)
+    emgBytes = 8 * nSamp if EMGdatapath else 0
+    for dataset_dict, p in zip(datasets, ds_plans):
+        nIn = int((tEnd - tStart) * p['sRate'])
+        p['bytesRead'], p['blockBytes'], p['readPath'] = _estimate_reads(
+            dataset_dict, len(p['channels']), nIn, p['sRate'], ds_method,
+            downSample,
+        )
+
+    diskBytes = 0
+    if progressive or memmap:
+        dtype = 'float32'
+        outBytes = 4 * (nChans + (1 if EMGdatapath else 0)) * nSamp
+        if memmap:
+            diskBytes, outBytes = outBytes, 0
+        # Workers load chunks of each dataset in parallel
+        nWorkers = min(
+            min(32, (os.cpu_count() or 1) + 4),
+            len(ds_plans) * max(1, int(
+                (tEnd - tStart) / CHUNK_DURATION + 1
+            )),
+        )
+        chunkBytes = max(
+            8 * len(p['channels']) * min(CHUNK_DURATION, tEnd - tStart) * sf
+            + p['blockBytes']
+            for p in ds_plans
+        )
+        stages = [
+            ('allocate output' + (' (memory-mapped)' if memmap else ''),
+             outBytes),
+            ('load EMG', outBytes + emgBytes),
+            (f'load chunks ({nWorkers} workers)',
+             outBytes + int(nWorkers * chunkBytes)),
+        ]
+    else:
+        dtype = 'float64'
+        outBytes = 8 * nChans * nSamp
+        stages = []
+        loaded = 0
+        for i, p in enumerate(ds_plans):
+            dsBytes = 8 * len(p['channels']) * nSamp
+            stages.append((f'load dataset #{i+1}',
+                           loaded + dsBytes + p['blockBytes']))
+            loaded += dsBytes
+        stages.append(('concatenate datasets', 2 * outBytes))
+        if EMGdatapath:
+            # The EMG is appended to a copy of the concatenated data
+            stages.append(('load EMG', outBytes + emgBytes))
+            stages.append(('append EMG', 2 * (outBytes + emgBytes)))
+            outBytes += emgBytes
+        # Sleep works on a float32 copy of the data
+        stages.append(('Sleep (float32 copy)', outBytes + outBytes // 2))
+
+    return {
+        'datasets': ds_plans,
+        'sf': sf,
+        'tStart': tStart,
+        'tEnd': tEnd,
+        'nChans': nChans + (1 if EMGdatapath else 0),
+        'nSamples': nSamp,
+        'dtype': dtype,
+        'stages': stages,
+        'peak': max(b for _, b in stages),
+        'progressive': progressive,
+        'memmap': memmap,
+        'diskBytes': diskBytes,
+        'windowed': all(
+            load.get_capabilities(p['datatype'])['windowed'] for p in ds_plans
+        ),
+    }
+
+
+def _estimate_reads(dataset_dict, nChans, nIn, sRate, ds_method, downSample):
+    """Return bytes read from disk, working memory and path read by a loader.
+
+    The estimate depends on the capabilities of the format of the dataset
+    (see `load.recording.CAPABILITIES`): formats read by blocks ('chunked')
+    hold a few blocks of raw data at once, other formats are assumed to load
+    and resample one whole channel at a time. Imec AP data read from its LF
+    file ('lfBand') is read at the rate of the LF file.
+    """
+    capabilities = load.get_capabilities(dataset_dict["datatype"])
+    rec = load.open_recording(
+        dataset_dict["binPath"], datatype=dataset_dict["datatype"]
+    )
+    chanList = dataset_dict["chanList"]
+    derivations = dataset_dict["derivations"]
+    if capabilities['lfBand'] and dataset_dict["useLF"]:
+        syncDetector = None
+        if dataset_dict["sync"] is not None:
+            syncDetector = load.sync.EdgeDetector(**dataset_dict["sync"])
+        substitute = rec.lf_substitute(
+            downSample=downSample, chanList=chanList, derivations=derivations,
+            filters=dataset_dict["filters"], syncDetector=syncDetector,
+        )
+        if substitute is not None:
+            lfRec, lfKwargs, _ = substitute
+            nIn = int(nIn * lfRec.sRate / sRate)
+            sRate = lfRec.sRate
+            rec = lfRec
+            chanList = lfKwargs['chanList']
+            derivations = lfKwargs['derivations']
+
+    overhead = RESAMPLE_OVERHEAD.get(ds_method.lower(), 1.0)
+    resampled = downSample is not None and downSample != sRate
+    filters = dataset_dict["filters"]
+    context = int(load.RESAMPLE_CONTEXT_SECS * sRate) if resampled else 0
+    if filters and dataset_dict["zeroPhase"]:
+        context = max(context, filtering.settling_samples(filters, sRate))
+    # Filtered copies of the converted data (forward and backward passes)
+    filterOverhead = (2 if dataset_dict["zeroPhase"] else 1) if filters else 0
+
+    itemsize = np.dtype(capabilities['nativeDtype'] or 'float64').itemsize
+    nRead, nSources = rec.estimate_reads(
+        chanList=chanList, derivations=derivations,
+    )
+    bytesRead = itemsize * nRead * nIn
+    if capabilities['chunked']:
+        nBlock = min(
+            prefetch.default_block_samples(len(rec.labels)), nIn
+        ) + 2 * context
+        # Raw blocks in the queue, and conversion, filtering and resampling of
+        # a block
+        blockBytes = (
+            (prefetch.QUEUE_DEPTH + 2) * itemsize * (nRead + nSources) * nBlock
+            + 8 * nChans * nBlock * (
+                1 + filterOverhead + (overhead if resampled else 0)
+            )
+        )
+    else:
+        # Channels loaded and resampled one at a time
+        blockBytes = itemsize * nIn + 8 * nIn * (
+            1 + filterOverhead + (overhead if resampled else 0)
+        )
+        # Derived channels are accumulated at the native rate
+        blockBytes += 8 * len(derivations or {}) * nIn
+    return bytesRead, int(blockBytes), rec.binPath
+
+
+def print_plan(plan, memoryBudget=None):
+    """Print a loading plan returned by `plan_load`.
+
+    Kwargs:
+        memoryBudget (float | None): Memory budget in GB, printed with the
+            peak memory estimate (default None)
+    """
+    print(f"\nLoading plan: {plan['nChans']} channels x {plan['nSamples']} "
+          f"samples at {plan['sf']}Hz ({plan['dtype']}), from "
+          f"tStart={plan['tStart']}s to tEnd={plan['tEnd']}s")
+    for i, p in enumerate(plan['datasets']):
+        print(f"- Dataset #{i+1} ({p['datatype']}) at {p['binPath']}: "
+              f"{p['sRate']}Hz, {p['duration']:.1f}s, "
+              f"{len(p['channels'])} channels, read "
+              f"{p['bytesRead'] / GB:.2f}GB")
+        if p['readPath'] != p['binPath']:
+            print(f"    Read from LF file: {p['readPath']}")
+        print(f"    Channels: {p['channels']}")
+    mode = ''
+    if plan['memmap']:
+        mode = (f" (output memory-mapped on disk: "
+                f"{plan['diskBytes'] / GB:.2f}GB)")
+    elif plan['progressive']:
+        mode = ' (progressive loading)'
+    print(f"Estimated memory in use after each stage{mode}:")
+    for stage, nBytes in plan['stages']:
+        print(f"- {stage}: {nBytes / GB:.2f}GB")
+    budget = '' if memoryBudget is None else f" (budget: {memoryBudget}GB)"
+    print(f"Estimated peak memory: {plan['peak'] / GB:.2f}GB{budget}")
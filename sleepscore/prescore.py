@@ -0,0 +1,185 @@
+"""Rule-based draft hypnogram from per-epoch features."""
+import numpy as np
+
+from . import hypno
+
+# Displayed name of each scored state. Names should match the states defined
+# in Sleep (see the `states_config_file` kwarg of Sleep)
+STATE_NAMES = {
+    'wake': 'Wake',
+    'nrem': 'NREM',
+    'rem': 'REM',
+    # Epochs left for the scorer. Distinct from artifacts ('Art'), so that
+    # ambiguous epochs that are not rescored are not mistaken for artifacts
+    'ambiguous': 'Unsure',
+}
+
+
+def prescore(features, eegChannels=None, emgChannel='derivedEMG',
+             emgThreshold=None, thetaDeltaThreshold=None, margin=0.1,
+             minBoutDuration=8.0, stateNames=None):
+    """Classify epochs from band powers and EMG with two thresholds.
+
+    Features are compared in log10 scale:
+        - Epochs with EMG RMS above `emgThreshold` + `margin` are Wake, epochs
+            with EMG RMS below `emgThreshold` - `margin` are sleep.
+        - Among sleep epochs, those with theta/delta ratio above
+            `thetaDeltaThreshold` + `margin` are REM, those below
+            `thetaDeltaThreshold` - `margin` are NREM.
+        - Other epochs are ambiguous.
+    By default, thresholds are set from the bimodal distribution of each
+    feature over the recording (Otsu's method), so they don't depend on the
+    units or gain of the channels. Delta and theta power are averaged (in log
+    scale) across EEG channels. The draft is then smoothed: bouts shorter than
+    `minBoutDuration` are merged into the preceding bout, and REM bouts
+    directly following Wake (which do not occur in healthy animals) are marked
+    as ambiguous.
+
+    Args:
+        features (pd.DataFrame): Per-epoch features, as returned by
+            `features.compute_features`. Should contain 'delta' and 'theta'
+            powers and the EMG RMS.
+
+    Kwargs:
+        eegChannels (list(str) | None): Channels used for delta and theta power.
+            All channels other than `emgChannel` by default.
+        emgChannel (str): Label of the EMG channel (default 'derivedEMG')
+        emgThreshold (float | None): log10 of the EMG RMS threshold. Automatic
+            if None (default None)
+        thetaDeltaThreshold (float | None): log10 of the theta/delta power
+            ratio threshold. Automatic if None (default None)
+        margin (float): Epochs within this distance (in log10 units) of a
+            threshold are ambiguous (default 0.1)
+        minBoutDuration (float): Minimum duration of bouts in seconds
+            (default 8.0)
+        stateNames (dict | None): Names of 'wake', 'nrem', 'rem' and
+            'ambiguous' states (default STATE_NAMES)
+
+    Returns:
+        codes (np.ndarray): (n_epochs, ) int8 array of state codes
+        timebase (np.ndarray): (n_epochs, ) array of epoch start times
+        states (list(str)): List of state names, indexed by code
+    """
+    if stateNames is None:
+        stateNames = STATE_NAMES
+    WAKE, NREM, REM, AMBIGUOUS = 0, 1, 2, 3
+    states = [stateNames[k] for k in ['wake', 'nrem', 'rem', 'ambiguous']]
+
+    channels = list(features['channel'].unique())
+    if emgChannel not in channels:
+        raise ValueError(
+            f"EMG channel `{emgChannel}` not found in features. Pre-scoring "
+            f"requires an EMG (eg: specify the `EMGdatapath` parameter). "
+            f"Channels: {channels}"
+        )
+    if eegChannels is None:
+        eegChannels = [c for c in channels if c != emgChannel]
+    missing = set(eegChannels) - set(channels)
+    if missing or not eegChannels:
+        raise ValueError(
+            f"Invalid `eegChannels` for pre-scoring: {eegChannels}. "
+            f"Channels: {channels}"
+        )
+
+    # (n_channels, n_epochs) arrays
+    def feature_array(feature, chans):
+        return np.stack([
+            features.loc[features['channel'] == c, feature].values
+            for c in chans
+        ])
+
+    timebase = features.loc[features['channel'] == emgChannel, 'start_time'].values
+    emg = np.log10(feature_array('rms', [emgChannel])[0])
+    delta = np.mean(np.log10(feature_array('delta', eegChannels)), axis=0)
+    theta = np.mean(np.log10(feature_array('theta', eegChannels)), axis=0)
+    thetaDelta = theta - delta
+
+    codes = np.full(len(timebase), AMBIGUOUS, dtype='int8')
+    if not len(codes):
+        return codes, timebase, states
+    if emgThreshold is None:
+        emgThreshold = otsu_threshold(emg)
+    codes[emg > emgThreshold + margin] = WAKE
+    asleep = emg < emgThreshold - margin
+    if asleep.any():
+        if thetaDeltaThreshold is None:
+            thetaDeltaThreshold = otsu_threshold(thetaDelta[asleep])
+        codes[asleep & (thetaDelta > thetaDeltaThreshold + margin)] = REM
+        codes[asleep & (thetaDelta < thetaDeltaThreshold - margin)] = NREM
+    print(f"Pre-scoring thresholds (log10): EMG={emgThreshold}, "
+          f"theta/delta={thetaDeltaThreshold}")
+
+    # Smoothing
+    epochDuration = timebase[1] - timebase[0] if len(timebase) > 1 else 1.0
+    codes = merge_short_bouts(
+        codes, int(np.ceil(minBoutDuration / epochDuration))
+    )
+    starts, lengths, values = hypno.run_lengths(codes)
+    wakeToRem = np.flatnonzero((values[1:] == REM) & (values[:-1] == WAKE)) + 1
+    for i in wakeToRem:
+        codes[starts[i]:starts[i] + lengths[i]] = AMBIGUOUS
+
+    print("Pre-scoring: " + ", ".join(
+        f"{state}={np.mean(codes == i) * 100:.0f}%"
+        for i, state in enumerate(states)
+    ))
+    return codes, timebase, states
+
+
+def otsu_threshold(x, nBins=256):
+    """Return the threshold maximizing the between-class variance of `x`."""
+    x = x[np.isfinite(x)]
+    if not len(x):
+        return np.nan
+    counts, edges = np.histogram(x, bins=nBins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    w0 = np.cumsum(counts)
+    w1 = w0[-1] - w0
+    m0 = np.cumsum(counts * centers)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mu0 = m0 / w0
+        mu1 = (m0[-1] - m0) / w1
+        betweenVar = w0 * w1 * (mu0 - mu1) ** 2
+    # Middle of the plateau if the classes are separated by empty bins
+    best = np.flatnonzero(betweenVar >= np.nanmax(betweenVar) * (1 - 1e-9))
+    return edges[best[len(best) // 2] + 1]
+
+
+def merge_short_bouts(codes, minLength):
+    """Merge runs shorter than `minLength` epochs into the preceding run."""
+    codes = codes.copy()
+    for _ in range(100):
+        starts, lengths, values = hypno.run_lengths(codes)
+        short = lengths < minLength
+        short[0] = False  # No preceding run
+        if not short.any():
+            break
+        # Only merge runs that don't follow a short run, to avoid chains
+        short[1:] &= ~short[:-1]
+        values[short] = values[np.flatnonzero(short) - 1]
+        codes = np.repeat(values, lengths)
+    return codes
+
+
+def save_draft_hypnogram(path, features, duration=None, **kwargs):
+    """Pre-score and save a draft hypnogram in Sleep's format.
+
+    Args:
+        path (str | pathlib.Path): Path to the .txt hypnogram
+        features (pd.DataFrame): Per-epoch features. See `prescore`
+
+    Kwargs:
+        duration (float | None): Duration of the data. The last bout is extended
+            to this time if specified. (default None)
+        **kwargs: Passed to `prescore`
+    """
+    codes, timebase, states = prescore(features, **kwargs)
+    starts, lengths, values = hypno.run_lengths(codes)
+    epochDuration = timebase[1] - timebase[0] if len(timebase) > 1 else 1.0
+    endTimes = (starts + lengths) * epochDuration
+    if duration is not None and len(endTimes):
+        endTimes[-1] = duration
+    hypno.write_hypnogram(
+        path, [states[v] for v in values], list(endTimes), datafile='prescore'
+    )
+    print(f"Saved draft hypnogram at {path}")
@@ -0,0 +1,260 @@
+"""Quick scan of all the channels of a recording to choose `chanList`.
+
+Short windows evenly spaced across the whole recording are read at the
+original sampling rate, so that only a small fraction of the file is read.
+For each channel and window, the clipped samples, flatlines and RMS of the
+raw data (see `load.artifacts`) and the power in frequency bands (see
+`features`) are computed. Channels are then summarized across windows and
+ranked within each region:
+    - Channels with clipped samples or flatlines in more than
+      `maxArtifactWindows` of the windows, or with a RMS far from the other
+      channels of their region (robust z-score of the log RMS above
+      `rmsThreshold`), are flagged and ranked last.
+    - Other channels are ranked by their median power in `rankBands` (delta
+      and theta by default), so that channels with the strongest sleep
+      oscillations come first.
+"""
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+
+from . import features
+from .load import artifacts, recording, utils
+
+FRACTION = 0.01  # Fraction of the recording read
+WINDOW_DURATION = 2.0  # (s)
+RANK_BANDS = ['delta', 'theta']
+MAX_ARTIFACT_WINDOWS = 0.1  # Fraction of windows with clipping or flatlines
+RMS_THRESHOLD = 5.0  # Robust z-score of the log RMS within each region
+# SpikeGLX channel types that are not scanned (digital words)
+DIGITAL_BANDS = ['SY', 'DW']
+
+
+def scan_windows(duration, fraction=FRACTION, windowDuration=WINDOW_DURATION):
+    """Return start times of windows evenly spaced across a recording.
+
+    Args:
+        duration (float): Duration of the recording in seconds
+
+    Kwargs:
+        fraction (float): Fraction of the recording covered by the windows
+            (default FRACTION)
+        windowDuration (float): Duration of each window in seconds
+            (default WINDOW_DURATION)
+    """
+    windowDuration = min(windowDuration, duration)
+    nWindows = max(int(round(fraction * duration / windowDuration)), 1)
+    # Each window is centered on an equal part of the recording
+    centers = (np.arange(nWindows) + 0.5) * duration / nWindows
+    return np.clip(centers - windowDuration / 2, 0, duration - windowDuration)
+
+
+def default_chanList(rec):
+    """Return the labels of all the analog channels of a recording."""
+    if isinstance(rec, recording.SGLXRecording):
+        return list(rec.chanMap.labels[
+            ~np.isin(rec.chanMap.bands, DIGITAL_BANDS)
+        ])
+    return list(rec.labels)
+
+
+def default_regions(rec, chanList):
+    """Return {<region>: [<label>, ...]}, grouping channels by type.
+
+    Channels of SpikeGLX data are grouped by type ('LF', 'AP', 'XA', ...),
+    and channels of TDT data by store.
+    """
+    if isinstance(rec, recording.SGLXRecording):
+        bands = rec.chanMap.bands[rec.chanMap.indices(chanList)]
+    else:
+        bands = [label.rsplit('-', 1)[0] for label in chanList]
+    regions = {}
+    for label, band in zip(chanList, bands):
+        regions.setdefault(str(band), []).append(label)
+    return regions
+
+
+def scan_recording(binPath, datatype='SGLX', chanList=None, regions=None,
+                   fraction=FRACTION, windowDuration=WINDOW_DURATION,
+                   bands=None, rankBands=None,
+                   maxArtifactWindows=MAX_ARTIFACT_WINDOWS,
+                   rmsThreshold=RMS_THRESHOLD, flatDuration=None,
+                   downSample=None):
+    """Scan short windows of all channels and rank channels by region.
+
+    Args:
+        binPath (str | pathlib.Path | list): Path to bin ('SGLX') or block
+            directory ('TDT')
+
+    Kwargs:
+        datatype (str): 'SGLX' or 'TDT' (default 'SGLX')
+        chanList (list(str) | None): Labels of scanned channels. All the
+            analog channels by default
+        regions (dict | None): {<region>: [<label>, ...]} Channels ranked
+            together. Channels missing from `regions` are grouped in an
+            'other' region. By channel type (SGLX) or store (TDT) by default
+        fraction (float): Fraction of the recording read (default FRACTION)
+        windowDuration (float): Duration in seconds of each window
+            (default WINDOW_DURATION)
+        bands (dict | None): {<band_name>: (<fmin>, <fmax>)} Frequency bands
+            (Hz) (default features.BANDS)
+        rankBands (list(str) | None): Bands whose summed power ranks the
+            channels of a region (default RANK_BANDS)
+        maxArtifactWindows (float): Channels with clipped samples or
+            flatlines in a larger fraction of the windows are flagged
+            (default MAX_ARTIFACT_WINDOWS)
+        rmsThreshold (float): Channels whose log RMS has a robust z-score
+            above this value within their region are flagged
+            (default RMS_THRESHOLD)
+        flatDuration (float | None): Minimum duration in seconds of
+            flatlines (default artifacts.FLAT_DURATION)
+        downSample (float | None): Frequency in Hz at which the windows are
+            resampled before computing band powers. Original sampling rate
+            by default
+
+    Returns:
+        pd.DataFrame: One row per channel, sorted by region and rank, with
+            the following columns: 'region', 'channel', 'rank', 'flagged',
+            'clipped' (fraction of clipped samples), 'flat_windows' and
+            'artifact_windows' (fraction of windows with flatlines / with
+            clipping or flatlines), 'rms' (median across windows), 'rms_z'
+            (robust z-score of the log RMS within the region), <bands>
+            (median power across windows), 'score' (log10 of the power in
+            `rankBands`)
+    """
+    if bands is None:
+        bands = features.BANDS
+    if rankBands is None:
+        rankBands = RANK_BANDS
+    if flatDuration is None:
+        flatDuration = artifacts.FLAT_DURATION
+
+    with recording.open_recording(binPath, datatype=datatype) as rec:
+        if chanList is None:
+            chanList = default_chanList(rec)
+        if regions is None:
+            regions = default_regions(rec, chanList)
+        tStarts = scan_windows(
+            rec.duration, fraction=fraction, windowDuration=windowDuration
+        )
+        print(f"Scan N={len(chanList)} channels of {binPath}: N={len(tStarts)}"
+              f" windows of {windowDuration}s ("
+              f"{len(tStarts) * windowDuration / rec.duration:.2%} of "
+              f"{rec.duration:.1f}s)")
+
+        # Each read adds the indicators of a window to the index
+        artifactIndex = artifacts.ArtifactIndex(
+            epochDuration=windowDuration, flatDuration=flatDuration,
+        )
+        power = []
+        for tStart in tStarts:
+            # Loaders print a summary of each read
+            with contextlib.redirect_stdout(io.StringIO()):
+                data, sf, labels = rec.read(
+                    tStart=float(tStart), tEnd=float(tStart + windowDuration),
+                    chanList=chanList, downSample=downSample,
+                    artifactIndex=artifactIndex,
+                )
+                windowFeatures = features.compute_features(
+                    data, sf, labels, epochDuration=windowDuration,
+                    bands=bands, ratios=[], emgLabels=[],
+                )
+            power.append(windowFeatures)
+
+    # Summarize windows
+    windows = pd.concat([
+        _window_artifacts(acc) for acc in artifactIndex.accumulators
+    ], ignore_index=True)
+    isFlat = windows['flatline'] >= flatDuration
+    isArtifact = isFlat | (windows['clipped'] > 0)
+    grouped = windows.groupby('channel', sort=False)
+    summary = pd.DataFrame({
+        'clipped': grouped['clipped'].sum() / grouped['samples'].sum(),
+        'flat_windows': isFlat.groupby(windows['channel']).mean(),
+        'artifact_windows': isArtifact.groupby(windows['channel']).mean(),
+        'rms': grouped['rms'].median(),
+    })
+    powerTable = pd.concat(power, ignore_index=True)
+    bandNames = [name for name in bands if name in powerTable]
+    summary = summary.join(
+        powerTable.groupby('channel', observed=True)[bandNames].median()
+    )
+    scoreBands = [name for name in rankBands if name in bandNames]
+    with np.errstate(divide='ignore'):
+        summary['score'] = np.log10(summary[scoreBands].sum(axis=1))
+
+    # Rank channels within regions
+    regionOf = {label: region for region, labels in regions.items()
+                for label in labels}
+    summary.index.name = 'channel'
+    summary = summary.reset_index()
+    summary.insert(
+        0, 'region', [regionOf.get(label, 'other')
+                      for label in summary['channel']]
+    )
+    with np.errstate(divide='ignore'):
+        logRms = np.log10(summary['rms'].astype(float))
+    summary.insert(
+        summary.columns.get_loc('rms') + 1, 'rms_z',
+        logRms.groupby(summary['region']).transform(_robust_z),
+    )
+    summary['flagged'] = (
+        (summary['artifact_windows'] > maxArtifactWindows)
+        | (summary['rms_z'].abs() > rmsThreshold)
+        | ~np.isfinite(summary['score'])
+    )
+    summary = summary.sort_values(
+        ['region', 'flagged', 'score'], ascending=[True, True, False],
+        kind='stable',
+    )
+    summary.insert(2, 'rank', summary.groupby('region').cumcount() + 1)
+    summary.insert(3, 'flagged', summary.pop('flagged'))
+    return summary.reset_index(drop=True)
+
+
+def _window_artifacts(acc):
+    """Return the artifact indicators of each channel of a window."""
+    count = acc.count.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rms = np.sqrt(acc.sumsq.sum(axis=1) / count) * np.abs(acc.conv)
+    return pd.DataFrame({
+        'channel': acc.labels,
+        'samples': count,
+        'clipped': acc.clip.sum(axis=1),
+        'flatline': acc.flat.max(axis=1) / acc.sRate,
+        'rms': rms,
+    })
+
+
+def _robust_z(values):
+    """Robust z-score (median and MAD) of finite values."""
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return values * np.nan
+    median = np.median(finite)
+    mad = 1.4826 * np.median(np.abs(finite - median))
+    if mad == 0:
+        return (values - median) * 0.0
+    return (values - median) / mad
+
+
+def save_scan(path, binPath, nTop=5, **kwargs):
+    """Scan a recording, print the best channels and save the report.
+
+    The table format is inferred from the extension of `path`. See
+    `load.utils.save_table`.
+
+    Kwargs:
+        nTop (int): Number of channels printed for each region (default 5)
+        **kwargs: Passed to `scan_recording`
+    """
+    report = scan_recording(binPath, **kwargs)
+    for region, table in report.groupby('region', sort=False):
+        top = table[~table['flagged']].head(nTop)
+        print(f"{region}: best channels {list(top['channel'])}, N="
+              f"{table['flagged'].sum()}/{len(table)} flagged")
+    utils.save_table(path, report)
+    print(f"Saved scan report at {path}")
+    return report
@@ -0,0 +1,457 @@
+"""Local data server sharing loaded data between scorers.
+
+A `sleepscore serve` process loads and downsamples recordings on behalf of
+clients, and keeps the results in memory, so that scorers opening the same
+recordings on different machines don't each read the raw files:
+
+    python -m sleepscore serve --host=0.0.0.0 --port=8765 --root=/data
+
+Clients fetch data over HTTP:
+    - POST /bundle: data of a list of datasets, as loaded by `load_and_score`
+      (set the `server` entry of the config to fetch from the server)
+    - POST /window: time window of a single recording (see
+      `load.recording.Recording.read`)
+    - GET /status: state of the cache
+Requests are JSON dictionaries, and responses are `.npz` archives with the
+data and a JSON description. Requests are handled concurrently. Identical
+requests share a single load, and results are reused until the files of the
+recording change. There is no authentication: only bind to an address
+reachable by trusted machines, and restrict the served files with `root`.
+"""
+import io
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from . import load
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+CACHE_BYTES = 4e9  # Maximum size of the cached results
+
+# Keyword arguments of window requests passed to `Recording.read`
+WINDOW_KWARGS = [
+    'downSample', 'tStart', 'tEnd', 'chanList', 'chanListType', 'ds_method',
+    'derivations', 'filters', 'zeroPhase', 'useLF',
+]
+
+
+class ServerError(Exception):
+    """Error returned by a `sleepscore serve` process."""
+
+
+class ResultCache:
+    """Least recently used cache of results, bounded by their size.
+
+    Concurrent requests of a result that is not cached yet wait for a single
+    computation.
+
+    Kwargs:
+        maxBytes (float): Maximum total size of cached results
+            (default CACHE_BYTES)
+    """
+
+    def __init__(self, maxBytes=CACHE_BYTES):
+        self.maxBytes = maxBytes
+        self.nBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # {<key>: (<result>, <nBytes>)}
+        self._pending = {}  # {<key>: Future}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute, size):
+        """Return the cached result of `key`, or compute and cache it.
+
+        Args:
+            key (str): Key of the result
+            compute (callable): compute() returns the result
+            size (callable): size(result) returns the size of the result in
+                bytes
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not owner:
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+        nBytes = size(result)
+        with self._lock:
+            del self._pending[key]
+            if nBytes <= self.maxBytes:
+                self._entries[key] = (result, nBytes)
+                self.nBytes += nBytes
+                while self.nBytes > self.maxBytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.nBytes -= evicted
+        future.set_result(result)
+        return result
+
+    def status(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.nBytes,
+                'maxBytes': self.maxBytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'pending': len(self._pending),
+            }
+
+
+def recording_signature(binPath):
+    """Return (path, size, mtime) of the files of a recording.
+
+    Cached results of a recording are invalidated when its signature changes
+    (eg: recording in progress).
+    """
+    signature = []
+    for path in load.segments.expand_binPaths(binPath):
+        if path.is_dir():
+            files = sorted(p for p in path.iterdir() if p.is_file())
+        else:
+            files = [path, path.with_suffix('.meta')]
+        for f in files:
+            if f.exists():
+                stat = f.stat()
+                signature.append((str(f), stat.st_size, stat.st_mtime_ns))
+    return signature
+
+
+class ScoringServer(ThreadingHTTPServer):
+    """HTTP server loading data on behalf of clients.
+
+    Args:
+        address (tuple): (host, port)
+
+    Kwargs:
+        root (str | None): If specified, only recordings in this directory
+            are served (default None)
+        cacheBytes (float): Maximum size of cached results
+            (default CACHE_BYTES)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, root=None, cacheBytes=CACHE_BYTES):
+        super().__init__(address, _RequestHandler)
+        self.root = os.path.realpath(root) if root is not None else None
+        self.cache = ResultCache(cacheBytes)
+        # {(<datatype>, <binPath>): (<signature>, <Recording>, <Lock>)}
+        self._recordings = {}
+        self._recordingsLock = threading.Lock()
+
+    def check_path(self, binPath):
+        """Raise PermissionError if a recording is outside of `root`."""
+        if self.root is None:
+            return
+        for path in load.segments.expand_binPaths(binPath):
+            path = os.path.realpath(path)
+            if os.path.commonpath([self.root, path]) != self.root:
+                raise PermissionError(
+                    f"Recording outside of the served directory: {path}"
+                )
+
+    def _key(self, kind, request, binPaths):
+        signatures = [recording_signature(p) for p in binPaths]
+        return json.dumps([kind, request, signatures], sort_keys=True,
+                          default=str)
+
+    def bundle(self, request):
+        """Return (data, sf, chanLabels, artifacts) of a list of datasets.
+
+        Args:
+            request (dict): 'datasets' (mandatory), 'tStart', 'tEnd',
+                'downSample', 'ds_method' and 'kwargs_artifacts'. See
+                `sleepscore.load_datasets`
+        """
+        from . import load_datasets, validate_datasets
+
+        datasets = validate_datasets(request['datasets'])
+        for dataset_dict in datasets:
+            self.check_path(dataset_dict['binPath'])
+        kwargs = {
+            k: request[k] for k in [
+                'tStart', 'tEnd', 'downSample', 'ds_method',
+                'kwargs_artifacts',
+            ] if k in request
+        }
+        key = self._key(
+            'bundle', [datasets, kwargs], [d['binPath'] for d in datasets]
+        )
+        return self.cache.get(
+            key,
+            lambda: load_datasets(datasets, **kwargs),
+            lambda result: result[0].nbytes,
+        )
+
+    def get_recording(self, binPath, datatype='SGLX'):
+        """Return an open recording and its lock.
+
+        Recordings stay open between requests, and are reopened when their
+        files change.
+        """
+        signature = recording_signature(binPath)
+        key = (datatype.lower(), json.dumps(binPath, default=str))
+        with self._recordingsLock:
+            if key in self._recordings:
+                cachedSignature, rec, lock = self._recordings[key]
+                if cachedSignature == signature:
+                    return rec, lock
+                with lock:
+                    rec.close()
+            rec = load.open_recording(binPath, datatype=datatype)
+            lock = threading.Lock()
+            self._recordings[key] = (signature, rec, lock)
+            return rec, lock
+
+    def window(self, request):
+        """Return (data, sf, chanLabels) of a window of a recording.
+
+        Args:
+            request (dict): 'binPath' (mandatory), 'datatype' and the kwargs
+                of `Recording.read` listed in WINDOW_KWARGS
+        """
+        binPath = request['binPath']
+        datatype = request.get('datatype', 'SGLX')
+        self.check_path(binPath)
+        unknown = set(request) - set(WINDOW_KWARGS) - {'binPath', 'datatype'}
+        if unknown:
+            raise ValueError(
+                f"Unrecognized keys in window request: {sorted(unknown)}. "
+                f"Supported keys: {WINDOW_KWARGS}"
+            )
+        kwargs = {k: request[k] for k in WINDOW_KWARGS if k in request}
+
+        def compute():
+            rec, lock = self.get_recording(binPath, datatype=datatype)
+            # Readers of a recording can't be shared by concurrent reads
+            with lock:
+                return rec.read(**kwargs)
+
+        key = self._key('window', [binPath, datatype, kwargs], [binPath])
+        return self.cache.get(key, compute, lambda result: result[0].nbytes)
+
+    def status(self):
+        with self._recordingsLock:
+            recordings = [str(binPath) for _, binPath in self._recordings]
+        return dict(self.cache.status(), recordings=recordings)
+
+    def server_close(self):
+        super().server_close()
+        with self._recordingsLock:
+            for _, rec, lock in self._recordings.values():
+                with lock:
+                    rec.close()
+            self._recordings = {}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == '/status':
+            self._send_json(200, self.server.status())
+        else:
+            self._send_json(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            if self.path == '/bundle':
+                body = encode(*self.server.bundle(request))
+            elif self.path == '/window':
+                body = encode(*self.server.window(request))
+            else:
+                self._send_json(404, {'error': f"Unknown path: {self.path}"})
+                return
+        except PermissionError as e:
+            self._send_json(403, {'error': str(e)})
+            return
+        except (ValueError, KeyError, TypeError, FileNotFoundError) as e:
+            self._send_json(400, {'error': f"{type(e).__name__}: {e}"})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[{self.address_string()}] {format % args}")
+
+
+def encode(data, sf, chanLabels, artifacts=None):
+    """Return `.npz` bytes of loaded data and its description."""
+    meta = {
+        'sf': float(sf),
+        'chanLabels': [str(label) for label in chanLabels],
+        'artifacts': None if artifacts is None else list(artifacts.columns),
+    }
+    arrays = {'data': data, 'meta': np.array(json.dumps(meta))}
+    if artifacts is not None:
+        # Columns are saved as arrays to keep their dtype
+        for i, col in enumerate(artifacts.columns):
+            values = artifacts[col].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[f'artifacts_{i}'] = values
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+def decode(body):
+    """Return (data, sf, chanLabels, artifacts) from `encode` bytes."""
+    with np.load(io.BytesIO(body), allow_pickle=False) as f:
+        data = f['data']
+        meta = json.loads(str(f['meta']))
+        artifacts = None
+        if meta['artifacts'] is not None:
+            artifacts = pd.DataFrame({
+                col: f[f'artifacts_{i}']
+                for i, col in enumerate(meta['artifacts'])
+            })
+            if 'channel' in artifacts:
+                artifacts['channel'] = artifacts['channel'].astype(object)
+    return data, meta['sf'], meta['chanLabels'], artifacts
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, root=None,
+          cacheBytes=CACHE_BYTES):
+    """Serve data until interrupted (Ctrl-C).
+
+    Kwargs:
+        host (str): Address to bind to. '0.0.0.0' to accept connections from
+            other machines (default DEFAULT_HOST)
+        port (int): Port (default DEFAULT_PORT)
+        root (str | None): If specified, only recordings in this directory
+            are served (default None)
+        cacheBytes (float): Maximum size of cached results
+            (default CACHE_BYTES)
+    """
+    server = ScoringServer((host, port), root=root, cacheBytes=cacheBytes)
+    print(f"Serving sleepscore data at http://{host}:{server.server_port}"
+          f"{f' from {root}' if root else ''} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _url(server, path):
+    server = str(server)
+    if '://' not in server:
+        server = f"http://{server}"
+    return server.rstrip('/') + path
+
+
+def _request(server, path, request=None, timeout=None):
+    data = None
+    headers = {}
+    if request is not None:
+        data = json.dumps(request, default=str).encode()
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(_url(server, path), data=data,
+                                 headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read())['error']
+        except (ValueError, KeyError):
+            message = str(e)
+        raise ServerError(f"{server}: {message}") from None
+
+
+def fetch_bundle(server, datasets, tStart=None, tEnd=None, downSample=100.0,
+                 ds_method="interpolation", kwargs_artifacts=None,
+                 timeout=None):
+    """Fetch the data of a list of datasets from a server.
+
+    Args:
+        server (str): Address of the server (eg: "host:8765")
+        datasets (list(dict)): See `sleepscore.load_and_score`
+
+    Kwargs:
+        timeout (float | None): Timeout in seconds (default None)
+        *: See `sleepscore.load_datasets`
+
+    Returns:
+        (data, sf, chanLabels, artifacts): See `sleepscore.load_datasets`
+    """
+    print(f"Fetch data of N={len(datasets)} datasets from {server}")
+    return decode(_request(server, '/bundle', {
+        'datasets': datasets,
+        'tStart': tStart,
+        'tEnd': tEnd,
+        'downSample': downSample,
+        'ds_method': ds_method,
+        'kwargs_artifacts': kwargs_artifacts,
+    }, timeout=timeout))
+
+
+def fetch_window(server, binPath, datatype='SGLX', timeout=None, **kwargs):
+    """Fetch a time window of a recording from a server.
+
+    Args:
+        server (str): Address of the server (eg: "host:8765")
+        binPath (str | pathlib.Path | list): Path of the recording on the
+            server
+
+    Kwargs:
+        datatype (str): 'SGLX' or 'TDT' (default 'SGLX')
+        timeout (float | None): Timeout in seconds (default None)
+        **kwargs: Passed to `Recording.read` (see WINDOW_KWARGS)
+
+    Returns:
+        (data, sf, chanLabels)
+    """
+    request = dict(kwargs, binPath=binPath, datatype=datatype)
+    data, sf, chanLabels, _ = decode(
+        _request(server, '/window', request, timeout=timeout)
+    )
+    return data, sf, chanLabels
+
+
+def fetch_status(server, timeout=None):
+    """Return the state of the cache of a server."""
+    return json.loads(_request(server, '/status', timeout=timeout))
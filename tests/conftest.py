@@ -0,0 +1,61 @@
+"""Synthetic SpikeGLX recordings shared by the tests."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Neuropixels 1.0 probe: 384 sites, AP gain 500 and LF gain 250
+N_SITES = 384
+IMRO_TBL = '(0,384)' + ''.join(f'({i} 0 0 500 250 0)' for i in range(N_SITES))
+
+
+def write_imec(path, data, sRate, band='lf', sites=None, **extraMeta):
+    """Write a (n_samples, n_sites + 1) int16 imec bin and its meta.
+
+    The last column is the SY channel. Sites are numbered from 0 by default.
+    `extraMeta` entries (eg firstSample) are added to the meta.
+    """
+    path = Path(path)
+    data = np.asarray(data, dtype='int16')
+    nSites = data.shape[1] - 1
+    if sites is None:
+        sites = range(nSites)
+    offset = N_SITES if band == 'lf' else 0
+    prefix = band.upper()
+    chanMap = f'({nSites},{nSites},1)'
+    chanMap += ''.join(
+        f'({prefix}{s};{s + offset}:{i})' for i, s in enumerate(sites)
+    )
+    chanMap += f'(SY0;768:{nSites})'
+    meta = {
+        'typeThis': 'imec',
+        'imSampRate': sRate,
+        'imAiRangeMax': 0.6,
+        'nSavedChans': nSites + 1,
+        'snsSaveChanSubset': ','.join(str(s + offset) for s in sites)
+        + ',768',
+        'snsApLfSy': f'{nSites},0,1' if band == 'ap' else f'0,{nSites},1',
+        'snsChanMap': chanMap,
+        'imroTbl': IMRO_TBL,
+        'fileSizeBytes': data.size * 2,
+        'fileTimeSecs': data.shape[0] / sRate,
+        **extraMeta,
+    }
+    data.tofile(path)
+    with open(path.with_suffix('.meta'), 'w') as f:
+        for key, value in meta.items():
+            tilde = '~' if key in ['snsChanMap', 'imroTbl'] else ''
+            f.write(f'{tilde}{key}={value}\n')
+    return path
+
+
+@pytest.fixture
+def lf_bin(tmp_path):
+    """60s LF bin of 4 sites (sines of 2 to 5Hz) and a SY channel."""
+    sRate = 2500.0
+    t = np.arange(int(60 * sRate)) / sRate
+    data = np.zeros((len(t), 5))
+    for c in range(4):
+        data[:, c] = 1000 * np.sin(2 * np.pi * (2 + c) * t)
+    data[:, -1] = (np.floor(t) % 2) * 64  # Sync pulses on line 6
+    return write_imec(tmp_path / 'run_g0_t0.imec0.lf.bin', data, sRate)
@@ -0,0 +1,60 @@
+import numpy as np
+
+from sleepscore.load import artifacts
+
+
+def make_index(raw, sRate=100.0, rails=None, blockSamples=1000):
+    """Index of (n_channels, n_samples) raw data fed in consecutive blocks."""
+    index = artifacts.ArtifactIndex()
+    acc = index.add_channels(
+        [f"ch{i}" for i in range(raw.shape[0])], sRate, raw.shape[1],
+        rails=rails,
+    )
+    for t0 in range(0, raw.shape[1], blockSamples):
+        acc.update(raw[:, t0:t0 + blockSamples], t0)
+    return index
+
+
+def clean_data(nChans=2, duration=400.0, sRate=100.0):
+    rng = np.random.default_rng(0)
+    return rng.normal(0, 100, (nChans, int(duration * sRate))).astype('int16')
+
+
+def test_artifact_index_flags():
+    raw = clean_data()
+    raw[0, 1000:1001] = 2048  # Clipped sample in epoch 2
+    raw[1, 2050:2200] = 100  # 1.5s flatline in epoch 5
+    raw[0, 3200:3600] *= 4  # High RMS in epoch 8
+    table = make_index(raw, rails=2048, blockSamples=777).to_table(name='A')
+    assert len(table) == 2 * 100
+    bitmask = table.set_index(['channel', 'epoch'])['bitmask']
+    flagged = bitmask[bitmask > 0]
+    assert list(flagged.index) == [('A,ch0', 2), ('A,ch0', 8), ('A,ch1', 5)]
+    assert flagged['A,ch0', 2] & artifacts.FLAGS['clip']
+    assert flagged['A,ch0', 8] == artifacts.FLAGS['rms_high']
+    assert flagged['A,ch1', 5] == artifacts.FLAGS['flat']
+    flatline = table.set_index(['channel', 'epoch'])['flatline']
+    assert np.isclose(flatline['A,ch1', 5], 1.5)
+
+
+def test_annotations_merge_consecutive_epochs(tmp_path):
+    raw = clean_data()
+    raw[1, 800:1600] = 0  # Epochs 2 and 3
+    table = make_index(raw).to_table()
+    annotations = artifacts.save_annotations(tmp_path / 'a.txt', table)
+    assert annotations == [(8.0, 16.0, 'flat ch1 / rms_low ch1')]
+    assert (tmp_path / 'a.txt').read_text() == \
+        "8.000, 16.000, flat ch1 / rms_low ch1\n"
+
+
+def test_no_annotations_for_clean_data(tmp_path):
+    table = make_index(clean_data()).to_table()
+    assert not table['bitmask'].any()
+    stale = tmp_path / 'artifacts.annotations.txt'
+    stale.write_text("8.000, 16.000, flat ch1\n")
+    annotationsPath = artifacts.save_artifacts(
+        tmp_path / 'artifacts.csv', table
+    )
+    assert annotationsPath is None
+    assert (tmp_path / 'artifacts.csv').exists()
+    assert not stale.exists()
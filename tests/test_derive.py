@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from sleepscore.load import derive, readSGLX, recording
+
+GROUPS = {'A1': 'A', 'A2': 'A', 'A3': 'A', 'B1': 'B'}
+
+
+def test_parse_derivations():
+    labels, weights = derive.parse_derivations(
+        {
+            'bipolar': {'A1': 1, 'A2': -1},
+            'car': {'channel': 'A1', 'reference': 'all'},
+            'ref': {'channel': 'B1', 'reference': ['A2', 'A3']},
+        },
+        list(GROUPS), GROUPS.get,
+    )
+    assert labels == ['bipolar', 'car', 'ref']
+    assert weights[0] == {'A1': 1.0, 'A2': -1.0}
+    assert weights[1] == pytest.approx(
+        {'A1': 2 / 3, 'A2': -1 / 3, 'A3': -1 / 3}
+    )
+    assert weights[2] == {'B1': 1.0, 'A2': -0.5, 'A3': -0.5}
+
+
+@pytest.mark.parametrize('derivations', [
+    [('d', {'A1': 1})],
+    {'d': {}},
+    {'d': {'A1': 'x'}},
+    {'d': {'channel': 'A1', 'reference': []}},
+])
+def test_parse_derivations_invalid(derivations):
+    with pytest.raises(ValueError):
+        derive.parse_derivations(derivations, list(GROUPS), GROUPS.get)
+
+
+def test_mixing_matrix():
+    sourceLabels, mix, outLabels = derive.mixing_matrix(
+        ['A2'], ['bipolar', 'sum'],
+        [{'A1': 1.0, 'A2': -1.0}, {'A3': 0.5, 'A1': 0.5}],
+    )
+    assert sourceLabels == ['A2', 'A1', 'A3']
+    assert outLabels == ['A2', 'bipolar', 'sum']
+    np.testing.assert_array_equal(mix, [
+        [1.0, 0.0, 0.0],
+        [-1.0, 1.0, 0.0],
+        [0.0, 0.5, 0.5],
+    ])
+
+
+def test_apply_mix():
+    rng = np.random.default_rng(0)
+    block = rng.integers(-1000, 1000, (3, 3 * derive.SUBBLOCK_SAMPLES + 5),
+                         dtype='int16')
+    mix = rng.normal(size=(2, 3))
+    np.testing.assert_allclose(derive.apply_mix(mix, block), mix @ block)
+
+
+def test_derivations_mixing_matrix(lf_bin):
+    chanMap = readSGLX.getChannelMap(readSGLX.readMeta(lf_bin))
+    sourceLabels, mix, outLabels = recording.derivations_mixing_matrix(
+        {'car': {'channel': 'LF1;385', 'reference': 'all'}}, [], chanMap
+    )
+    # 'all' references the channels of the same band: not the SY channel
+    assert sourceLabels == ['LF1;385', 'LF0;384', 'LF2;386', 'LF3;387']
+    assert outLabels == ['car']
+    np.testing.assert_allclose(mix, [[0.75, -0.25, -0.25, -0.25]])
+    with pytest.raises(Exception, match='not found in saved channels'):
+        recording.derivations_mixing_matrix(
+            {'d': {'LF0;384': 1, 'LF9;393': -1}}, [], chanMap
+        )
+
+
+def test_read_derivations(lf_bin):
+    with recording.SGLXRecording(lf_bin) as rec:
+        raw, _, _ = rec.read(downSample=100.0,
+                             chanList=['LF0;384', 'LF1;385'])
+        derived, _, labels = rec.read(
+            downSample=100.0, chanList=['LF0;384'],
+            derivations={'bipolar': {'LF0;384': 1, 'LF1;385': -1}},
+        )
+    assert labels == ['LF0;384', 'bipolar']
+    np.testing.assert_allclose(derived[0], raw[0])
+    np.testing.assert_allclose(derived[1], raw[0] - raw[1], atol=1e-6)
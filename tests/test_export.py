@@ -0,0 +1,105 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from sleepscore import export
+
+SF = 100.0
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    data = rng.normal(scale=50.0, size=(3, 1050))
+    data[2] = 7.0  # Flat channel
+    return data
+
+
+def read_edf(path):
+    """Return (header, signals, data) of an EDF+ file of `write_edf`."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    def field(start, width):
+        return raw[start:start + width].decode('ascii').strip()
+
+    nSignals = int(field(252, 4))
+    header = {
+        'version': field(0, 8), 'patient': field(8, 80),
+        'recording': field(88, 80), 'startdate': field(168, 8),
+        'starttime': field(176, 8), 'headerBytes': int(field(184, 8)),
+        'reserved': field(192, 44), 'nRecords': int(field(236, 8)),
+        'recordDuration': float(field(244, 8)), 'nSignals': nSignals,
+    }
+    signals = [{} for _ in range(nSignals)]
+    pos = 256
+    for key, width, cast in [('label', 16, str), ('transducer', 80, str),
+                             ('unit', 8, str), ('physMin', 8, float),
+                             ('physMax', 8, float), ('digMin', 8, int),
+                             ('digMax', 8, int), ('prefiltering', 80, str),
+                             ('nSamples', 8, int), ('reserved', 32, str)]:
+        for s in signals:
+            s[key] = cast(field(pos, width))
+            pos += width
+    assert pos == header['headerBytes'] == len(raw) - header['nRecords'] \
+        * 2 * sum(s['nSamples'] for s in signals)
+
+    records = np.frombuffer(raw[pos:], dtype='<i2').reshape(
+        header['nRecords'], -1
+    )
+    data, i = [], 0
+    for s in signals[:-1]:
+        digital = records[:, i:i + s['nSamples']].ravel().astype(float)
+        gain = (s['physMax'] - s['physMin']) / (s['digMax'] - s['digMin'])
+        data.append(s['physMin'] + (digital - s['digMin']) * gain)
+        i += s['nSamples']
+    return header, signals, np.array(data)
+
+
+def test_binary_round_trip(data, tmp_path):
+    path = tmp_path / 'export.bin'
+    export.save_export(path, data, SF, ['LF0', 'LF1', 'EMG'], tStart=12.0,
+                       chunkDuration=3.0, sources=[tmp_path / 'run.bin'])
+    saved, sf, labels, header = export.read_binary(path)
+    assert sf == SF and labels == ['LF0', 'LF1', 'EMG']
+    assert header['tStart'] == 12.0 and header['unit'] == 'uV'
+    assert header['sources'] == [str(tmp_path / 'run.bin')]
+    assert saved.shape == data.shape and saved.dtype == 'float32'
+    np.testing.assert_allclose(saved, data, rtol=1e-6)
+
+
+def test_edf(data, tmp_path, capsys):
+    path = tmp_path / 'export.edf'
+    labels = ['LF0', 'a_very_long_channel_label', 'EMG']
+    export.save_export(
+        path, data, SF, labels, tStart=90.0, chunkDuration=3.0,
+        startDatetime=datetime.datetime(2024, 3, 5, 22, 0, 0),
+    )
+    assert 'EDF labels are truncated' in capsys.readouterr().out
+    header, signals, edfData = read_edf(path)
+    assert header['reserved'] == 'EDF+C'
+    assert header['startdate'] == '05.03.24'
+    assert header['starttime'] == '22.01.30'
+    assert header['recording'].startswith('Startdate 05-MAR-2024')
+    # 1050 samples: 11 records of 1s, the last one padded
+    assert header['nRecords'] == 11 and header['recordDuration'] == 1.0
+    assert [s['label'] for s in signals] == [
+        'LF0', 'a_very_long_chan', 'EMG', 'EDF Annotations',
+    ]
+    assert signals[1]['transducer'] == labels[1]
+    assert signals[0]['nSamples'] == 100
+    # Physical range of each channel covers its data
+    for s, x in zip(signals, data):
+        assert s['physMin'] <= x.min() and s['physMax'] >= x.max()
+    gains = np.array([(s['physMax'] - s['physMin']) / 65535
+                      for s in signals[:-1]])
+    assert (np.abs(edfData[:, :1050] - data)
+            <= gains[:, np.newaxis] / 2 + 1e-9).all()
+    # Time-keeping annotation of the last record
+    assert b'+10\x14\x14\x00' in path.read_bytes()
+
+
+def test_save_export_invalid(data, tmp_path):
+    with pytest.raises(ValueError, match='Unrecognized export extension'):
+        export.save_export(tmp_path / 'export.npy', data, SF, ['a', 'b', 'c'])
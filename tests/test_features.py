@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sleepscore import features
+
+
+@pytest.fixture
+def data():
+    """60s at 100Hz: 2Hz (delta) and 7Hz (theta) sines, and an EMG."""
+    sf = 100.0
+    t = np.arange(int(60 * sf)) / sf
+    rng = np.random.default_rng(0)
+    return np.stack([
+        10 * np.sin(2 * np.pi * 2 * t),
+        10 * np.sin(2 * np.pi * 7 * t),
+        rng.normal(0, 3, len(t)),
+    ]), sf, ['EEG1', 'EEG2', 'derivedEMG']
+
+
+def test_compute_features(data):
+    x, sf, labels = data
+    table = features.compute_features(x, sf, labels, nJobs=2)
+    assert len(table) == 3 * 15
+    assert list(table.columns) == [
+        'epoch', 'start_time', 'channel', 'delta', 'theta', 'sigma', 'gamma',
+        'theta_delta', 'sigma_delta', 'delta_gamma', 'rms',
+    ]
+    eeg1 = table[table['channel'] == 'EEG1']
+    assert list(eeg1['start_time']) == list(np.arange(0, 60, 4.0))
+    # Power of a sine of amplitude 10 is 50
+    np.testing.assert_allclose(eeg1['delta'], 50, rtol=0.05)
+    assert (eeg1['theta'] < 1).all()
+    np.testing.assert_allclose(eeg1['rms'], 10 / np.sqrt(2), rtol=1e-3)
+    eeg2 = table[table['channel'] == 'EEG2']
+    np.testing.assert_allclose(eeg2['theta'], 50, rtol=0.05)
+    assert (eeg2['theta_delta'] > 100).all()
+    # Only the RMS of the EMG
+    emg = table[table['channel'] == 'derivedEMG']
+    assert emg['delta'].isna().all()
+    np.testing.assert_allclose(emg['rms'], 3, rtol=0.1)
+
+
+def test_compute_features_blocks(data, monkeypatch):
+    x, sf, labels = data
+    whole = features.compute_features(x, sf, labels)
+    # Blocks of 2 epochs
+    monkeypatch.setattr(features, 'BLOCK_SIZE', 800)
+    pd.testing.assert_frame_equal(
+        features.compute_features(x, sf, labels), whole
+    )
+
+
+def test_compute_features_bands(data):
+    x, sf, labels = data
+    # Bands above the Nyquist frequency are dropped, with their ratios
+    table = features.compute_features(
+        x[:, ::2], sf / 2, labels, epochDuration=10.0,
+    )
+    assert 'gamma' not in table and 'delta_gamma' not in table
+    assert table['epoch'].max() == 5
+    table = features.compute_features(
+        x, sf, labels, bands={'low': (0.5, 3.0)}, ratios=[], emgLabels=[],
+    )
+    assert list(table.columns) == [
+        'epoch', 'start_time', 'channel', 'low', 'rms'
+    ]
+    assert table['low'].notna().all()
+
+
+def test_save_features(data, tmp_path):
+    x, sf, labels = data
+    path = tmp_path / 'features.csv'
+    table = features.save_features(path, x, sf, labels)
+    saved = pd.read_csv(path)
+    assert list(saved.columns) == list(table.columns)
+    np.testing.assert_allclose(saved['rms'], table['rms'], rtol=1e-6)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import scipy.signal
+
+from sleepscore.load import filtering
+
+FILTERS = [
+    {'type': 'notch', 'freq': 50.0},
+    {'type': 'bandpass', 'low': 1.0, 'high': 40.0},
+]
+SRATE = 1000.0
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(0)
+    t = np.arange(20000) / SRATE
+    return (300 + 100 * np.sin(2 * np.pi * 3.3 * t)
+            + 50 * np.sin(2 * np.pi * 50 * t)
+            + 10 * rng.normal(size=(2, len(t))))
+
+
+def filter_blockwise(blockFilter, x, blockSamples, overlap):
+    """Filter `x` block by block, as `SGLXRecording.read` does."""
+    nIn = x.shape[1]
+    out = np.empty(x.shape)
+    for t0 in range(0, nIn, blockSamples):
+        t1 = min(t0 + blockSamples, nIn)
+        c0, c1 = max(t0 - overlap, 0), min(t1 + overlap, nIn)
+        block = blockFilter(x[:, c0:c1], c0, t0, t1)
+        out[:, t0:t1] = block[:, t0 - c0:t1 - c0]
+    return out
+
+
+@pytest.mark.parametrize('overlap', [0, 300])
+def test_carried_state_equals_whole(signal, overlap):
+    blockFilter = filtering.BlockFilter(FILTERS, SRATE)
+    blockwise = filter_blockwise(blockFilter, signal, 3001, overlap)
+    sos = filtering.design_sos(FILTERS, SRATE)
+    zi = scipy.signal.sosfilt_zi(sos)[:, np.newaxis, :] * signal[:, :1]
+    whole, _ = scipy.signal.sosfilt(sos, signal, axis=-1, zi=zi)
+    np.testing.assert_allclose(blockwise, whole, atol=1e-8)
+
+
+def test_zero_phase(signal):
+    blockFilter = filtering.BlockFilter(FILTERS, SRATE, zeroPhase=True)
+    assert blockFilter.overlap == filtering.settling_samples(FILTERS, SRATE)
+    blockwise = filter_blockwise(blockFilter, signal, 3001,
+                                 blockFilter.overlap)
+    whole = scipy.signal.sosfiltfilt(blockFilter.sos, signal, axis=-1)
+    # Blocks differ from the whole signal only by the settled transients
+    np.testing.assert_allclose(blockwise, whole, atol=1e-3)
+
+
+def test_blocks_should_be_consecutive(signal):
+    blockFilter = filtering.BlockFilter(FILTERS, SRATE)
+    blockFilter(signal[:, :1000], 0, 0, 1000)
+    with pytest.raises(AssertionError):
+        blockFilter(signal[:, 2000:3000], 2000, 2000, 3000)
+
+
+def test_settling_samples():
+    assert filtering.settling_samples(FILTERS, SRATE) == 6000
+    assert filtering.settling_samples(
+        [{'type': 'notch', 'freq': 60.0, 'Q': 10.0}], SRATE
+    ) == 1000
+
+
+@pytest.mark.parametrize('filters', [
+    [],
+    {'type': 'notch', 'freq': 50.0},
+    [{'type': 'comb', 'freq': 50.0}],
+    [{'type': 'lowpass', 'freq': 600.0}],
+    [{'type': 'bandpass', 'low': 0.0, 'high': 40.0}],
+])
+def test_design_sos_invalid(filters):
+    with pytest.raises(ValueError):
+        filtering.design_sos(filters, SRATE)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from sleepscore.load import follow, recording
+
+
+@pytest.mark.parametrize('ds_method', ['poly', 'numpy'])
+def test_follow_matches_whole_read(lf_bin, tmp_path, ds_method):
+    with recording.SGLXRecording(lf_bin) as rec:
+        whole, _, _ = rec.read(downSample=100.0, ds_method=ds_method)
+
+    # Recording in progress: no file size in the meta
+    binPath = tmp_path / 'growing.lf.bin'
+    raw = lf_bin.read_bytes()
+    meta = lf_bin.with_suffix('.meta').read_text().splitlines()
+    binPath.with_suffix('.meta').write_text('\n'.join(
+        line for line in meta
+        if not line.startswith(('fileSizeBytes', 'fileTimeSecs'))
+    ))
+    binPath.write_bytes(b'')
+
+    follower = follow.SGLXFollower(binPath, downSample=100.0,
+                                   ds_method=ds_method)
+    nBytesSamp = 2 * 5
+    for nSamp in [4000, 4100, 30017, 90000, 149999]:
+        binPath.write_bytes(raw[:nSamp * nBytesSamp])
+        follower.poll()
+        assert follower.data.shape[1] <= round(nSamp / 25)
+    binPath.write_bytes(raw)
+    binPath.with_suffix('.meta').write_text('\n'.join(meta))
+    follower.poll()
+    assert follower.finished
+    np.testing.assert_allclose(follower.data, whole, rtol=1e-5, atol=1e-2)
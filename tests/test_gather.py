@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from sleepscore import gather, hypno
+from sleepscore.load import recording
+
+
+@pytest.fixture
+def hypnogram(tmp_path):
+    path = tmp_path / 'hypno.txt'
+    hypno.write_hypnogram(
+        path, ['Wake', 'N2', 'N3', 'Wake', 'N2'], [10, 20, 25, 30, 40]
+    )
+    return hypno.read_hypnogram(path)
+
+
+def test_state_segments(hypnogram):
+    epochs = gather.state_segments(hypnogram, ['N2', 'N3'])
+    assert list(epochs['start_time']) == \
+        list(range(10, 25)) + list(range(30, 40))
+    assert list(epochs['state']) == ['N2'] * 10 + ['N3'] * 5 + ['N2'] * 10
+    # Contiguous epochs of both states are in the same segment
+    assert list(epochs['segment']) == [0] * 15 + [1] * 10
+
+
+def test_state_segments_split(hypnogram):
+    epochs = gather.state_segments(hypnogram, ['N2'], epochDuration=2.0,
+                                   maxSegmentDuration=6.0)
+    assert list(epochs['start_time']) == [10, 12, 14, 16, 18, 30, 32, 34, 36,
+                                          38]
+    assert list(epochs['segment']) == [0, 0, 0, 1, 1, 2, 2, 2, 3, 3]
+
+
+def test_state_segments_window(hypnogram):
+    # Hypnogram scored from 100s, recording of 135s
+    epochs = gather.state_segments(hypnogram, ['N2'], tStart=100.0,
+                                   duration=135.0)
+    assert list(epochs['start_time']) == \
+        list(range(110, 120)) + list(range(130, 135))
+    assert gather.state_segments(hypnogram, ['REM']).empty
+
+
+def test_gather_states(lf_bin, hypnogram):
+    datasets = [{'binPath': lf_bin, 'chanList': ['LF1;385']}] * 2
+    data, sf, chanLabels, epochs = gather.gather_states(
+        datasets, [hypnogram] * 2, ['N2'], tStart=[0.0, 5.0],
+        downSample=100.0, ds_method='poly',
+    )
+    assert sf == 100.0 and chanLabels == ['LF1;385']
+    assert data.shape == (1, 2 * 20 * 100)
+    assert list(epochs['dataset']) == [0] * 20 + [1] * 20
+    assert list(epochs['segment']) == [0] * 10 + [1] * 10 + [2] * 10 \
+        + [3] * 10
+    assert list(epochs['sample']) == list(range(0, 4000, 100))
+
+    with recording.SGLXRecording(lf_bin) as rec:
+        whole, _, _ = rec.read(downSample=100.0, chanList=['LF1;385'],
+                               ds_method='poly')
+    # Epochs within segments, away from the edges of the read windows
+    for i, t in [(3, 13), (15, 35), (24, 19), (37, 42)]:
+        row = epochs.iloc[i]
+        assert row['start_time'] == t
+        np.testing.assert_allclose(
+            data[0, row['sample']:row['sample'] + 100],
+            whole[0, t * 100:(t + 1) * 100], rtol=1e-3, atol=1.0,
+        )
+
+
+def test_gather_states_output(lf_bin, hypnogram, capsys):
+    gather.gather_states(
+        [{'binPath': lf_bin, 'chanList': ['LF1;385']}], [hypnogram], ['N2'],
+        downSample=100.0,
+    )
+    out = capsys.readouterr().out
+    # Messages of the reads are printed, without the summary of each read
+    assert out.count('-> Resampling from 2500.0Hz to 100.0Hz') == 2
+    assert 'Data successfully loaded' not in out
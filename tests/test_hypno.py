@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from sleepscore import hypno
+
+
+def test_hypnogram_round_trip(tmp_path):
+    path = tmp_path / 'hypno.txt'
+    hypno.write_hypnogram(path, ['Wake', 'NREM', 'REM'], [10.0, 25.5, 30.0],
+                          datafile='recording')
+    assert path.read_text().splitlines()[:2] == [
+        '*Duration_sec\t30.0', '*Datafile\trecording'
+    ]
+    hypnogram = hypno.read_hypnogram(path)
+    assert list(hypnogram['state']) == ['Wake', 'NREM', 'REM']
+    assert list(hypnogram['start_time']) == [0.0, 10.0, 25.5]
+    assert list(hypnogram['end_time']) == [10.0, 25.5, 30.0]
+    assert list(hypnogram['duration']) == [10.0, 15.5, 4.5]
+    assert hypno.read_states(path) == {'Wake', 'NREM', 'REM'}
+
+
+def test_to_epochs(tmp_path):
+    path = tmp_path / 'hypno.txt'
+    hypno.write_hypnogram(path, ['Wake', 'NREM', 'Art'], [4.0, 9.5, 12.0])
+    codes, timebase, states = hypno.to_epochs(
+        hypno.read_hypnogram(path), epochDuration=2.0,
+        states=['Wake', 'NREM'],
+    )
+    assert list(timebase) == [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+    # Each epoch is in the state at its center. 'Art' isn't in `states`
+    assert list(codes) == [0, 0, 1, 1, 1, hypno.UNSCORED_CODE]
+    assert states == ['Wake', 'NREM']
+    # Sorted states by default
+    _, _, states = hypno.to_epochs(hypno.read_hypnogram(path))
+    assert states == ['Art', 'NREM', 'Wake']
+
+
+def test_bout_statistics():
+    states = ['Wake', 'NREM', 'REM']
+    codes = np.array([0, 0, 1, 1, 1, 1, 2, 2, 0, 1, 1], dtype='int8')
+    stats = hypno.bout_statistics(codes, states, epochDuration=2.0)
+    assert list(stats['n_bouts']) == [2, 2, 1]
+    assert list(stats['total_duration']) == [6.0, 12.0, 4.0]
+    assert list(stats['max_bout_duration']) == [4.0, 8.0, 4.0]
+    assert list(stats['median_bout_duration']) == [3.0, 6.0, 4.0]
+    assert list(stats['latency']) == [0.0, 4.0, 12.0]
+    assert stats['fraction'].sum() == pytest.approx(1.0)
+    assert list(stats['n_to_NREM']) == [2, 0, 0]
+    assert list(stats['n_to_REM']) == [0, 1, 0]
+    assert list(stats['n_to_Wake']) == [0, 0, 1]
+
+
+def test_bout_statistics_unscored():
+    states = ['Wake', 'NREM']
+    U = hypno.UNSCORED_CODE
+    codes = np.array([1, 1, U, 1, 1, U, U, 0, 1, U], dtype='int8')
+    stats = hypno.bout_statistics(codes, states)
+    # Unscored epochs split bouts, without self or spurious transitions
+    assert list(stats['n_bouts']) == [1, 3]
+    assert list(stats['total_duration']) == [1.0, 5.0]
+    assert list(stats['n_to_Wake']) == [0, 0]
+    assert list(stats['n_to_NREM']) == [1, 0]
+    # No scored epochs
+    stats = hypno.bout_statistics(np.array([U, U], dtype='int8'), states)
+    assert list(stats['n_bouts']) == [0, 0]
+    assert stats['latency'].isna().all()
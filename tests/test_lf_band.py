@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from conftest import write_imec
+from sleepscore.load import readSGLX, recording
+
+
+def write_run(tmp_path, lfSites=(0, 1, 2)):
+    """Write 4s AP and LF bins of sites 0 to 2 of the same run.
+
+    LF samples are half the AP samples, as the LF gain (250) is half the AP
+    gain (500): both files record the same voltages.
+    """
+    t = np.arange(int(4 * 30000.0)) / 30000.0
+    ap = np.zeros((len(t), 4))
+    for c in range(3):
+        ap[:, c] = 400 * np.sin(2 * np.pi * (2 + c) * t)
+    ap[:, -1] = (np.floor(t) % 2) * 64
+    lf = ap[::12][:, list(lfSites) + [-1]]
+    lf[:, :-1] /= 2
+    apPath = write_imec(tmp_path / 'run_g0_t0.imec0.ap.bin', ap, 30000.0,
+                        band='ap')
+    write_imec(tmp_path / 'run_g0_t0.imec0.lf.bin', lf, 2500.0,
+               sites=lfSites)
+    return apPath
+
+
+def channel_map(path):
+    return readSGLX.getChannelMap(readSGLX.readMeta(path))
+
+
+def test_map_AP_to_LF(tmp_path):
+    apPath = write_run(tmp_path)
+    apMap = channel_map(apPath)
+    lfMap = channel_map(apPath.with_name('run_g0_t0.imec0.lf.bin'))
+    assert recording.map_AP_to_LF(['AP2;2', 'SY0;768', 'AP0;0'], apMap,
+                                  lfMap) == {
+        'AP2;2': 'LF2;386', 'SY0;768': 'SY0;768', 'AP0;0': 'LF0;384',
+    }
+
+
+def test_map_AP_to_LF_missing(tmp_path):
+    # No LF channel of site 1
+    apPath = write_run(tmp_path, lfSites=(0, 2))
+    apMap = channel_map(apPath)
+    lfMap = channel_map(apPath.with_name('run_g0_t0.imec0.lf.bin'))
+    assert recording.map_AP_to_LF(['AP0;0', 'AP1;1'], apMap, lfMap) is None
+    assert recording.map_AP_to_LF(['AP0;0', 'AP2;2'], apMap, lfMap) == {
+        'AP0;0': 'LF0;384', 'AP2;2': 'LF2;386',
+    }
+
+
+@pytest.mark.parametrize('downSample, useLF, fromLF', [
+    (100.0, True, True),
+    (100.0, False, False),
+    # The LF band is low-pass filtered below 500Hz
+    (2500.0, True, False),
+])
+def test_read_AP_from_LF(tmp_path, capsys, downSample, useLF, fromLF):
+    apPath = write_run(tmp_path)
+    with recording.SGLXRecording(apPath) as rec:
+        data, sf, labels = rec.read(
+            downSample=downSample, chanList=['AP1;1'],
+            derivations={'bipolar': {'AP0;0': 1, 'AP2;2': -1}}, useLF=useLF,
+        )
+        assert rec.lf_recording() is not None
+    assert ('Read AP channels from LF file' in capsys.readouterr().out) \
+        == fromLF
+    # Channels keep their AP labels
+    assert sf == downSample and labels == ['AP1;1', 'bipolar']
+    assert data.shape == (2, int(4 * downSample))
+    t = np.arange(data.shape[1]) / downSample
+    # uV of the AP channels
+    conv = 400 * 0.6 / 512 / 500 * 1e6
+    expected = conv * np.array([
+        np.sin(2 * np.pi * 3 * t),
+        np.sin(2 * np.pi * 2 * t) - np.sin(2 * np.pi * 4 * t),
+    ])
+    np.testing.assert_allclose(data[:, 10:-10], expected[:, 10:-10],
+                               atol=0.02 * conv)
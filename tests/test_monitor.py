@@ -0,0 +1,69 @@
+import pytest
+
+from sleepscore.load import monitor, recording
+
+
+def test_cancel_token():
+    token = monitor.CancelToken()
+    token.check()
+    monitor.check(None)
+    token.cancel()
+    assert token.cancelled
+    with pytest.raises(monitor.LoadCancelled):
+        monitor.check(token)
+
+
+def test_read_progress(lf_bin):
+    events = []
+    with recording.SGLXRecording(lf_bin) as rec:
+        rec.read(downSample=100.0, chanList=['LF0;384'], blockSamples=20000,
+                 progress=events.append)
+    nIn = 60 * 2500
+    assert len(events) == 8
+    assert all(e['stage'] == 'read' and e['totalSamples'] == nIn
+               and e['binPath'] == rec.binPath for e in events)
+    samples = [e['samples'] for e in events]
+    assert samples == sorted(samples) and samples[-1] == nIn
+    nBytes = [e['bytes'] for e in events]
+    assert nBytes == sorted(nBytes) and nBytes[-1] > 0
+
+
+def test_read_cancelled(lf_bin):
+    token = monitor.CancelToken()
+    events = []
+
+    def progress(event):
+        # Cancel after the first block, eg from another thread
+        events.append(event)
+        token.cancel()
+
+    with recording.SGLXRecording(lf_bin) as rec:
+        with pytest.raises(monitor.LoadCancelled):
+            rec.read(downSample=100.0, blockSamples=20000,
+                     progress=progress, cancelToken=token)
+        assert len(events) == 1
+        # The recording can be read again with another token
+        data, _, _ = rec.read(downSample=100.0, chanList=['LF0;384'])
+    assert data.shape == (1, 6000)
+
+
+def test_with_info():
+    events = []
+    callback = monitor.with_info(events.append, dataset=1)
+    monitor.report(callback, 'read', 10, 100, nBytes=20, chunk=0)
+    assert events == [{'dataset': 1, 'stage': 'read', 'samples': 10,
+                       'totalSamples': 100, 'bytes': 20, 'chunk': 0}]
+    assert monitor.with_info(None, dataset=1) is None
+    monitor.report(None, 'read', 10, 100)
+
+
+def test_print_progress(capsys):
+    printProgress = monitor.PrintProgress(interval=3600.0)
+    for samples in [10, 50, 100]:
+        printProgress({'stage': 'load', 'samples': samples,
+                       'totalSamples': 100, 'bytes': 0, 'dataset': 0})
+    lines = capsys.readouterr().out.splitlines()
+    # First event, then only the completed stage within the interval
+    assert len(lines) == 2
+    assert lines[0].startswith('Progress: dataset #1 load: 10% (10/100')
+    assert lines[1].startswith('Progress: dataset #1 load: 100%')
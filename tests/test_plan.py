@@ -0,0 +1,81 @@
+import pytest
+
+import sleepscore
+from sleepscore import plan
+
+
+def dry_run(lf_bin, **kwargs):
+    return sleepscore.load_and_score(
+        [{'binPath': str(lf_bin), 'chanList': ['LF0;384', 'LF1;385']}],
+        downSample=100.0, dryRun=True, **kwargs
+    )
+
+
+def test_dry_run(lf_bin):
+    load_plan = dry_run(lf_bin)
+    assert load_plan['sf'] == 100.0
+    assert load_plan['nChans'] == 2
+    assert load_plan['nSamples'] == 6000
+    assert load_plan['datasets'][0]['channels'] == ['LF0;384', 'LF1;385']
+    assert load_plan['windowed']
+    assert not load_plan['progressive'] and not load_plan['memmap']
+    assert load_plan['peak'] == max(b for _, b in load_plan['stages'])
+
+
+@pytest.fixture
+def fake_peaks(monkeypatch):
+    """Peak memory of 8GB, 4GB progressive and 1GB memory-mapped."""
+    plan_load = plan.plan_load
+
+    def fake_plan_load(*args, progressive=False, memmap=False, **kwargs):
+        load_plan = plan_load(
+            *args, progressive=progressive, memmap=memmap, **kwargs
+        )
+        load_plan['peak'] = (1 if memmap else 4 if progressive else 8) \
+            * plan.GB
+        return load_plan
+
+    monkeypatch.setattr(plan, 'plan_load', fake_plan_load)
+
+
+@pytest.mark.parametrize('memoryBudget, progressive, memmap', [
+    (None, False, False),
+    (10.0, False, False),
+    (6.0, True, False),
+    (2.0, True, True),
+    (0.5, True, True),
+])
+def test_memory_budget(lf_bin, fake_peaks, memoryBudget, progressive,
+                       memmap):
+    load_plan = dry_run(lf_bin, memoryBudget=memoryBudget)
+    assert load_plan['progressive'] == progressive
+    assert load_plan['memmap'] == memmap
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'artifactsPath': 'artifacts.csv'},
+    {'datasets': [{'sync': {}}]},
+])
+def test_memory_budget_keeps_whole_load(lf_bin, fake_peaks, kwargs):
+    datasets = [{
+        'binPath': str(lf_bin), 'chanList': ['LF0;384'],
+        **kwargs.pop('datasets', [{}])[0]
+    }]
+    load_plan = sleepscore.load_and_score(
+        datasets, memoryBudget=2.0, dryRun=True, **kwargs
+    )
+    assert not load_plan['progressive'] and not load_plan['memmap']
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'progressive': True, 'artifactsPath': 'artifacts.csv'},
+    {'memmapDir': '.', 'artifactsPath': 'artifacts.csv'},
+    {'progressive': True, 'datasets': [{'sync': {}}]},
+])
+def test_chunked_load_unsupported(lf_bin, kwargs):
+    datasets = [{
+        'binPath': str(lf_bin), 'chanList': ['LF0;384'],
+        **kwargs.pop('datasets', [{}])[0]
+    }]
+    with pytest.raises(ValueError, match='not supported'):
+        sleepscore.load_and_score(datasets, dryRun=True, **kwargs)
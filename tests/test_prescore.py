@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sleepscore import prescore
+
+
+def test_otsu_threshold():
+    rng = np.random.default_rng(0)
+    x = np.r_[rng.normal(0.0, 0.1, 1000), rng.normal(2.0, 0.1, 300)]
+    assert 0.5 < prescore.otsu_threshold(x) < 1.5
+    # Separated classes: middle of the gap
+    x = np.r_[np.zeros(10), np.ones(10)]
+    assert prescore.otsu_threshold(x) == pytest.approx(0.5, abs=0.01)
+    assert np.isnan(prescore.otsu_threshold(np.array([np.nan, np.inf])))
+
+
+def test_merge_short_bouts():
+    codes = np.array([0, 0, 0, 1, 0, 0, 2, 2, 2, 2, 1, 1])
+    merged = prescore.merge_short_bouts(codes, 2)
+    assert list(merged) == [0] * 6 + [2] * 4 + [1] * 2
+    assert list(codes) == [0, 0, 0, 1, 0, 0, 2, 2, 2, 2, 1, 1]
+    # First run is kept, and chains of short runs are merged progressively
+    codes = np.array([1, 0, 1, 2, 2, 2])
+    assert list(prescore.merge_short_bouts(codes, 2)) == [1, 1, 1, 2, 2, 2]
+    assert list(prescore.merge_short_bouts(codes, 1)) == list(codes)
+
+
+def features_table(emg, thetaDelta):
+    n = len(emg)
+    return pd.DataFrame({
+        'channel': ['EEG'] * n + ['derivedEMG'] * n,
+        'start_time': np.tile(np.arange(n, dtype=float), 2),
+        'rms': np.r_[np.ones(n), 10.0 ** emg],
+        'delta': np.r_[np.ones(n), np.ones(n)],
+        'theta': np.r_[10.0 ** thetaDelta, np.ones(n)],
+    })
+
+
+def test_prescore():
+    # Wake, NREM, REM, NREM, then an ambiguous EMG
+    emg = np.r_[[1.0] * 20, [-1.0] * 60, [0.0] * 10]
+    thetaDelta = np.r_[[0.0] * 20, [-1.0] * 20, [1.0] * 20, [-1.0] * 30]
+    codes, timebase, states = prescore.prescore(
+        features_table(emg, thetaDelta), eegChannels=['EEG'],
+        emgThreshold=0.0, minBoutDuration=4.0,
+    )
+    assert states == ['Wake', 'NREM', 'REM', 'Unsure']
+    assert list(timebase) == list(range(90))
+    assert list(codes) == [0] * 20 + [1] * 20 + [2] * 20 + [1] * 20 \
+        + [3] * 10
+
+
+def test_prescore_rem_after_wake():
+    emg = np.r_[[1.0] * 20, [-1.0] * 20]
+    thetaDelta = np.r_[[0.0] * 20, [1.0] * 10, [-1.0] * 10]
+    codes, _, states = prescore.prescore(
+        features_table(emg, thetaDelta), emgThreshold=0.0,
+        thetaDeltaThreshold=0.0, minBoutDuration=4.0,
+    )
+    assert [states[c] for c in codes[::10]] == \
+        ['Wake', 'Wake', 'Unsure', 'NREM']
+
+
+def test_prescore_requires_emg():
+    features = features_table(np.zeros(10), np.zeros(10))
+    with pytest.raises(ValueError, match='EMG channel'):
+        prescore.prescore(features, emgChannel='EMG')
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from sleepscore.load import loader_switch
+from sleepscore.load.progressive import ProgressiveLoad
+
+from conftest import write_imec
+
+
+@pytest.fixture
+def noisy_lf_bin(tmp_path):
+    """60s LF bin of 2 sites (noisy sines) and a SY channel."""
+    sRate = 2500.0
+    t = np.arange(int(60 * sRate)) / sRate
+    rng = np.random.default_rng(0)
+    data = rng.normal(0, 200, (len(t), 3))
+    data[:, 0] += 1000 * np.sin(2 * np.pi * 2 * t)
+    data[:, 1] += 1000 * np.sin(2 * np.pi * 5 * t)
+    data[:, -1] = 0
+    return write_imec(tmp_path / 'run_g0_t0.imec0.lf.bin', data, sRate)
+
+
+@pytest.mark.parametrize('filters, zeroPhase', [
+    (None, False),
+    ([{'type': 'highpass', 'freq': 1.0}], False),
+    ([{'type': 'bandpass', 'low': 1.0, 'high': 20.0}], True),
+])
+@pytest.mark.parametrize('method', ['interpolation', 'poly'])
+def test_progressive_equals_one_shot(noisy_lf_bin, filters, zeroPhase,
+                                     method):
+    dataset = {
+        'binPath': noisy_lf_bin,
+        'datatype': 'SGLX',
+        'chanList': ['LF0;384', 'LF1;385'],
+        'derivations': None,
+        'filters': filters,
+        'zeroPhase': zeroPhase,
+        'useLF': True,
+    }
+    whole, sf, _ = loader_switch(
+        noisy_lf_bin, datatype='SGLX', chanList=dataset['chanList'],
+        filters=filters, zeroPhase=zeroPhase, downSample=100.0,
+        ds_method=method,
+    )
+    data = np.zeros((2, 6000))
+    load = ProgressiveLoad(
+        [dataset], [slice(0, 2)], data, sf, downSample=100.0,
+        ds_method=method, firstChunkDuration=10.0, chunkDuration=15.0,
+    ).start()
+    assert load.nChunks == 5
+    load.wait()
+    assert load.progress == 1.0
+    np.testing.assert_allclose(data, whole[:, :6000], atol=0.1)
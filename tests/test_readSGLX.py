@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from sleepscore.load import readSGLX
+from sleepscore.load.recording import get_loaded_chans_idx_labels
+
+from conftest import write_imec
+
+NIDQ_META = {
+    'typeThis': 'nidq',
+    'niSampRate': '25000',
+    'niAiRangeMax': '5',
+    'niMNGain': '200',
+    'niMAGain': '1',
+    'nSavedChans': '4',
+    'snsSaveChanSubset': '0:1,5,8',
+    'snsMnMaXaDw': '0,2,1,1',
+    'snsChanMap': '(0,2,1,1)(MA0;0:0)(MA1;1:1)(XA0;5:5)(DW0;8:8)',
+}
+
+
+def test_parse_snsChanMap_string():
+    assert readSGLX._parse_snsChanMap('(2,2,1)(AP0;0:0)(AP1;1:1)(SY0;768:2)') \
+        == [('AP0;0', 0), ('AP1;1', 1), ('SY0;768', 2)]
+
+
+def test_imec_channel_map(tmp_path):
+    binPath = write_imec(tmp_path / 'run_g0_t0.imec0.lf.bin',
+                         np.zeros((10, 3)), 2500.0, sites=[10, 20])
+    meta = readSGLX.readMeta(binPath)
+    chanMap = readSGLX.getChannelMap(meta)
+    assert len(chanMap) == 3
+    assert list(chanMap.labels) == ['LF10;394', 'LF20;404', 'SY0;768']
+    assert list(chanMap.origIdx) == [394, 404, 768]
+    assert list(chanMap.mapIdx) == [0, 1, 2]
+    assert list(chanMap.bands) == ['LF', 'LF', 'SY']
+    # 0.6V range on 10 bits, LF gain of 250
+    np.testing.assert_allclose(chanMap.conv, [0.6 / 512 / 250] * 2 + [1])
+    assert readSGLX.parse_snsChanMap(meta) == \
+        [('LF10;394', 0), ('LF20;404', 1), ('SY0;768', 2)]
+    assert readSGLX.savedChanLabels(meta) == list(chanMap.labels)
+    # Parsed once per meta content
+    assert readSGLX.getChannelMap(readSGLX.readMeta(binPath)) is chanMap
+
+
+def test_nidq_channel_map():
+    chanMap = readSGLX.getChannelMap(NIDQ_META)
+    assert list(chanMap.labels) == ['MA0;0', 'MA1;1', 'XA0;5', 'DW0;8']
+    assert list(chanMap.origIdx) == [0, 1, 5, 8]
+    assert list(chanMap.bands) == ['MA', 'MA', 'XA', 'DW']
+    np.testing.assert_allclose(chanMap.conv, 5 / 32768)
+
+
+def test_channel_indices():
+    chanMap = readSGLX.getChannelMap(NIDQ_META)
+    assert list(chanMap.indices(['DW0;8', 'MA0;0'])) == [3, 0]
+    with pytest.raises(KeyError, match='MA2;2'):
+        chanMap.indices(['MA2;2'])
+    assert get_loaded_chans_idx_labels(['XA0;5', 'MA1;1'], 'labels',
+                                       chanMap) == ([2, 1], ['XA0;5', 'MA1;1'])
+    assert get_loaded_chans_idx_labels([3], 'indices', chanMap) == \
+        ([3], ['DW0;8'])
+    assert get_loaded_chans_idx_labels(None, 'labels', chanMap)[0] == \
+        [0, 1, 2, 3]
@@ -0,0 +1,107 @@
+import importlib.metadata
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from sleepscore.load import (loader_switch, probe_switch, recording,
+                             registry)
+
+
+class NpyRecording(recording.Recording):
+    """(n_channels, n_samples) array saved with `np.save`, at 100Hz."""
+
+    capabilities = {'windowed': True}
+
+    def __init__(self, binPath):
+        super().__init__(binPath)
+        self.array = np.load(binPath)
+        self.labels = [f'ch{i}' for i in range(self.array.shape[0])]
+        self.sRate = 100.0
+        self.duration = self.array.shape[1] / self.sRate
+
+    def read(self, downSample=None, tStart=None, tEnd=None, chanList=None,
+             **kwargs):
+        t0 = int((tStart or 0.0) * self.sRate)
+        t1 = self.array.shape[1] if tEnd is None \
+            else int(tEnd * self.sRate) + 1
+        idx = [self.labels.index(label) for label in chanList]
+        return self.array[idx, t0:t1], self.sRate, list(chanList)
+
+
+class EntryPoints(list):
+
+    def select(self, group):
+        return EntryPoints(ep for ep in self if ep.group == group)
+
+
+def entry_point(name, obj, group=registry.ENTRY_POINT_GROUP):
+    return SimpleNamespace(name=name, value=f'fake:{name}', group=group,
+                           load=lambda: obj)
+
+
+@pytest.fixture
+def formats(monkeypatch):
+    """Registered formats, restored after the test."""
+    monkeypatch.setattr(registry, '_FORMATS', dict(registry._FORMATS))
+    return registry._FORMATS
+
+
+def test_builtin_formats():
+    assert registry.formats()[:2] == ['SGLX', 'TDT']
+    assert registry.get_format('sglx') is recording.SGLXRecording
+    assert registry.get_capabilities('TDT') == {
+        'windowed': True, 'chunked': False, 'probe': True,
+        'nativeDtype': 'float32', 'lfBand': False,
+    }
+    with pytest.raises(ValueError, match='not supported'):
+        registry.get_format('EDF')
+
+
+def test_register_format(formats, tmp_path, capsys):
+    registry.register_format('NPY', NpyRecording)
+    # Undeclared capabilities have their default value
+    assert registry.get_capabilities('npy') == dict(
+        recording.CAPABILITIES, windowed=True
+    )
+    path = tmp_path / 'data.npy'
+    np.save(path, np.arange(2000.0).reshape(2, 1000))
+    data, sf, labels = loader_switch(
+        path, datatype='npy', tStart=1.0, tEnd=2.0, chanList=['ch1'],
+        blockSamples=1000, useLF=False,
+    )
+    assert sf == 100.0 and labels == ['ch1']
+    np.testing.assert_array_equal(data[0], np.arange(1100.0, 1201.0))
+    out = capsys.readouterr().out
+    assert "Ignore ['blockSamples']: `npy` data is not read by blocks" in out
+    assert "Ignore ['useLF']: `npy` data has no LF files" in out
+    with pytest.raises(NotImplementedError, match='probing'):
+        probe_switch(path, datatype='npy')
+
+
+def test_register_format_invalid(formats):
+    with pytest.raises(TypeError):
+        registry.register_format('NPY', np.load)
+
+    class Streaming(NpyRecording):
+        capabilities = {'streaming': True}
+
+    with pytest.raises(ValueError, match='Unrecognized capabilities'):
+        registry.register_format('NPY', Streaming)
+
+
+def test_entry_points(formats, monkeypatch, capsys):
+    monkeypatch.setattr(registry, '_entryPointsLoaded', False)
+    eps = EntryPoints([
+        entry_point('npy', NpyRecording),
+        entry_point('broken', np.load),
+        # Built-in formats take precedence
+        entry_point('sglx', NpyRecording),
+        entry_point('other', NpyRecording, group='other.group'),
+    ])
+    monkeypatch.setattr(importlib.metadata, 'entry_points', lambda: eps)
+    assert registry.formats() == ['SGLX', 'TDT', 'npy']
+    assert registry.get_format('NPY') is NpyRecording
+    assert registry.get_format('SGLX') is recording.SGLXRecording
+    out = capsys.readouterr().out
+    assert "Warning: could not load data format `broken` (fake:broken)" in out
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from sleepscore.load import prefetch, recording, resample
+
+
+def resample_blockwise(x, nOut, blockSamples, overlap, method):
+    """Resample `x` block by block, as `SGLXRecording.read` does."""
+    nIn = x.shape[1]
+    out = np.empty((x.shape[0], nOut))
+    for t0 in range(0, nIn, blockSamples):
+        t1 = min(t0 + blockSamples, nIn)
+        c0, c1 = max(t0 - overlap, 0), min(t1 + overlap, nIn)
+        j0, j1, block = resample.resample_block(
+            x[:, c0:c1], c0, t0, t1, nIn, nOut, method=method,
+        )
+        out[:, j0:j1] = block
+    return out
+
+
+def test_block_period():
+    assert resample.block_period(2500.0, 100.0) == 25
+    assert resample.block_period(30000.0, 500.0) == 60
+    assert resample.block_period(2500.0, 1000.0) == 5
+    # Calibrated rate: no short period
+    assert resample.block_period(2500.0271, 100.0) is None
+
+
+def test_align_blocks():
+    assert resample.align_blocks(2**18, 2500, 25) == (262125, 2500)
+    assert resample.align_blocks(1000, 2510, 60) == (960, 2520)
+    assert resample.align_blocks(1000, 2510, None) == (1000, 2510)
+    assert resample.align_blocks(10, 2510, 60) == (10, 2510)
+
+
+@pytest.mark.parametrize('method', ['interpolation', 'numpy', 'poly',
+                                    'pandas', 'FFT'])
+def test_blockwise_equals_whole(method):
+    sRate, downSample = 2500.0, 100.0
+    t = np.arange(int(300 * sRate)) / sRate
+    x = 4700 * np.sin(2 * np.pi * 3.3 * t)[np.newaxis, :]
+    nOut = int(round(x.shape[1] * downSample / sRate))
+    whole = resample.resample_channels(x, nOut, method=method)
+    # Default block size, not a multiple of the period
+    blockSamples, overlap = resample.align_blocks(
+        prefetch.BLOCK_SAMPLES // 4, int(sRate),
+        resample.block_period(sRate, downSample),
+    )
+    blockwise = resample_blockwise(x, nOut, blockSamples, overlap, method)
+    if method == 'FFT':
+        # Blocks and the whole signal are resampled as periodic signals: the
+        # ends of the whole signal differ, and blocks leak slightly
+        np.testing.assert_allclose(blockwise[:, 100:-100],
+                                   whole[:, 100:-100], atol=10.0)
+    else:
+        np.testing.assert_allclose(blockwise, whole, atol=1e-6)
+
+
+def test_interpolation_grid():
+    """Output sample j is at input timepoint j * nIn / nOut."""
+    t = np.arange(100000) / 2500.0
+    x = np.sin(2 * np.pi * 3.3 * t)
+    out = resample.signal_resample(x, desired_length=4000,
+                                   method='interpolation')
+    np.testing.assert_allclose(
+        out, np.sin(2 * np.pi * 3.3 * np.arange(4000) / 100.0), atol=1e-6
+    )
+
+
+@pytest.mark.parametrize('method', ['interpolation', 'numpy', 'poly',
+                                    'auto'])
+def test_read_independent_of_block_size(lf_bin, method):
+    with recording.SGLXRecording(lf_bin) as rec:
+        reads = [
+            rec.read(downSample=100.0, chanList=['LF0;384', 'LF3;387'],
+                     ds_method=method, blockSamples=blockSamples)[0]
+            for blockSamples in [10007, 40000, 10**6]
+        ]
+    np.testing.assert_allclose(reads[0], reads[2], atol=1e-3)
+    np.testing.assert_allclose(reads[1], reads[2], atol=1e-3)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from sleepscore.load import resample_bench
+
+
+def test_measure_accuracy():
+    poly = resample_bench.measure_accuracy(0.04, 'poly')
+    assert poly['aliasing_db'] < -40
+    assert poly['ripple_db'] < 0.1
+    assert poly['error_db'] < -40
+    # No anti-aliasing filter
+    numpy = resample_bench.measure_accuracy(0.04, 'numpy')
+    assert numpy['aliasing_db'] > -1
+
+
+def test_measure_accuracy_upsampling():
+    # No aliasing when upsampling
+    accuracy = resample_bench.measure_accuracy(2.0, 'poly')
+    assert accuracy['aliasing_db'] == -np.inf
+
+
+@pytest.mark.parametrize('sRate, downSample, method', [
+    (2500.0, 100.0, 'poly'),
+    (30000.0, 1000.0, 'poly'),
+    # No short period: 'poly' is slow
+    (1017.2526245117188, 100.0, 'FFT'),
+])
+def test_select_method(sRate, downSample, method):
+    assert resample_bench.select_method(sRate, downSample) == method
+    # Deterministic, and only depends on the ratio
+    assert resample_bench.select_method(sRate, downSample) == method
+    assert resample_bench.select_method(
+        60 * sRate, 60 * downSample
+    ) == method
+
+
+def test_select_method_target():
+    assert resample_bench.select_method(
+        2500.0, 100.0, maxAliasing=np.inf, maxRipple=np.inf
+    ) == 'numpy'
+    # No method meets the target: least aliasing
+    assert resample_bench.select_method(
+        2500.0, 100.0, maxAliasing=-500.0
+    ) == 'FFT'
+
+
+def test_set_auto_target():
+    try:
+        resample_bench.set_auto_target(maxAliasing=np.inf, maxRipple=np.inf)
+        assert resample_bench.select_method(2500.0, 100.0) == 'numpy'
+    finally:
+        resample_bench.set_auto_target()
+    assert resample_bench.select_method(2500.0, 100.0) == 'poly'
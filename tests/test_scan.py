@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import write_imec
+from sleepscore import scan
+
+
+@pytest.fixture
+def scan_bin(tmp_path):
+    """300s LF bin: weak and strong delta, beta, flat and clipped channels.
+
+    Samples of imec 1.0 data are clipped at the rails of the ADC (+/-512).
+    """
+    sRate = 2500.0
+    t = np.arange(int(300 * sRate)) / sRate
+    data = np.zeros((len(t), 6))
+    data[:, 0] = 200 * np.sin(2 * np.pi * 2 * t)
+    data[:, 1] = 400 * np.sin(2 * np.pi * 2 * t)
+    data[:, 2] = 400 * np.sin(2 * np.pi * 20 * t)
+    data[:, 4] = np.clip(2000 * np.sin(2 * np.pi * 2 * t), -512, 511)
+    return write_imec(tmp_path / 'run_g0_t0.imec0.lf.bin', data, sRate)
+
+
+def test_scan_windows():
+    tStarts = scan.scan_windows(1000.0, fraction=0.01, windowDuration=2.0)
+    np.testing.assert_allclose(tStarts, [99.0, 299.0, 499.0, 699.0, 899.0])
+    # At least one window, within the recording
+    np.testing.assert_allclose(scan.scan_windows(1.0), [0.0])
+
+
+def test_scan_recording(scan_bin, capsys):
+    report = scan.scan_recording(scan_bin, fraction=0.05)
+    assert 'N=8 windows of 2.0s' in capsys.readouterr().out
+    # The SY channel is not scanned
+    assert list(report['region']) == ['LF'] * 5
+    # Flagged channels are ranked last, whatever their delta power
+    assert list(report['channel']) == ['LF1;385', 'LF0;384', 'LF2;386',
+                                       'LF4;388', 'LF3;387']
+    assert list(report['rank']) == [1, 2, 3, 4, 5]
+    assert list(report['flagged']) == [False, False, False, True, True]
+    clipped, flat = report.iloc[3], report.iloc[4]
+    assert clipped['clipped'] > 0 and clipped['artifact_windows'] == 1.0
+    assert flat['flat_windows'] == 1.0 and flat['artifact_windows'] == 1.0
+    assert (report['clipped'].iloc[:3] == 0).all()
+    assert report['score'].iloc[0] > report['score'].iloc[1] \
+        > report['score'].iloc[2]
+
+
+def test_scan_regions(scan_bin, capsys):
+    report = scan.scan_recording(
+        scan_bin, chanList=['LF0;384', 'LF1;385', 'LF2;386'],
+        regions={'cortex': ['LF0;384']}, fraction=0.05,
+    )
+    assert list(report['region']) == ['cortex', 'other', 'other']
+    assert list(report['channel']) == ['LF0;384', 'LF1;385', 'LF2;386']
+    assert list(report['rank']) == [1, 1, 2]
+
+
+def test_save_scan(scan_bin, tmp_path, capsys):
+    path = tmp_path / 'scan.csv'
+    report = scan.save_scan(path, scan_bin, nTop=2, fraction=0.05)
+    out = capsys.readouterr().out
+    assert "LF: best channels ['LF1;385', 'LF0;384'], N=2/5 flagged" in out
+    saved = pd.read_csv(path)
+    assert list(saved['channel']) == list(report['channel'])
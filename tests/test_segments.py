@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from sleepscore.load import prefetch, segments
+
+from conftest import write_imec
+
+
+def test_run_reader_block_shapes(lf_bin):
+    run = segments.SGLXRun(lf_bin)
+    with run.open_reader([0, 4]) as reader:
+        for start, stop in [(0, 1000), (run.nSamp - 10, run.nSamp),
+                            (run.nSamp - 10, run.nSamp + 50)]:
+            assert reader(start, stop).shape == (2, stop - start)
+
+
+def test_truncated_bin(lf_bin):
+    nSamp = segments.SGLXRun(lf_bin).nSamp
+    with open(lf_bin, 'r+b') as f:
+        f.truncate((nSamp - 1000) * 2 * 5 + 3)
+    run = segments.SGLXRun(lf_bin)
+    assert run.nSamp == nSamp - 1000
+    with run.open_reader([1]) as reader:
+        block = reader(run.nSamp - 2000, nSamp)
+    assert block.shape == (1, 2000 + 1000)
+    assert block[:, :2000].any() and not block[:, 2000:].any()
+    with prefetch.InterleavedReader(lf_bin, 5, [1]) as reader:
+        with pytest.raises(EOFError):
+            reader(0, nSamp)
+
+
+def test_run_of_several_files(tmp_path):
+    sRate = 2500.0
+    data = np.arange(3000 * 2, dtype='int16').reshape(3000, 2) % 1000
+    paths = [
+        write_imec(tmp_path / f'run_g0_t{i}.imec0.lf.bin',
+                   data[1000 * i:1000 * (i + 1)], sRate,
+                   firstSample=offset)
+        for i, offset in [(0, 5000), (1, 6000), (2, 8000)]
+    ]
+    run = segments.SGLXRun(str(tmp_path / 'run_g0_t*.imec0.lf.bin'))
+    assert run.binPaths == paths
+    assert list(run.offsets) == [0, 1000, 3000]
+    assert run.nSamp == 4000
+    with run.open_reader([0]) as reader:
+        block = reader(500, 3500)
+    expected = np.zeros(3000, dtype='int16')
+    expected[:1500] = data[500:2000, 0]
+    expected[2500:] = data[2000:2500, 0]
+    np.testing.assert_array_equal(block[0], expected)
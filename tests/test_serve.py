@@ -0,0 +1,88 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from sleepscore import load_datasets, serve, validate_datasets
+from sleepscore.load import recording
+
+from conftest import write_imec
+
+
+@pytest.fixture
+def server(lf_bin):
+    """Address of a server of the directory of `lf_bin`, on a free port."""
+    scoringServer = serve.ScoringServer(('127.0.0.1', 0), root=lf_bin.parent)
+    thread = threading.Thread(target=scoringServer.serve_forever)
+    thread.start()
+    yield f"127.0.0.1:{scoringServer.server_port}"
+    scoringServer.shutdown()
+    scoringServer.server_close()
+    thread.join()
+
+
+def test_fetch_bundle(server, lf_bin):
+    datasets = [{'binPath': str(lf_bin), 'chanList': ['LF0;384', 'LF2;386'],
+                 'name': 'A'}]
+    data, sf, chanLabels, artifacts = serve.fetch_bundle(server, datasets)
+    local, localSf, localLabels, _ = load_datasets(
+        validate_datasets(datasets)
+    )
+    np.testing.assert_array_equal(data, local)
+    assert sf == localSf == 100.0
+    assert chanLabels == localLabels == ['A,LF0;384', 'A,LF2;386']
+    assert artifacts is None
+    assert serve.fetch_status(server)['misses'] == 1
+
+    # Cache hit
+    data, _, _, _ = serve.fetch_bundle(server, datasets)
+    np.testing.assert_array_equal(data, local)
+    status = serve.fetch_status(server)
+    assert status['hits'] == 1 and status['misses'] == 1
+    assert status['entries'] == 1 and status['bytes'] == local.nbytes
+
+
+def test_fetch_window(server, lf_bin):
+    kwargs = {'downSample': 100.0, 'tStart': 10.0, 'tEnd': 20.0,
+              'chanList': ['LF1;385']}
+    data, sf, chanLabels = serve.fetch_window(server, str(lf_bin), **kwargs)
+    with recording.SGLXRecording(lf_bin) as rec:
+        local, _, _ = rec.read(**kwargs)
+    np.testing.assert_array_equal(data, local)
+    assert sf == 100.0 and chanLabels == ['LF1;385']
+    assert serve.fetch_status(server)['recordings'] == [f'"{lf_bin}"']
+
+    # Cache hit, until the recording changes
+    serve.fetch_window(server, str(lf_bin), **kwargs)
+    status = serve.fetch_status(server)
+    assert status['hits'] == 1 and status['misses'] == 1
+    stat = os.stat(lf_bin)
+    os.utime(lf_bin, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    again, _, _ = serve.fetch_window(server, str(lf_bin), **kwargs)
+    np.testing.assert_array_equal(again, data)
+    assert serve.fetch_status(server)['misses'] == 2
+
+
+def test_window_unknown_keys(server, lf_bin):
+    with pytest.raises(serve.ServerError, match='Unrecognized keys'):
+        serve.fetch_window(server, str(lf_bin), blockSize=10)
+
+
+def test_outside_root(server, lf_bin, tmp_path_factory):
+    other = tmp_path_factory.mktemp('other')
+    binPath = write_imec(other / 'run_g0_t0.imec0.lf.bin',
+                         np.zeros((2500, 2)), 2500.0)
+    with pytest.raises(serve.ServerError, match='outside of the served'):
+        serve.fetch_window(server, str(binPath))
+    with pytest.raises(serve.ServerError, match='outside of the served'):
+        serve.fetch_bundle(server, [{'binPath': str(binPath)}])
+    # Paths out of the root through '..'
+    escaped = lf_bin.parent / '..' / other.name / binPath.name
+    with pytest.raises(serve.ServerError, match='outside of the served'):
+        serve.fetch_window(server, str(escaped))
+
+
+def test_unknown_path(server):
+    with pytest.raises(serve.ServerError, match='Unknown path'):
+        serve._request(server, '/unknown')
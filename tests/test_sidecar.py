@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+from sleepscore.load import recording, sidecar
+
+
+def test_sidecar_round_trip(lf_bin):
+    raw = np.fromfile(lf_bin, dtype='int16').reshape(-1, 5)
+    sidecarPath = sidecar.extract_SGLX(lf_bin, chanList=['LF2;386', 'LF0;384'])
+    assert sidecarPath == sidecar.get_sidecar_paths(lf_bin)[0]
+    header = sidecar.read_sidecar_header(lf_bin)
+    assert header['savedIdx'] == [0, 2]
+    assert header['labels'] == ['LF0;384', 'LF2;386']
+    assert header['nSamp'] == raw.shape[0]
+
+    data, rows = sidecar.open_sidecar(lf_bin, [2, 0])
+    assert rows == [1, 0]
+    np.testing.assert_array_equal(data[rows], raw[:, [2, 0]].T)
+    # Channels not in the sidecar
+    assert sidecar.open_sidecar(lf_bin, [0, 1]) is None
+
+    # Incremental extraction
+    sidecar.extract_SGLX(lf_bin, chanList=['LF1;385'])
+    assert sidecar.read_sidecar_header(lf_bin)['savedIdx'] == [0, 1, 2]
+    data, rows = sidecar.open_sidecar(lf_bin, [0, 1])
+    np.testing.assert_array_equal(data[rows], raw[:, [0, 1]].T)
+
+
+def test_read_from_sidecar(lf_bin):
+    kwargs = {'downSample': 100.0, 'chanList': ['LF1;385', 'LF3;387']}
+    with recording.SGLXRecording(lf_bin) as rec:
+        fromBin, _, _ = rec.read(**kwargs)
+        assert rec.estimate_reads(chanList=kwargs['chanList']) == (5, 2)
+    sidecar.extract_SGLX(lf_bin, chanList=kwargs['chanList'])
+    with recording.SGLXRecording(lf_bin) as rec:
+        assert rec.estimate_reads(chanList=kwargs['chanList']) == (2, 2)
+        fromSidecar, _, _ = rec.read(**kwargs)
+    np.testing.assert_array_equal(fromSidecar, fromBin)
+
+
+def test_sidecar_invalidated(lf_bin):
+    sidecar.extract_SGLX(lf_bin, chanList=['LF0;384'])
+    assert sidecar.open_sidecar(lf_bin, [0]) is not None
+    # Source bin modified after extraction
+    stat = os.stat(lf_bin)
+    os.utime(lf_bin, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert sidecar.read_sidecar_header(lf_bin) is None
+    assert sidecar.open_sidecar(lf_bin, [0]) is None
+    # Extracted again
+    sidecar.extract_SGLX(lf_bin, chanList=['LF1;385'])
+    assert sidecar.read_sidecar_header(lf_bin)['savedIdx'] == [1]
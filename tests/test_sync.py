@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from sleepscore.load import sync
+
+
+def drifting_edges(drift, offset, duration=24 * 3600.0, period=1.0, seed=0):
+    """Edges of a stream and of the reference, tRef = (1 + drift) * t + offset.
+
+    Edges are quantized at 30kHz in the stream and 2.5kHz in the reference,
+    which offsets the map by up to 0.2ms.
+    """
+    rng = np.random.default_rng(seed)
+    refTimes = np.arange(0.0, duration, period) + rng.uniform(0, 1e-3)
+    times = (refTimes - offset) / (1 + drift)
+    times = np.round(times[times >= 0] * 30000) / 30000
+    return times, np.round(refTimes * 2500) / 2500
+
+
+@pytest.mark.parametrize('drift', [-10e-6, 10e-6, 40e-6])
+def test_fit_clock_map_drift(drift):
+    times, refTimes = drifting_edges(drift, 0.3)
+    clockMap = sync.fit_clock_map(times, refTimes)
+    assert clockMap.nEdges == len(times)
+    assert clockMap.slope == pytest.approx(1 + drift, abs=1e-9)
+    assert clockMap.offset == pytest.approx(0.3, abs=3e-4)
+    assert clockMap.residual < 5e-4
+
+
+def test_fit_clock_map_missing_and_spurious_edges():
+    times, refTimes = drifting_edges(10e-6, -0.2)
+    times = np.sort(np.r_[np.delete(times, np.s_[1000:5000]), 4321.123])
+    clockMap = sync.fit_clock_map(times, refTimes)
+    assert clockMap.nEdges == len(times) - 1
+    assert clockMap.slope == pytest.approx(1 + 10e-6, abs=1e-9)
+
+
+def test_fit_clock_map_unrelated_edges():
+    rng = np.random.default_rng(0)
+    times = np.sort(rng.uniform(0, 3600, 3600))
+    refTimes = np.arange(0.0, 3600.0)
+    with pytest.raises(ValueError, match='residuals'):
+        sync.fit_clock_map(times, refTimes)
+
+
+def test_fit_clock_map_too_few_edges():
+    with pytest.raises(ValueError, match='At least 2'):
+        sync.fit_clock_map(np.array([1.0]), np.arange(10.0))
@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pytest
+import tdt
+
+from sleepscore.load import recording, tdt_index
+
+INDEX = {
+    'stores': {
+        'LFPs': {'name': 'LFPs', 'fs': 1017.25, 'nChan': 2},
+        'EEGs': {'name': 'EEGs', 'fs': 1017.25, 'nChan': 3},
+    },
+    'duration': 3600.0,
+}
+
+
+@pytest.fixture
+def tdt_block(tmp_path, monkeypatch):
+    """Path of a block with the header index INDEX."""
+    monkeypatch.setattr(tdt_index, 'get_block_index', lambda path: INDEX)
+    return tmp_path
+
+
+def test_tdt_probe(tdt_block):
+    rec = recording.TDTRecording(tdt_block)
+    assert rec.labels == ['LFPs-1', 'LFPs-2', 'EEGs-1', 'EEGs-2', 'EEGs-3']
+    assert rec.sRate == 1017.25 and rec.duration == 3600.0
+    assert rec.probe(chanList=['EEGs-2', 'LFPs-1']) == \
+        (1017.25, 3600.0, ['EEGs-2', 'LFPs-1'])
+    assert rec.probe(chanList='all')[2] == rec.labels
+    assert rec.probe(derivations={'bipolar': {'EEGs-1': 1, 'EEGs-2': -1}}) \
+        == (1017.25, 3600.0, ['bipolar'])
+
+
+def test_tdt_chanList_required(tdt_block):
+    rec = recording.TDTRecording(tdt_block)
+    with pytest.raises(ValueError, match='`chanList` should be'):
+        rec.probe()
+    with pytest.raises(ValueError, match='`chanList` should be'):
+        rec.probe(chanList=['EEGs-0'])
+    with pytest.raises(ValueError, match='Channel 4 not found'):
+        rec.probe(chanList=['EEGs-4'])
+    with pytest.raises(ValueError, match="Only 'labels'"):
+        rec.probe(chanList=[0], chanListType='indices')
+
+
+@pytest.fixture
+def indexed_block(tmp_path, monkeypatch):
+    """Block path, and list of calls to `tdt.read_block` on its headers."""
+    monkeypatch.setenv('SLEEPSCORE_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(tdt_index, '_headersCache', {})
+    block = tmp_path / 'block'
+    block.mkdir()
+    for name in ['block.tsq', 'block.tev']:
+        (block / name).write_bytes(b'\0' * 16)
+    calls = []
+
+    def read_block(path, headers=0):
+        calls.append(path)
+        stores = tdt.StructType()
+        stores['LFPs'] = tdt.StructType(
+            type_str='streams', name='LFPs', fs=1017.25,
+            chan=np.array([1, 2, 3, 1, 2, 3]), ts=np.arange(6.0),
+        )
+        stores['Tick'] = tdt.StructType(type_str='epocs', name='Tick')
+        return tdt.StructType(stores=stores, start_time=np.array([10.0]),
+                              stop_time=np.array([110.0]))
+
+    monkeypatch.setattr(tdt_index.tdt, 'read_block', read_block)
+    return block, calls
+
+
+def test_tdt_index_cache(indexed_block):
+    block, calls = indexed_block
+    index = tdt_index.get_block_index(block)
+    assert index == {
+        'stores': {'LFPs': {'name': 'LFPs', 'fs': 1017.25, 'nChan': 3}},
+        'duration': 100.0,
+    }
+    assert len(calls) == 1
+    # Summary and headers read from the cache
+    assert tdt_index.get_block_index(block) == index
+    headers = tdt_index.read_headers(block)
+    assert list(headers.stores.keys()) == ['LFPs', 'Tick']
+    tdt_index._headersCache.clear()
+    tdt_index.read_headers(block)
+    assert len(calls) == 1
+    storeHeaders = tdt_index.get_store_headers(block, 'LFPs')
+    assert list(storeHeaders.stores.keys()) == ['LFPs']
+
+
+def test_tdt_index_invalidated(indexed_block):
+    block, calls = indexed_block
+    tdt_index.get_block_index(block)
+    tdt_index.read_headers(block)
+    assert len(calls) == 1
+    # Block files modified (eg recording in progress)
+    tsq = block / 'block.tsq'
+    stat = os.stat(tsq)
+    os.utime(tsq, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    tdt_index.get_block_index(block)
+    assert len(calls) == 2
+    tdt_index.read_headers(block)
+    assert len(calls) == 2
+    (block / 'block.tev').write_bytes(b'\0' * 32)
+    tdt_index.read_headers(block)
+    assert len(calls) == 3